@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Measure event-loop latency while loading synthetic modules with asyncio."""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import wasamole.io
+
+from synthetic import generate
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--modules", type=int, default=16)
+parser.add_argument("--functions", type=int, default=500)
+parser.add_argument("--body-size", type=int, default=1024)
+parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+args = parser.parse_args()
+
+
+async def ticker(lags: List[float], interval: float = 0.001) -> None:
+    # How late each wake-up is: the time the loop spent blocked.
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def load(directory: str, executor: Optional[Executor], blocking: bool) -> None:
+    lags: List[float] = []
+    tick = asyncio.ensure_future(ticker(lags))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    if blocking:
+        for name in sorted(os.listdir(directory)):
+            wasamole.io.from_file(os.path.join(directory, name))
+            await asyncio.sleep(0)
+    else:
+        # Lists of instructions, as the blocking reads produce.
+        modules = wasamole.io.as_completed(
+            directory, executor, args.jobs, compact=False
+        )
+        async for _ in modules:
+            pass
+    seconds = time.perf_counter() - start
+    tick.cancel()
+    if blocking:
+        label = "blocking"
+    else:
+        label = "processes" if executor is not None else "threads"
+    worst = max(lags, default=0.0)
+    print(f"{label:>9}: {seconds:.2f} s, worst loop lag {worst * 1e3:.1f} ms")
+
+
+with tempfile.TemporaryDirectory() as directory:
+    for i in range(args.modules):
+        with open(os.path.join(directory, f"m{i}.wasm"), "wb") as f:
+            f.write(generate(args.functions, args.body_size, seed=i))
+    asyncio.run(load(directory, None, True))
+    asyncio.run(load(directory, None, False))
+    with ProcessPoolExecutor(args.jobs) as executor:
+        asyncio.run(load(directory, executor, False))
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""Measure instruction decode throughput on a synthetic multi-megabyte module."""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import wasamole.io
+
+from synthetic import generate
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--functions", type=int, default=4000)
+parser.add_argument("--body-size", type=int, default=1024)
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+bytez = generate(args.functions, args.body_size)
+best = float("inf")
+for _ in range(args.repeat):
+    start = time.perf_counter()
+    module = wasamole.io.from_bytes(bytez)
+    best = min(best, time.perf_counter() - start)
+
+count = sum(len(f.instructions) for f in module.functions)
+print(f"module size:  {len(bytez) / 1e6:.1f} MB")
+print(f"instructions: {count}")
+print(f"best of {args.repeat}:    {best:.3f} s")
+print(f"throughput:   {count / best:,.0f} instructions/s")
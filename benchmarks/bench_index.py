@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Measure building, loading and querying an instruction index."""
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import wasamole.io
+from wasamole.analysis import InstructionIndex
+from wasamole.core import Opcode
+
+from synthetic import generate
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--functions", type=int, default=4000)
+parser.add_argument("--body-size", type=int, default=1024)
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+
+def best_of(fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+bytez = generate(args.functions, args.body_size, valid=True)
+module = wasamole.io.from_bytes(bytez, compact=True)
+index = InstructionIndex.build(module)
+data = index.to_bytes()
+
+read = best_of(lambda: wasamole.io.from_bytes(bytez, compact=True))
+build = best_of(lambda: InstructionIndex.build(module))
+load = best_of(lambda: InstructionIndex.from_serialized(data))
+print(f"{len(index)} instructions: read {read:.3f} s, build {build:.3f} s")
+print(f"load {load * 1e3:.1f} ms from {len(data) / 1e6:.1f} MB")
+
+scan = best_of(
+    lambda: [
+        (code_i, i)
+        for code_i, function in enumerate(module.functions)
+        for i, instruction in enumerate(function.instructions)
+        if instruction.opcode == Opcode.GLOBAL_SET
+        and instruction.operands[0].index == 0
+    ]
+)
+find = best_of(lambda: index.find(Opcode.GLOBAL_SET, 0))
+print(f"global.set 0: scan {scan * 1e3:.1f} ms, index {find * 1e6:.1f} us")
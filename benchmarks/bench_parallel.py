@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""Measure parallel code section disassembly against the serial path."""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import wasamole.io
+
+from synthetic import generate
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--functions", type=int, default=4000)
+parser.add_argument("--body-size", type=int, default=1024)
+parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, 8])
+parser.add_argument("--compact", action="store_true")
+args = parser.parse_args()
+
+with tempfile.NamedTemporaryFile(suffix=".wasm", delete=False) as f:
+    f.write(generate(args.functions, args.body_size))
+
+print(f"cores available: {os.cpu_count()}")
+try:
+    serial = None
+    for jobs in args.jobs:
+        start = time.perf_counter()
+        module = wasamole.io.from_file(f.name, compact=args.compact, parallel=jobs)
+        elapsed = time.perf_counter() - start
+        if serial is None:
+            serial = elapsed
+        print(f"jobs={jobs}: {elapsed:.3f} s ({serial / elapsed:.2f}x)")
+finally:
+    os.unlink(f.name)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""Measure what validation adds to reading a valid synthetic module."""
+
+import argparse
+import gc
+import os
+import sys
+import time
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import wasamole.io
+from wasamole.analysis import validate
+
+from synthetic import generate
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--functions", type=int, default=4000)
+parser.add_argument("--body-size", type=int, default=1024)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--jobs", type=int, default=0)
+args = parser.parse_args()
+
+
+def best_of(fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = fn()
+        # Reads pause the collector; the first collection after one scans
+        # the whole new module, which a validating read pays for itself.
+        gc.collect()
+        best = min(best, time.perf_counter() - start)
+        del result
+    return best
+
+
+bytez = generate(args.functions, args.body_size, valid=True)
+for compact in (True, False):
+    module = wasamole.io.from_bytes(bytez, compact=compact)
+    read = best_of(lambda: wasamole.io.from_bytes(bytez, compact=compact))
+    check = best_of(lambda: validate(module, args.jobs))
+    checked = best_of(
+        lambda: wasamole.io.from_bytes(bytez, compact=compact, validate=True)
+    )
+    print(
+        f"compact={compact}: read {read:.3f} s, validate {check:.3f} s "
+        f"({check / read:+.0%}), validating read {checked:.3f} s "
+        f"({checked / read - 1:+.0%})"
+    )
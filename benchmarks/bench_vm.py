@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""Measure the interpreter's speed in WebAssembly instructions per second.
+
+Two compute-heavy exports are run: an FNV-1a hash over a buffer in linear
+memory and an insertion sort of pseudo-random i32s.  Both modules are built
+with the core classes, written with the binary writer and read back, so the
+interpreter runs exactly what the reader produces.
+
+The instruction count comes from one extra run with ``count=True``; it
+counts source instructions except the structural ``block``, ``loop``,
+``end`` and ``nop``, which compile to nothing.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import wasamole.io
+from wasamole.core import (
+    BlockTypeOperand,
+    F32Operand,
+    F64Operand,
+    FuncExport,
+    Function,
+    FunctionType,
+    I32Operand,
+    I64Operand,
+    IndexOperand,
+    Instruction,
+    LimitType,
+    Local,
+    MemArgOperand,
+    MemoryType,
+    Module,
+    Opcode,
+    ValueType,
+)
+from wasamole.vm import Instance
+from wasamole.vm.instance import CountingFunction
+
+_OPERANDS: Dict[type, Callable[[str], Any]] = {
+    IndexOperand: lambda s: IndexOperand(int(s)),
+    I32Operand: lambda s: I32Operand(int(s, 0)),
+    I64Operand: lambda s: I64Operand(int(s, 0)),
+    F32Operand: lambda s: F32Operand(float(s)),
+    F64Operand: lambda s: F64Operand(float(s)),
+    MemArgOperand: lambda s: MemArgOperand(0, int(s)),
+}
+
+
+def assemble(text: str) -> List[Instruction]:
+    """Instructions from one ``opname operand...`` per line."""
+    instrs = []
+    for line in text.splitlines():
+        words = line.split(";")[0].split()
+        if not words:
+            continue
+        opcode = Opcode[words[0].upper().replace(".", "_")]
+        operands: List[Any] = []
+        args = words[1:]
+        for operand_type in Instruction(opcode).operand_types:
+            if operand_type is BlockTypeOperand:
+                result = ValueType[args.pop(0)] if args else None
+                operands.append(BlockTypeOperand(result))
+            elif operand_type is MemArgOperand:
+                operands.append(_OPERANDS[MemArgOperand](args.pop(0) if args else "0"))
+            else:
+                operands.append(_OPERANDS[operand_type](args.pop(0)))
+        instrs.append(Instruction(opcode, operands))
+    return instrs
+
+
+HASH = """
+    i32.const 0x811c9dc5
+    local.set 2
+    local.get 0
+    local.get 1
+    i32.add
+    local.set 3
+    block
+      loop
+        local.get 0
+        local.get 3
+        i32.ge_u
+        br_if 1
+        local.get 2
+        local.get 0
+        i32.load8_u
+        i32.xor
+        i32.const 16777619
+        i32.mul
+        local.set 2
+        local.get 0
+        i32.const 1
+        i32.add
+        local.set 0
+        br 0
+      end
+    end
+    local.get 2
+    end
+"""
+
+# fill(n, seed): n pseudo-random i32s from a linear congruential generator.
+FILL = """
+    block
+      loop
+        local.get 2
+        local.get 0
+        i32.ge_u
+        br_if 1
+        local.get 1
+        i32.const 1103515245
+        i32.mul
+        i32.const 12345
+        i32.add
+        local.set 1
+        local.get 2
+        i32.const 2
+        i32.shl
+        local.get 1
+        i32.const 8
+        i32.shr_u
+        i32.store
+        local.get 2
+        i32.const 1
+        i32.add
+        local.set 2
+        br 0
+      end
+    end
+    end
+"""
+
+# sort(n): insertion sort of the first n i32s in memory.
+# Locals: 0 n, 1 i, 2 j, 3 key, 4 value.
+SORT = """
+    i32.const 1
+    local.set 1
+    block
+      loop
+        local.get 1
+        local.get 0
+        i32.ge_s
+        br_if 1
+        local.get 1
+        i32.const 2
+        i32.shl
+        i32.load
+        local.set 3
+        local.get 1
+        i32.const 1
+        i32.sub
+        local.set 2
+        block
+          loop
+            local.get 2
+            i32.const 0
+            i32.lt_s
+            br_if 1
+            local.get 2
+            i32.const 2
+            i32.shl
+            i32.load
+            local.tee 4
+            local.get 3
+            i32.le_s
+            br_if 1
+            local.get 2
+            i32.const 1
+            i32.add
+            i32.const 2
+            i32.shl
+            local.get 4
+            i32.store
+            local.get 2
+            i32.const 1
+            i32.sub
+            local.set 2
+            br 0
+          end
+        end
+        local.get 2
+        i32.const 1
+        i32.add
+        i32.const 2
+        i32.shl
+        local.get 3
+        i32.store
+        local.get 1
+        i32.const 1
+        i32.add
+        local.set 1
+        br 0
+      end
+    end
+    end
+"""
+
+
+def build() -> bytes:
+    i32 = ValueType.i32
+    module = Module()
+    module.add_type(FunctionType([i32, i32], [i32]))
+    module.add_type(FunctionType([i32, i32], []))
+    module.add_type(FunctionType([i32], []))
+    module.add_memory(MemoryType(LimitType(16, None)))
+    module.add_function(Function(0, [Local(i32)] * 2, assemble(HASH)))
+    module.add_function(Function(1, [Local(i32)], assemble(FILL)))
+    module.add_function(Function(2, [Local(i32)] * 4, assemble(SORT)))
+    for i, name in enumerate(["hash", "fill", "sort"]):
+        module.add_export(FuncExport(name, i))
+    return wasamole.io.to_bytes(module)
+
+
+def workloads(bytez: bytes, size: int) -> Dict[str, Callable[[Instance], Any]]:
+    def hash_loop(instance: Instance) -> Any:
+        instance.memory[:size] = bytes(range(256)) * (size // 256)
+        return instance.invoke("hash", 0, size)
+
+    def sort(instance: Instance) -> Any:
+        n = size // 16
+        instance.invoke("fill", n, 1)
+        instance.invoke("sort", n)
+        return instance.memory[: 4 * n]
+
+    return {"hash": hash_loop, "sort": sort}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1 << 16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bytez = build()
+    module = wasamole.io.from_bytes(bytez)
+    results = {}
+    for name, run in workloads(bytez, args.size).items():
+        CountingFunction.executed = 0
+        run(Instance(module, count=True))
+        executed = CountingFunction.executed
+
+        best = float("inf")
+        for _ in range(args.repeat):
+            instance = Instance(module)
+            start = time.perf_counter()
+            run(instance)
+            best = min(best, time.perf_counter() - start)
+        results[name] = {
+            "instructions": executed,
+            "seconds": best,
+            "instructions_per_s": executed / best,
+        }
+        print(f"{name}: {executed / best / 1e6:.2f} M instructions/s", file=sys.stderr)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""Compare two ``run.py`` result files and flag regressions.
+
+Exits with status 1 when any benchmark got slower, or used more peak memory,
+than the baseline by more than ``--threshold``.
+"""
+
+import argparse
+import json
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    if baseline["meta"]["parameters"] != candidate["meta"]["parameters"]:
+        print("warning: results were produced with different parameters")
+
+    regressions = 0
+    print(f"{'benchmark':<14} {'time':>8} {'memory':>8}")
+    for key, base in sorted(baseline["benchmarks"].items()):
+        if key not in candidate["benchmarks"]:
+            continue
+        cand = candidate["benchmarks"][key]
+        time_ratio = cand["seconds"] / base["seconds"]
+        memory_ratio = cand["peak_memory_bytes"] / max(base["peak_memory_bytes"], 1)
+        flag = ""
+        if time_ratio > 1 + args.threshold or memory_ratio > 1 + args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:<14} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{flag}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
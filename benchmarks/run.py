@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""Time the parsing hot path on a synthetic module and report JSON.
+
+Each benchmark is run ``--repeat`` times and the best wall time is kept.
+Peak memory is measured in a separate run under ``tracemalloc`` (or, for
+the command line tool, from the child's maximum RSS) so that tracing does
+not distort the timings.  Compare two result files with ``compare.py``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import wasamole.io
+from wasamole.analysis import ControlFlowGraph
+from wasamole.core import disassemble
+from wasamole.io import BinaryReader, BinaryWriter, TextWriter
+
+import synthetic
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# Runs a command and prints the peak RSS of that command.  It is run from a
+# small intermediate interpreter so that the measurement is not inflated by
+# the pages of the (large) benchmark process the child was forked from.
+MAXRSS = """
+import resource, subprocess, sys
+subprocess.run(sys.argv[1:], stdout=subprocess.DEVNULL, check=True)
+print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+"""
+
+
+def objdump(filename: str) -> Tuple[float, int]:
+    """Run ``wasm-objdump -d`` and return its wall time and peak RSS."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    command = [sys.executable, os.path.join(ROOT, "bin", "wasm-objdump"), "-d", filename]
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", MAXRSS] + command,
+        env=env,
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    maxrss = int(out.stdout)
+    return elapsed, maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        )
+        return out.stdout.strip()
+    except OSError:
+        return ""
+
+
+def result(seconds: float, size: int, instructions: int, memory: int) -> Dict[str, Any]:
+    return {
+        "seconds": seconds,
+        "mb_per_s": size / 1e6 / seconds,
+        "instructions_per_s": instructions / seconds,
+        "peak_memory_bytes": memory,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    synthetic.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    bytez = synthetic.generate_from_args(args)
+    module = wasamole.io.from_bytes(bytez, lazy=True)
+    bodies = [bytez[f.address : f.address + f.size] for f in module.functions]
+    instructions = sum(len(f.instructions) for f in module.functions)
+    code_size = sum(len(body) for body in bodies)
+    module = wasamole.io.from_bytes(bytez)
+    compact = wasamole.io.from_bytes(bytez, compact=True)
+
+    def read() -> None:
+        BinaryReader.from_bytes(bytez).read()
+
+    def read_compact() -> None:
+        BinaryReader.from_bytes(bytez, compact=True).read()
+
+    def decode() -> None:
+        for body in bodies:
+            disassemble(body)
+
+    def write() -> None:
+        TextWriter(module).write()
+
+    def write_binary() -> None:
+        BinaryWriter(module).write()
+
+    def cfg() -> None:
+        for function in compact.functions:
+            ControlFlowGraph.build(function.instructions)
+
+    benchmarks: Dict[str, Dict[str, Any]] = {}
+    for key, fn, size in [
+        ("read", read, len(bytez)),
+        ("read_compact", read_compact, len(bytez)),
+        ("disassemble", decode, code_size),
+        ("text_write", write, len(bytez)),
+        ("binary_write", write_binary, len(bytez)),
+        ("cfg", cfg, code_size),
+    ]:
+        seconds = best_of(args.repeat, fn)
+        benchmarks[key] = result(seconds, size, instructions, peak_memory(fn))
+        print(f"{key}: {seconds:.3f} s", file=sys.stderr)
+
+    with tempfile.NamedTemporaryFile(suffix=".wasm", delete=False) as f:
+        f.write(bytez)
+    try:
+        runs = [objdump(f.name) for _ in range(args.repeat)]
+    finally:
+        os.unlink(f.name)
+    seconds = min(elapsed for elapsed, _ in runs)
+    benchmarks["objdump"] = result(seconds, len(bytez), instructions, runs[-1][1])
+    print(f"objdump: {seconds:.3f} s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {k: v for k, v in vars(args).items() if k != "output"},
+            "module_bytes": len(bytez),
+            "code_bytes": code_size,
+            "functions": len(module.functions),
+            "instructions": instructions,
+        },
+        "benchmarks": benchmarks,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+"""Deterministic generator for synthetic WebAssembly binaries.
+
+The generated modules are structurally well formed (every section, body and
+block is properly delimited) but function bodies are not type correct: they
+exist to exercise the decoder and the writers, not to be executed.  With
+``valid=True`` each kind of instruction is instead emitted in a short
+sequence that leaves the operand stack as it was, which makes the module
+valid.  The same parameters and seed always produce the same bytes.
+"""
+
+import argparse
+import random
+import struct
+from typing import Callable, Dict, List, Optional
+
+# Relative weights of each kind of instruction in generated bodies.
+DEFAULT_MIX = {
+    "local": 40,
+    "const": 15,
+    "arith": 15,
+    "memory": 8,
+    "call": 5,
+    "branch": 4,
+    "wide": 5,
+    "block": 4,
+    "end": 4,
+}
+
+
+def uleb(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def sleb(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40):
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+def name(s: str) -> bytes:
+    return uleb(len(s)) + s.encode()
+
+
+def vector(items: List[bytes]) -> bytes:
+    return uleb(len(items)) + b"".join(items)
+
+
+def section(section_id: int, payload: bytes) -> bytes:
+    return bytes([section_id]) + uleb(len(payload)) + payload
+
+
+class BodyGenerator:
+    def __init__(self, rng: random.Random, functions: int, mix: Dict[str, int]) -> None:
+        self.rng = rng
+        self.functions = functions
+        self.depth = 0
+        emitters: Dict[str, Callable[[], bytes]] = {
+            "local": self._local,
+            "const": self._const,
+            "arith": self._arith,
+            "memory": self._memory,
+            "call": self._call,
+            "branch": self._branch,
+            "wide": self._wide,
+            "block": self._block,
+            "end": self._end,
+        }
+        unknown = set(mix) - set(emitters)
+        if unknown:
+            raise ValueError(f"unknown instruction kinds: {sorted(unknown)}")
+        kinds = [kind for kind in mix if mix[kind] > 0]
+        self.emitters = [emitters[kind] for kind in kinds]
+        self.weights = [mix[kind] for kind in kinds]
+
+    def body(self, size: int) -> bytes:
+        """A function body of about ``size`` bytes, including its locals."""
+        out = bytearray(b"\x01\x04\x7f")
+        self.depth = 0
+        rng = self.rng
+        while len(out) < size:
+            for emit in rng.choices(self.emitters, self.weights, k=64):
+                out += emit()
+        out += b"\x0b" * (self.depth + 1)
+        return bytes(out)
+
+    def _local(self) -> bytes:
+        return bytes([self.rng.choice([0x20, 0x20, 0x21, 0x22])]) + uleb(
+            self.rng.randrange(4)
+        )
+
+    def _const(self) -> bytes:
+        return b"\x41" + sleb(self.rng.randrange(-(1 << 20), 1 << 20))
+
+    def _arith(self) -> bytes:
+        return bytes([self.rng.choice([0x6A, 0x6B, 0x6C, 0x71, 0x72, 0x46, 0x48, 0x1A])])
+
+    def _memory(self) -> bytes:
+        opcode = self.rng.choice([0x28, 0x2D, 0x36, 0x29, 0x37])
+        return bytes([opcode]) + uleb(2) + uleb(self.rng.randrange(4096))
+
+    def _call(self) -> bytes:
+        return b"\x10" + uleb(self.rng.randrange(self.functions))
+
+    def _branch(self) -> bytes:
+        if self.rng.random() < 0.1:
+            labels = [uleb(self.rng.randrange(self.depth + 1)) for _ in range(4)]
+            return b"\x0e" + vector(labels) + uleb(0)
+        return b"\x0d" + uleb(self.rng.randrange(self.depth + 1))
+
+    def _wide(self) -> bytes:
+        if self.rng.random() < 0.5:
+            return b"\x42" + sleb(self.rng.randrange(-(1 << 40), 1 << 40))
+        return b"\x44" + struct.pack("<d", self.rng.random())
+
+    def _block(self) -> bytes:
+        if self.depth >= 8:
+            return b""
+        self.depth += 1
+        return bytes([self.rng.choice([0x02, 0x03])]) + b"\x40"
+
+    def _end(self) -> bytes:
+        if not self.depth:
+            return b""
+        self.depth -= 1
+        return b"\x0b"
+
+
+class ValidBodyGenerator(BodyGenerator):
+    """Bodies that pass validation, for a module with one memory.
+
+    Every function has the type ``[] -> []`` and four i32 locals.
+    """
+
+    def _get(self) -> bytes:
+        return b"\x20" + uleb(self.rng.randrange(4))
+
+    def _set(self) -> bytes:
+        return b"\x21" + uleb(self.rng.randrange(4))
+
+    def _local(self) -> bytes:
+        if self.rng.random() < 0.25:
+            return self._get() + b"\x22" + uleb(self.rng.randrange(4)) + self._set()
+        return self._get() + self._set()
+
+    def _const(self) -> bytes:
+        return super()._const() + self._set()
+
+    def _arith(self) -> bytes:
+        opcode = self.rng.choice([0x6A, 0x6B, 0x6C, 0x71, 0x72, 0x46, 0x48])
+        return self._get() + self._get() + bytes([opcode]) + self._set()
+
+    def _memory(self) -> bytes:
+        offset = uleb(self.rng.randrange(4096))
+        choice = self.rng.randrange(5)
+        if choice == 0:
+            return self._get() + b"\x28\x02" + offset + self._set()
+        if choice == 1:
+            return self._get() + b"\x2d\x00" + offset + self._set()
+        if choice == 2:
+            return self._get() + b"\x29\x03" + offset + b"\x1a"
+        if choice == 3:
+            return self._get() + self._get() + b"\x36\x02" + offset
+        return self._get() + b"\x42\x00\x37\x03" + offset
+
+    def _branch(self) -> bytes:
+        return self._get() + super()._branch()
+
+    def _wide(self) -> bytes:
+        return super()._wide() + b"\x1a"
+
+
+def generate(
+    functions: int = 1000,
+    body_size: int = 1024,
+    seed: int = 0,
+    imports: int = 0,
+    exports: int = 0,
+    mix: Optional[Dict[str, int]] = None,
+    valid: bool = False,
+) -> bytes:
+    """Generate a module with ``functions`` bodies of about ``body_size`` bytes.
+
+    ``imports`` function imports come first in the function index space and
+    ``exports`` of the defined functions are exported.  ``mix`` overrides the
+    relative weights in ``DEFAULT_MIX``.  ``valid`` generates a valid module,
+    with a memory for the loads and stores.
+    """
+    rng = random.Random(seed)
+    generator_type = ValidBodyGenerator if valid else BodyGenerator
+    generator = generator_type(
+        rng, imports + functions, dict(DEFAULT_MIX, **(mix or {}))
+    )
+
+    types = section(1, vector([b"\x60\x00\x00"]))
+    import_entries = [name("env") + name(f"f{i}") + b"\x00" + uleb(0) for i in range(imports)]
+    funcs = section(3, vector([uleb(0)] * functions))
+    export_entries = [
+        name(f"e{i}") + b"\x00" + uleb(imports + i * functions // max(exports, 1))
+        for i in range(min(exports, functions))
+    ]
+    bodies = []
+    for i in range(functions):
+        code = generator.body(body_size)
+        bodies.append(uleb(len(code)) + code)
+
+    return b"".join(
+        [
+            b"\x00asm\x01\x00\x00\x00",
+            types,
+            section(2, vector(import_entries)) if imports else b"",
+            funcs,
+            section(5, vector([b"\x00\x01"])) if valid else b"",
+            section(7, vector(export_entries)) if exports else b"",
+            section(10, vector(bodies)),
+        ]
+    )
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """Parse ``kind=weight,kind=weight`` into a mix."""
+    mix = {}
+    for item in filter(None, spec.split(",")):
+        kind, weight = item.split("=")
+        mix[kind.strip()] = int(weight)
+    return mix
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--functions", type=int, default=4000)
+    parser.add_argument("--body-size", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--imports", type=int, default=100)
+    parser.add_argument("--exports", type=int, default=100)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default={},
+        help="Instruction weights, e.g. local=40,memory=20 (kinds: "
+        + ", ".join(DEFAULT_MIX)
+        + ")",
+    )
+
+
+def generate_from_args(args: argparse.Namespace) -> bytes:
+    return generate(
+        args.functions, args.body_size, args.seed, args.imports, args.exports, args.mix
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+    with open(args.output, "wb") as f:
+        f.write(generate_from_args(args))
@@ -34,5 +34,6 @@ setup(
         "Topic :: Software Development :: Interpreters"
     ],
     scripts=['bin/wasm-objdump'],
+    extras_require={'stats': ['numpy']},
     python_requires='>=3.7',
 )
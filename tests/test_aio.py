@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.core import CompactInstructions, LazyFunction
+from wasamole.io import AsyncLoader, as_completed, from_bytes_async, from_file_async
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+WASM_FILES = sorted(TEST_DATA_DIR.glob("*.wasm"))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_from_file_and_bytes():
+    path = TEST_DATA_DIR / "funcs.wasm"
+    expected = wasamole.io.from_file(path)
+    assert run(from_file_async(path)) == expected
+    assert run(from_bytes_async(path.read_bytes())) == expected
+
+    with ThreadPoolExecutor(2) as executor:
+        module = run(from_file_async(path, executor, compact=True))
+    assert isinstance(module.functions[0].instructions, CompactInstructions)
+    lazy = run(from_file_async(path, lazy=True))
+    assert isinstance(lazy.functions[0], LazyFunction)
+
+
+def test_processes():
+    path = TEST_DATA_DIR / "funcs.wasm"
+    expected = wasamole.io.from_file(path)
+
+    async def main(executor):
+        loader = AsyncLoader(executor, 2)
+        module = await loader.from_file(path, compact=False)
+        data = await loader.from_bytes(memoryview(path.read_bytes()), compact=False)
+        compact = await loader.from_file(path, stats=True)
+        with pytest.raises(ValueError, match="previous"):
+            await loader.from_file(path, previous=module)
+        return module, data, compact
+
+    with ProcessPoolExecutor(2) as executor:
+        module, data, compact = run(main(executor))
+    assert module == expected
+    assert data == expected
+    assert isinstance(module.functions[0].instructions, list)
+    assert bytes(module.functions[0].body) == bytes(expected.functions[0].body)
+    assert isinstance(compact.functions[0].instructions, CompactInstructions)
+    assert compact.read_stats is not None
+
+
+def test_as_completed(tmp_path):
+    for path in WASM_FILES:
+        shutil.copy(path, tmp_path)
+
+    async def main():
+        return {name: module async for name, module in as_completed(tmp_path)}
+
+    modules = run(main())
+    assert sorted(Path(name).name for name in modules) == [p.name for p in WASM_FILES]
+    for name, module in modules.items():
+        assert module == wasamole.io.from_file(name)
+
+
+def test_as_completed_file():
+    path = str(TEST_DATA_DIR / "funcs.wasm")
+
+    async def main():
+        return [item async for item in as_completed(path)]
+
+    assert run(main()) == [(path, wasamole.io.from_file(path))]
+
+
+def test_as_completed_errors(tmp_path):
+    bad = tmp_path / "bad.wasm"
+    bad.write_bytes(b"\x00asm\x01\x00\x00\x00\x0a")
+    good = str(TEST_DATA_DIR / "funcs.wasm")
+
+    async def collect(**options):
+        results = {}
+        async for name, module in as_completed([good, str(bad)], **options):
+            results[name] = module
+        return results
+
+    results = run(collect(return_exceptions=True))
+    assert isinstance(results[str(bad)], Exception)
+    assert results[good] == wasamole.io.from_file(good)
+    with pytest.raises(Exception):
+        run(collect())
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """A thread pool that records the peak number of tasks in flight."""
+
+    def __init__(self, workers):
+        super().__init__(workers)
+        self.active = []
+        self.peak = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.active.append(None)
+        self.peak = max(self.peak, len(self.active))
+
+        def task():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.active.pop()
+
+        return super().submit(task)
+
+
+def test_concurrency_is_bounded():
+    async def main(executor):
+        loader = AsyncLoader(executor, 2)
+        return [m async for _, m in loader.as_completed(list(map(str, WASM_FILES)))]
+
+    with CountingExecutor(8) as executor:
+        modules = run(main(executor))
+    assert len(modules) == len(WASM_FILES)
+    assert executor.peak <= 2
+
+
+def test_module_functions_share_a_loader():
+    async def main(executor):
+        path = TEST_DATA_DIR / "funcs.wasm"
+        reads = [from_file_async(path, executor) for _ in range(4 * os.cpu_count())]
+        return await asyncio.gather(*reads)
+
+    with CountingExecutor(8 * os.cpu_count()) as executor:
+        modules = run(main(executor))
+    assert len(modules) == 4 * os.cpu_count()
+    assert executor.peak <= os.cpu_count()
+
+
+def test_stopping_early_cancels_the_rest():
+    async def main():
+        loader = AsyncLoader(concurrency=1)
+        filenames = [str(TEST_DATA_DIR / "funcs.wasm")] * 20
+        iterator = loader.as_completed(filenames)
+        async for name, module in iterator:
+            break
+        await iterator.aclose()
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        return pending
+
+    assert run(main()) == []
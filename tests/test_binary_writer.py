@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.core import (
+    CustomSection,
+    DataSegment,
+    I32Operand,
+    IndexOperand,
+    Instruction,
+    Opcode,
+)
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+WASM_FILES = sorted(TEST_DATA_DIR.glob("*.wasm"))
+
+
+@pytest.mark.parametrize("path", WASM_FILES, ids=lambda p: p.name)
+def test_round_trip_is_identical(path):
+    bytez = path.read_bytes()
+    module = wasamole.io.from_bytes(bytez)
+    assert wasamole.io.to_bytes(module) == bytez
+
+
+@pytest.mark.parametrize("path", WASM_FILES, ids=lambda p: p.name)
+def test_reencoded_round_trip_is_identical(path):
+    bytez = path.read_bytes()
+    module = wasamole.io.from_bytes(bytez)
+    for function in module.functions:
+        function.mark_modified()
+        assert function.body is None
+    assert wasamole.io.to_bytes(module) == bytez
+
+
+def test_unmodified_bodies_are_kept():
+    module = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", lazy=True)
+    assert wasamole.io.to_bytes(module) == (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    assert not any(function.decoded for function in module.functions)
+
+
+def test_modified_function_is_reencoded():
+    module = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm")
+    function = module.functions[3]
+    function.instructions = [
+        Instruction(Opcode.I32_CONST, [I32Operand(300)]),
+        Instruction(Opcode.DROP),
+        Instruction(Opcode.END),
+    ]
+    assert function.body is None
+
+    rewritten = wasamole.io.from_bytes(wasamole.io.to_bytes(module))
+    assert str(rewritten.functions[3].instructions) == str(function.instructions)
+    for before, after in zip(module.functions[:3], rewritten.functions[:3]):
+        assert after.instructions == before.instructions
+
+
+def test_edits_in_place_are_written():
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    module = wasamole.io.from_bytes(bytez)
+    module.functions[3].instructions[10].set_operand(0, IndexOperand(1))
+    module.functions[0].instructions.append(Instruction(Opcode.NOP))
+
+    rewritten = wasamole.io.from_bytes(wasamole.io.to_bytes(module))
+    assert str(rewritten.functions[3].instructions[10]) == "call 1"
+    assert str(rewritten.functions[0].instructions[-1]) == "nop"
+
+
+def test_appends_to_compact_instructions_are_written():
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    module = wasamole.io.from_bytes(bytez, compact=True)
+    module.functions[0].instructions.append(Instruction(Opcode.NOP))
+    assert module.functions[0].unchanged_body is None
+    assert module.functions[1].unchanged_body is not None
+
+    rewritten = wasamole.io.from_bytes(wasamole.io.to_bytes(module))
+    assert str(rewritten.functions[0].instructions[-1]) == "nop"
+
+
+def test_handed_out_lists_are_reencoded():
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    module = wasamole.io.from_bytes(bytez)
+    instructions = module.functions[0].instructions
+    assert module.functions[0].unchanged_body is None
+    assert module.functions[1].unchanged_body is not None
+    instructions.insert(0, Instruction(Opcode.NOP))
+    rewritten = wasamole.io.from_bytes(wasamole.io.to_bytes(module))
+    assert str(rewritten.functions[0].instructions[0]) == "nop"
+
+
+def test_data_segments_round_trip():
+    module = wasamole.io.from_file(TEST_DATA_DIR / "memories.wasm")
+    offset = [
+        Instruction(Opcode.I32_CONST, [I32Operand(1024)]),
+        Instruction(Opcode.END),
+    ]
+    module.add_data(DataSegment(0, offset, b"hello\x00"))
+    module.add_data(DataSegment(0, offset, b""))
+
+    rewritten = wasamole.io.from_bytes(wasamole.io.to_bytes(module))
+    assert len(rewritten.datas) == 2
+    assert str(rewritten.datas[0].offset_expression) == str(offset)
+    assert bytes(rewritten.datas[0].data) == b"hello\x00"
+    assert bytes(rewritten.datas[1].data) == b""
+
+
+def custom(name, payload):
+    contents = bytes([len(name)]) + name.encode() + payload
+    return b"\x00" + bytes([len(contents)]) + contents
+
+
+def test_custom_sections_keep_their_place():
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    headers = wasamole.io.headers_from_bytes(bytez)
+    # dylink must come first and name after everything else.
+    parts = [bytez[:8], custom("dylink.0", b"\x01\x02")]
+    start = 8
+    for i, header in enumerate(headers):
+        end = header.offset + header.size
+        parts.append(bytez[start:end])
+        if i % 2 == 0:
+            parts.append(custom(f"after{header.id}", bytes(range(i))))
+        start = end
+    parts.append(custom("name", b""))
+    customized = b"".join(parts)
+
+    module = wasamole.io.from_bytes(customized)
+    assert [c.name for c in module.customs][0] == "dylink.0"
+    assert wasamole.io.to_bytes(module) == customized
+
+    module.add_custom(CustomSection("added", b"\xff" * 1000))
+    rewritten = wasamole.io.to_bytes(module)
+    assert rewritten.startswith(customized)
+    assert wasamole.io.from_bytes(rewritten).customs[-1].data == b"\xff" * 1000
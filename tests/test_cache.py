@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from pathlib import Path
+
+from .context import wasamole
+from wasamole.core import CompactInstructions
+from wasamole.io import ModuleCache
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def test_cache_hit_matches_parse(tmp_path):
+    cache = ModuleCache(tmp_path)
+    for path in sorted(TEST_DATA_DIR.glob("*.wasm")):
+        expected = wasamole.io.from_file(path)
+        miss = wasamole.io.from_file(path, cache=cache)
+        hit = wasamole.io.from_file(path, cache=cache)
+        text = wasamole.io.to_text_string(expected)
+        assert wasamole.io.to_text_string(miss) == text
+        assert wasamole.io.to_text_string(hit) == text
+        assert wasamole.io.to_bytes(hit) == path.read_bytes()
+    assert len(cache.entries()) == len(list(TEST_DATA_DIR.glob("*.wasm")))
+
+
+def test_cache_compact_hit(tmp_path):
+    cache = ModuleCache(tmp_path)
+    path = TEST_DATA_DIR / "funcs.wasm"
+    wasamole.io.from_file(path, cache=cache)
+    hit = wasamole.io.from_file(path, cache=cache, compact=True)
+    expected = wasamole.io.from_file(path)
+    for h, e in zip(hit.functions, expected.functions):
+        assert isinstance(h.instructions, CompactInstructions)
+        assert list(h.instructions) == e.instructions
+
+
+def test_cache_key(tmp_path):
+    cache = ModuleCache(tmp_path)
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    assert cache.key(bytez) == cache.key(bytearray(bytez))
+    assert cache.key(bytez) != cache.key(bytez + b"\x00")
+    assert cache.key(bytez) != cache.key(bytez, sections=["code"])
+    assert cache.key(bytez, ["type", "code"]) == cache.key(bytez, ["code", "type"])
+
+
+def test_cache_ignores_bad_entries(tmp_path):
+    cache = ModuleCache(tmp_path)
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    key = cache.key(bytez)
+    Path(cache.path(key)).write_bytes(b"WSMC\x01garbage")
+    assert cache.get(key, bytez) is None
+    module = cache.load(bytez)
+    assert len(module.functions) == 4
+    assert cache.get(key, bytez) is not None
+
+    # Entries are plain data checked against their key and the input.
+    entry = Path(cache.path(key)).read_bytes()
+    other = cache.key(bytez + b"\x00")
+    Path(cache.path(other)).write_bytes(entry)
+    assert cache.get(other, bytez) is None
+    Path(cache.path(key)).write_bytes(entry[:-1])
+    assert cache.get(key, bytez) is None
+    edited = wasamole.io.from_bytes(bytez)
+    edited.functions[0].instructions = wasamole.core.disassemble(b"\x01\x0b")
+    Path(cache.path(key)).write_bytes(wasamole.io.cache._entry(key, edited))
+    assert cache.get(key, bytez) is None
+
+
+def test_cache_lru_eviction(tmp_path):
+    paths = sorted(TEST_DATA_DIR.glob("*.wasm"))[:3]
+    cache = ModuleCache(tmp_path)
+    keys = []
+    for i, path in enumerate(paths):
+        bytez = path.read_bytes()
+        keys.append(cache.key(bytez))
+        cache.load(bytez)
+        # Modification times order the entries; keep them distinct.
+        os.utime(cache.path(keys[-1]), (time.time() - 100 + i, time.time() - 100 + i))
+
+    # Touch the oldest entry so that the second one becomes least recent.
+    assert cache.get(keys[0], paths[0].read_bytes()) is not None
+    sizes = {path: size for _, size, path in cache.entries()}
+    cache.max_size = cache.size() - 1
+    cache.evict()
+
+    assert not os.path.exists(cache.path(keys[1]))
+    assert os.path.exists(cache.path(keys[0]))
+    assert os.path.exists(cache.path(keys[2]))
+    assert cache.size() <= cache.max_size
+    assert sum(sizes.values()) > cache.size()
+
+
+def test_cache_leaves_no_temporary_files(tmp_path):
+    cache = ModuleCache(tmp_path, max_size=0)
+    cache.load((TEST_DATA_DIR / "funcs.wasm").read_bytes())
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_hit_refers_to_the_input(tmp_path):
+    cache = ModuleCache(tmp_path)
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    cache.load(bytez)
+    hit = cache.load(bytez)
+    for function in hit.functions:
+        assert function.body.obj is bytez
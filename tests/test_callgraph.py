@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.analysis import CallGraph
+from wasamole.core import (
+    FuncExport,
+    Function,
+    FunctionType,
+    Module,
+    TypeImport,
+    disassemble,
+)
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def calls(*indices):
+    """A body calling each of ``indices`` in turn."""
+    return disassemble(b"".join(b"\x10" + bytes([i]) for i in indices) + b"\x0b")
+
+
+def make_module():
+    # 0 and 1 are imported; 2 is exported and calls 3 and 0 (twice); 3
+    # calls itself and 1; 4 calls 3 but is never called; 5 is the start.
+    module = Module()
+    module.add_type(FunctionType([], []))
+    module.add_import(TypeImport("env", "a", 0))
+    module.add_import(TypeImport("env", "b", 0))
+    for body in [calls(3, 0, 0), calls(3, 1), calls(3), calls()]:
+        module.add_function(Function(0, [], body))
+    module.add_export(FuncExport("main", 2))
+    module.set_start(5)
+    return module
+
+
+def rows(graph):
+    return (
+        [list(graph.callees(i)) for i in range(len(graph))],
+        [list(graph.callers(i)) for i in range(len(graph))],
+    )
+
+
+def test_callers_and_callees():
+    graph = CallGraph.build(make_module())
+    assert len(graph) == 6
+    assert graph.imported == 2
+    callees, callers = rows(graph)
+    assert callees == [[], [], [0, 3], [1, 3], [3], []]
+    assert callers == [[2], [3], [], [2, 3, 4], [], []]
+
+
+def test_reachable():
+    graph = CallGraph.build(make_module())
+    assert list(graph.roots) == [2, 5]
+    assert graph.reachable() == [True, True, True, True, False, True]
+    assert graph.reachable([4]) == [False, True, False, True, True, False]
+
+
+def test_compact_matches():
+    module = make_module()
+    compact = Module(
+        module.types,
+        module.imports,
+        [
+            Function(0, [], wasamole.core.CompactInstructions.from_instructions(f.instructions))
+            for f in module.functions
+        ],
+    )
+    assert rows(CallGraph.build(compact)) == rows(CallGraph.build(module))
+
+
+def test_update():
+    module = make_module()
+    graph = CallGraph.build(module)
+    module.functions[1].instructions = calls(0, 4)
+    graph.update(module, 3)
+    assert graph == CallGraph.build(module)
+    assert list(graph.callers(3)) == [2, 4]
+    assert list(graph.callers(4)) == [3]
+    assert list(graph.callers(1)) == []
+
+    module.functions[2].instructions.extend(calls(5)[:-1])
+    module.functions[2].mark_modified()
+    graph.update(module, 4)
+    assert graph == CallGraph.build(module)
+
+    with pytest.raises(ValueError):
+        graph.update(module, 0)
+    module.add_function(Function(0, [], calls()))
+    with pytest.raises(ValueError):
+        graph.update(module, 2)
+
+
+def test_test_data():
+    for path in sorted(TEST_DATA_DIR.glob("*.wasm")):
+        module = wasamole.io.from_file(str(path))
+        graph = CallGraph.build(module)
+        assert len(graph) == len(module.function_imports()) + len(module.functions)
+        for i, function in enumerate(module.functions, graph.imported):
+            targets = {
+                instr.operands[0].index
+                for instr in function.instructions
+                if instr.opname == "call"
+            }
+            assert sorted(targets) == list(graph.callees(i))
+            for target in targets:
+                assert i in graph.callers(target)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.analysis import ControlFlowGraph, function_cfg, module_cfgs
+from wasamole.core import CompactInstructions, Function, disassemble
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+IF_ELSE = (
+    b"\x20\x00"  # 0: local.get 0
+    b"\x04\x7f"  # 1: if (result i32)
+    b"\x41\x01"  # 2: i32.const 1
+    b"\x05"  # 3: else
+    b"\x41\x02"  # 4: i32.const 2
+    b"\x0b"  # 5: end
+    b"\x0b"  # 6: end
+)
+
+LOOP = (
+    b"\x02\x40"  # 0: block
+    b"\x03\x40"  # 1: loop
+    b"\x20\x00"  # 2: local.get 0
+    b"\x45"  # 3: i32.eqz
+    b"\x0d\x01"  # 4: br_if 1
+    b"\x20\x00"  # 5: local.get 0
+    b"\x41\x01"  # 6: i32.const 1
+    b"\x6b"  # 7: i32.sub
+    b"\x21\x00"  # 8: local.set 0
+    b"\x0c\x00"  # 9: br 0
+    b"\x0b"  # 10: end
+    b"\x0b"  # 11: end
+    b"\x0b"  # 12: end
+)
+
+BR_TABLE = (
+    b"\x02\x40"  # 0: block
+    b"\x02\x40"  # 1: block
+    b"\x20\x00"  # 2: local.get 0
+    b"\x0e\x02\x00\x01\x02"  # 3: br_table [0, 1] 2
+    b"\x0b"  # 4: end
+    b"\x0f"  # 5: return
+    b"\x0b"  # 6: end
+    b"\x00"  # 7: unreachable
+    b"\x0b"  # 8: end
+)
+
+
+def both(code):
+    """The graph built from a list and from compact instructions."""
+    cfg = ControlFlowGraph.build(disassemble(code))
+    assert ControlFlowGraph.build(CompactInstructions.decode(code)) == cfg
+    return cfg
+
+
+def test_straight_line():
+    cfg = both(b"\x41\x01\x1a\x0b")
+    assert [(b.start, b.end) for b in cfg.blocks] == [(0, 3)]
+    assert list(cfg.edges()) == []
+    assert list(cfg.exits) == [0]
+
+
+def test_if_else():
+    cfg = both(IF_ELSE)
+    assert [(b.start, b.end) for b in cfg.blocks] == [(0, 2), (2, 4), (4, 5), (5, 7)]
+    assert sorted(cfg.edges()) == [(0, 1), (0, 2), (1, 3), (2, 3)]
+    assert cfg.predecessors_of(3) == [1, 2]
+    assert cfg.end_of(1) == 5
+    assert cfg.end_of(3) == 5
+    assert list(cfg.exits) == [3]
+
+
+def test_if_without_else():
+    cfg = both(b"\x20\x00\x04\x40\x01\x0b\x0b")
+    assert [(b.start, b.end) for b in cfg.blocks] == [(0, 2), (2, 3), (3, 5)]
+    assert sorted(cfg.edges()) == [(0, 1), (0, 2), (1, 2)]
+
+
+def test_loop():
+    cfg = both(LOOP)
+    assert [(b.start, b.end) for b in cfg.blocks] == [(0, 1), (1, 5), (5, 10), (10, 11), (11, 13)]
+    assert sorted(cfg.edges()) == [(0, 1), (1, 2), (1, 4), (2, 1), (3, 4)]
+    assert cfg.targets_of(4) == [11]
+    assert cfg.targets_of(9) == [1]
+    assert cfg.end_of(0) == 11
+    assert cfg.end_of(1) == 10
+    assert cfg.reachable() == [True, True, True, False, True]
+    assert cfg.block_at(7) == 2
+    with pytest.raises(KeyError):
+        cfg.targets_of(5)
+    with pytest.raises(IndexError):
+        cfg.block_at(13)
+
+
+def test_br_table():
+    cfg = both(BR_TABLE)
+    assert cfg.targets_of(3) == [4, 6, 8]
+    assert [(b.start, b.end) for b in cfg.blocks] == [(0, 4), (4, 6), (6, 8), (8, 9)]
+    assert sorted(cfg.edges()) == [(0, 1), (0, 2)]
+    # The default label leaves the function and block 1 returns; block 2
+    # ends in unreachable and block 3 cannot be reached at all.
+    assert sorted(cfg.exits) == [0, 1, 3]
+    assert cfg.successors_of(2) == []
+    assert cfg.reachable() == [True, True, True, False]
+
+
+def test_test_data_matches_compact():
+    for path in sorted(TEST_DATA_DIR.glob("*.wasm")):
+        module = wasamole.io.from_file(str(path))
+        for function in module.functions:
+            instructions = function.instructions
+            cfg = ControlFlowGraph.build(instructions)
+            compact = CompactInstructions.from_instructions(instructions)
+            assert ControlFlowGraph.build(compact) == cfg
+            assert cfg.starts[-1] == len(instructions)
+
+
+def test_cached_per_function():
+    function = Function(0, [], disassemble(LOOP))
+    cfg = function_cfg(function)
+    assert function_cfg(function) is cfg
+    function.mark_modified()
+    assert function_cfg(function) is not cfg
+
+    cfg = function_cfg(function)
+    function.instructions = disassemble(IF_ELSE)
+    assert len(function_cfg(function)) == 4
+    assert pickle.loads(pickle.dumps(function))._analyses is None
+
+
+def test_module_cfgs():
+    module = wasamole.io.from_file(str(TEST_DATA_DIR / "funcs.wasm"))
+    cfgs = module_cfgs(module)
+    assert len(cfgs) == len(module.functions)
+    assert all(function_cfg(f) is g for f, g in zip(module.functions, cfgs))
+
+
+def test_unterminated_body():
+    with pytest.raises(ValueError):
+        ControlFlowGraph.build(disassemble(b"\x02\x40\x0b"))
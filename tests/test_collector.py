@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import threading
+
+from .context import wasamole
+from wasamole.util.collector import paused_collection
+
+
+def test_collection_is_paused_on_the_main_thread_only():
+    assert gc.isenabled()
+    with paused_collection():
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+    states = []
+
+    def run():
+        with paused_collection():
+            states.append(gc.isenabled())
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert states == [True]
+
+
+def test_collection_stays_paused_if_it_was():
+    gc.disable()
+    try:
+        with paused_collection():
+            pass
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
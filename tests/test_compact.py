@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from .context import wasamole
+from wasamole.core import (
+    CompactInstructions,
+    I32Operand,
+    Instruction,
+    Opcode,
+    disassemble,
+)
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+CODE = (
+    b"\x02\x7f"  # block (result i32)
+    b"\x43\x00\x00\xc0\x3f"  # f32.const 1.5
+    b"\x44\x00\x00\x00\x00\x00\x00\xf0\xbf"  # f64.const -1
+    b"\x42\x80\x80\x80\x80\x80\x80\x80\x80\x80\x7f"  # i64.const min
+    b"\x28\x02\xff\xff\xff\xff\x0f"  # i32.load offset=0xffffffff
+    b"\x0e\x02\x00\x01\x02"  # br_table [0, 1] 2
+    b"\x11\x01\x00"  # call_indirect 1
+    b"\x3f\x00"  # memory.size
+    b"\x0b"
+)
+
+
+def test_decode_matches_disassemble():
+    ci = CompactInstructions.decode(CODE)
+    instrs = disassemble(CODE)
+    assert len(ci) == len(instrs)
+    assert [str(i) for i in ci] == [str(i) for i in instrs]
+    assert [i.size for i in ci] == [i.size for i in instrs]
+    assert ci == instrs
+    assert ci[-1].opcode == Opcode.END
+    assert ci.opcode_at(5) == Opcode.BR_TABLE
+    assert ci[4].operands[0].offset == 0xFFFFFFFF
+
+
+def test_from_instructions():
+    ci = CompactInstructions.from_instructions(disassemble(CODE))
+    assert ci == CompactInstructions.decode(CODE)
+    ci += disassemble(b"\x01\x0b")
+    assert len(ci) == len(disassemble(CODE)) + 2
+    assert ci.offsets[-1] == len(CODE) + 2
+
+
+def test_compact_module():
+    eager = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm")
+    compact = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", compact=True)
+    for e, c in zip(eager.functions, compact.functions):
+        assert isinstance(c.instructions, CompactInstructions)
+        assert c.instructions == e.instructions
+    assert wasamole.io.to_text_string(compact) == wasamole.io.to_text_string(eager)
+
+    lazy = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", lazy=True, compact=True)
+    assert isinstance(lazy.functions[3].instructions, CompactInstructions)
+
+
+def test_setitem_matches_list():
+    replacements = disassemble(
+        b"\x41\x80\x80\x04"  # i32.const 65536, longer than memory.size
+        b"\x0e\x01\x03\x04"  # br_table [3] 4
+        b"\x01"  # nop, shorter than f64.const
+    )
+    ci = CompactInstructions.decode(CODE)
+    instrs = disassemble(CODE)
+    for i, instr in zip([6, 5, -8], replacements):
+        ci[i] = instr
+        instrs[i] = instr
+    assert ci == instrs
+    assert list(ci.offsets[1:]) == list(_ends(instrs))
+
+    ci[1:3] = replacements[:1]
+    instrs[1:3] = replacements[:1]
+    assert ci == instrs
+    assert list(ci.offsets[1:]) == list(_ends(instrs))
+
+
+def test_built_instructions_get_their_encoded_size():
+    built = [Instruction(i.opcode, i.operands) for i in disassemble(CODE)]
+    assert all(i.size == 0 for i in built)
+    ci = CompactInstructions.from_instructions(built)
+    assert ci == CompactInstructions.decode(CODE)
+
+    ci[0] = Instruction(Opcode.I32_CONST, [I32Operand(-65)])
+    assert ci[0].size == 3
+
+
+def test_insert_and_delitem_match_list():
+    ci = CompactInstructions.decode(CODE)
+    instrs = disassemble(CODE)
+    version = ci.version
+    nop = Instruction(Opcode.NOP)
+    for i in [0, 5, -1, 100]:
+        ci.insert(i, nop)
+        instrs.insert(i, disassemble(b"\x01")[0])
+    assert ci == instrs
+    del ci[5]
+    del instrs[5]
+    del ci[2:4]
+    del instrs[2:4]
+    assert ci == instrs
+    assert list(ci.offsets[1:]) == list(_ends(instrs))
+    assert ci.version > version
+
+
+def test_setitem_in_a_module():
+    module = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", compact=True)
+    function = module.functions[3]
+    function.instructions[0] = disassemble(b"\x41\x2a")[0]  # i32.const 42
+    function.mark_modified()
+    reread = wasamole.io.from_bytes(wasamole.io.to_bytes(module), compact=True)
+    assert reread.functions[3].instructions == function.instructions
+    assert str(reread.functions[3].instructions[0]) == "i32.const 42"
+
+
+def _ends(instrs):
+    end = 0
+    for instr in instrs:
+        end += instr.size
+        yield end
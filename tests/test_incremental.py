@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.core import Function, FunctionType, LazyFunction, disassemble
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def read(compact=False):
+    bytez = (TEST_DATA_DIR / "funcs.wasm").read_bytes()
+    return bytez, wasamole.io.from_bytes(bytez, compact=compact)
+
+
+def reused(function, previous):
+    """Whether the instructions of ``function`` were copied from those of
+    ``previous`` rather than decoded."""
+    pairs = zip(function.peek_instructions(), previous.peek_instructions())
+    return all(f is p for f, p in pairs)
+
+
+def assert_same(module, expected):
+    assert module == expected
+    for f, e in zip(module.functions, expected.functions):
+        assert bytes(f.body) == bytes(e.body)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_unchanged_bodies_are_reused(compact):
+    bytez, previous = read(compact)
+    module = wasamole.io.from_bytes(bytez, compact=compact, previous=previous)
+    assert_same(module, previous)
+    for f, p in zip(module.functions, previous.functions):
+        assert f is not p
+        assert f.instructions is not p.instructions
+        assert f.locals is not p.locals
+        assert compact or reused(f, p)
+    module.functions[0].instructions.append(disassemble(b"\x01")[0])
+    assert previous == read(compact)[1]
+
+
+def test_changed_body_is_decoded():
+    bytez, previous = read()
+    edited = wasamole.io.from_bytes(bytez)
+    edited.functions[3].instructions = disassemble(
+        b"\x41\x07"  # i32.const 7
+        b"\x1a"  # drop
+        b"\x0b"  # end
+    )
+    new_bytes = wasamole.io.to_bytes(edited)
+
+    module = wasamole.io.from_bytes(new_bytes, previous=previous)
+    assert_same(module, wasamole.io.from_bytes(new_bytes))
+    copied = [reused(f, p) for f, p in zip(module.functions, previous.functions)]
+    assert copied == [True, True, True, False]
+
+
+def test_bodies_are_matched_by_content():
+    bytez, previous = read()
+    edited = wasamole.io.from_bytes(bytez)
+    edited.add_type(FunctionType([], []))
+    empty = Function(len(edited.types) - 1, [], disassemble(b"\x0b"))
+    edited.functions.insert(0, empty)
+    new_bytes = wasamole.io.to_bytes(edited)
+
+    module = wasamole.io.from_bytes(new_bytes, previous=previous)
+    assert_same(module, wasamole.io.from_bytes(new_bytes))
+    assert not reused(module.functions[0], previous.functions[0])
+    for f, p in zip(module.functions[1:], previous.functions):
+        assert reused(f, p)
+        assert f.type_index == p.type_index
+
+
+def test_only_decoded_bodies_of_the_same_form_are_reused():
+    bytez, compact = read(compact=True)
+    module = wasamole.io.from_bytes(bytez, previous=compact)
+    assert all(isinstance(f.instructions, list) for f in module.functions)
+
+    lazy = wasamole.io.from_bytes(bytez, lazy=True)
+    lazy.functions[0].peek_instructions()
+    module = wasamole.io.from_bytes(bytez, lazy=True, previous=lazy)
+    assert reused(module.functions[0], lazy.functions[0])
+    assert all(isinstance(f, LazyFunction) for f in module.functions[1:])
+    assert not any(f.decoded for f in module.functions[1:])
+
+
+def test_reused_functions_are_independent():
+    bytez, previous = read()
+    module = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", previous=previous)
+    module.functions[1].instructions = disassemble(b"\x0b")
+    assert module.functions[1].body is None
+    assert previous.functions[1].body is not None
+    assert len(previous.functions[1].instructions) > 1
+
+    module.functions[2].instructions.append(disassemble(b"\x01")[0])
+    module.functions[2].locals.clear()
+    assert previous.functions[2] == read()[1].functions[2]
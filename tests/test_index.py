@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.analysis import INDEX_SUFFIX, InstructionIndex, Posting
+from wasamole.core import Function, FunctionType, Module, Opcode, disassemble
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def module():
+    m = Module()
+    m.add_type(FunctionType([], []))
+    m.add_function(Function(0, [], disassemble(b"\x0b")))  # 0: empty
+    m.add_function(
+        Function(
+            0,
+            [],
+            disassemble(
+                b"\x41\x7f"  # 0: i32.const -1
+                b"\x24\x01"  # 1: global.set 1
+                b"\x41\x00"  # 2: i32.const 0
+                b"\x28\x02\x80\x80\x04"  # 3: i32.load offset=0x10000
+                b"\x24\x00"  # 4: global.set 0
+                b"\x41\x00"  # 5: i32.const 0
+                b"\x28\x02\x81\x80\x04"  # 6: i32.load offset=0x10001
+                b"\x0e\x01\x00\x00"  # 7: br_table [0] 0
+                b"\x0b"  # 8: end
+            ),
+        )
+    )
+    m.add_function(
+        Function(
+            0,
+            [],
+            disassemble(
+                b"\x44\x00\x00\x00\x00\x00\x00\xe0\x3f"  # 0: f64.const 0.5
+                b"\x1a"  # 1: drop
+                b"\x41\x00"  # 2: i32.const 0
+                b"\x24\x00"  # 3: global.set 0
+                b"\x0b"  # 4: end
+            ),
+        )
+    )
+    return m
+
+
+def positions(postings):
+    return [(p.function, p.instruction) for p in postings]
+
+
+def test_find():
+    index = InstructionIndex.build(module())
+    assert len(index) == 15
+    assert index.count(Opcode.END) == 3
+    assert positions(index.find(Opcode.GLOBAL_SET)) == [(1, 4), (2, 3), (1, 1)]
+    assert positions(index.find(Opcode.GLOBAL_SET, 0)) == [(1, 4), (2, 3)]
+    assert positions(index.find(Opcode.I32_CONST, -1)) == [(1, 0)]
+    assert positions(index.find(0x41, 0)) == [(1, 2), (1, 5), (2, 2)]
+    assert positions(index.find(Opcode.F64_CONST, 0.5)) == [(2, 0)]
+    assert index.find(Opcode.F64_CONST, 0.25) == []
+    assert index.find(Opcode.CALL) == []
+
+
+def test_between_and_where():
+    index = InstructionIndex.build(module())
+    assert positions(index.between(Opcode.I32_LOAD, 0x10001)) == [(1, 6)]
+    assert positions(index.between(Opcode.I32_LOAD, high=0x10000)) == [(1, 3)]
+    assert positions(index.between(Opcode.GLOBAL_SET, 1, 1)) == [(1, 1)]
+    wide = index.where(Opcode.I32_LOAD, lambda operands: operands[0].offset > 0)
+    assert positions(wide) == [(1, 3), (1, 6)]
+    labels = index.where(Opcode.BR_TABLE, lambda operands: operands[0].indices == [0])
+    assert positions(labels) == [(1, 7)]
+
+
+def test_bad_keys():
+    index = InstructionIndex.build(module())
+    with pytest.raises(ValueError, match="no operand"):
+        index.find(Opcode.DROP, 0)
+    with pytest.raises(ValueError, match="no operand"):
+        index.find(Opcode.BR_TABLE, 0)
+    with pytest.raises(ValueError, match="by range"):
+        index.between(Opcode.F64_CONST, 0)
+    with pytest.raises(TypeError):
+        index.find(Opcode.CALL, 1.5)
+
+
+@pytest.mark.parametrize("path", sorted(TEST_DATA_DIR.glob("*.wasm")))
+@pytest.mark.parametrize("compact", [False, True])
+def test_matches_a_scan(path, compact):
+    m = wasamole.io.from_file(path, compact=compact)
+    index = InstructionIndex.build(m)
+    imported = len(m.function_imports())
+    expected = {}
+    for code_i, function in enumerate(m.functions):
+        address = function.address
+        for i, instruction in enumerate(function.instructions):
+            byte = instruction.opcode.value
+            posting = Posting(imported + code_i, i, address)
+            expected.setdefault(byte, set()).add(posting)
+            address += instruction.size
+    for byte in range(256):
+        assert set(index.find(byte)) == expected.get(byte, set())
+
+
+def test_serialization():
+    index = InstructionIndex.build(module())
+    copy = InstructionIndex.from_serialized(index.to_bytes())
+    assert copy.digest == b""
+    for opcode in Opcode:
+        assert copy.find(opcode) == index.find(opcode)
+
+    with pytest.raises(ValueError):
+        InstructionIndex.from_serialized(b"WSMC")
+    with pytest.raises(ValueError, match="truncated"):
+        InstructionIndex.from_serialized(index.to_bytes()[:-1])
+
+
+def test_saved_next_to_the_module(tmp_path):
+    path = tmp_path / "funcs.wasm"
+    shutil.copy(TEST_DATA_DIR / "funcs.wasm", path)
+    saved = Path(str(path) + INDEX_SUFFIX)
+
+    InstructionIndex.from_file(path)
+    assert not saved.exists()
+    index = InstructionIndex.from_file(path, cache=True)
+    assert saved.exists()
+    assert index.digest == InstructionIndex.from_bytes(path.read_bytes()).digest
+    assert len(InstructionIndex.load(saved)) == len(index)
+
+    # A saved index for other bytes is rebuilt.
+    m = wasamole.io.from_file(path)
+    m.functions[0].instructions = disassemble(b"\x0b")
+    path.write_bytes(wasamole.io.to_bytes(m))
+    rebuilt = InstructionIndex.from_file(path, cache=True)
+    assert len(rebuilt) == sum(len(f.instructions) for f in m.functions)
+    assert InstructionIndex.load(saved).digest == rebuilt.digest
+
+
+def test_saved_in_a_directory(tmp_path):
+    directory = tmp_path / "indices"
+    directory.mkdir()
+    path = TEST_DATA_DIR / "funcs.wasm"
+    index = InstructionIndex.from_file(path, cache=True, directory=directory)
+    saved = directory / ("funcs.wasm" + INDEX_SUFFIX)
+    assert len(InstructionIndex.load(saved)) == len(index)
+    assert not Path(str(path) + INDEX_SUFFIX).exists()
+
+
+def test_unsaved_index_is_still_returned(tmp_path):
+    path = TEST_DATA_DIR / "funcs.wasm"
+    expected = len(InstructionIndex.from_file(path))
+    missing = tmp_path / "missing"
+    assert len(InstructionIndex.from_file(path, True, missing)) == expected
+
+    # The saved index's name is taken by a directory, so it cannot be
+    # renamed into place.
+    os.mkdir(tmp_path / ("funcs.wasm" + INDEX_SUFFIX))
+    assert len(InstructionIndex.from_file(path, True, tmp_path)) == expected
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["funcs.wasm.idx"]
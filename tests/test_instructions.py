@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import pickle
+
+import pytest
+
+from .context import wasamole
+from wasamole.core import (
+    CompactInstructions,
+    Function,
+    FunctionType,
+    I32Operand,
+    IndexOperand,
+    Instruction,
+    Local,
+    Opcode,
+    ValueType,
+    disassemble,
+    disassemble_instruction,
+)
+from wasamole.util.bytes_reader import ByteReader
+
+
+def test_disassemble_sizes():
+    instrs = disassemble(b"\x41\xc0\x00\x20\x00\x6a\x0b")
+    assert [str(i) for i in instrs] == ["i32.const 64", "local.get 0", "i32.add", "end"]
+    assert [i.size for i in instrs] == [3, 2, 1, 1]
+
+
+def test_disassemble_buffer_types():
+    code = b"\x42\x7f\x1a\x0b"
+    expected = disassemble(code)
+    assert disassemble(bytearray(code)) == expected
+    assert disassemble(memoryview(b"\x00\x00" + code)[2:]) == expected
+
+
+def test_disassemble_instruction():
+    instr = disassemble_instruction(b"\x28\x02\x10\x0b")
+    assert instr.opcode == Opcode.I32_LOAD
+    assert instr.size == 3
+
+
+def test_sleb():
+    assert ByteReader(b"\x7e").sleb() == -2
+    assert ByteReader(b"\xc0\x00").sleb() == 64
+    assert ByteReader(b"\x80\x7f").sleb() == -128
+    assert ByteReader(b"\xff\xff\xff\xff\x07").sleb() == 0x7FFFFFFF
+
+
+def test_view_does_not_copy():
+    data = bytearray(b"\x00asm\x01\x00\x00\x00")
+    r = ByteReader(data)
+    r.skip(4)
+    view = r.view(4)
+    data[4] = 0x02
+    assert view[0] == 0x02
+    assert r.eos()
+
+
+def test_reserved_zero_byte():
+    instrs = disassemble(b"\x41\x01\x40\x00\x1a\x11\x02\x00\x0b")
+    assert [i.opcode for i in instrs] == [
+        Opcode.I32_CONST,
+        Opcode.MEMORY_GROW,
+        Opcode.DROP,
+        Opcode.CALL_INDIRECT,
+        Opcode.END,
+    ]
+    assert instrs[3].operands[0].index == 2
+    assert instrs[3].size == 3
+
+
+def test_br_table():
+    instr = disassemble_instruction(b"\x0e\x02\x00\x01\x02")
+    assert instr.size == 5
+    assert instr.operands[0].indices == [0, 1]
+    assert instr.operands[1].index == 2
+
+
+def test_operand_types():
+    assert Instruction(Opcode.I32_ADD).operand_types == []
+    assert Instruction(Opcode.I32_ADD).operands == []
+    assert len(Instruction(Opcode.BR_TABLE).operands) == 2
+
+
+def test_invalid_opcode():
+    with pytest.raises(ValueError):
+        disassemble(b"\xff")
+
+
+def test_shared_instructions():
+    code = (
+        b"\x20\x00"  # local.get 0
+        b"\x20\x00"  # local.get 0
+        b"\x41\x7f"  # i32.const -1
+        b"\x41\xff\x00"  # i32.const 127
+        b"\x6a"  # i32.add
+        b"\x6a"  # i32.add
+        b"\x0b"  # end
+    )
+    instrs = disassemble(code)
+    assert instrs[4] is instrs[5]
+    # Instructions with operands are not shared, and nor are their operands.
+    assert instrs[0] is not instrs[1]
+    assert instrs[0].operands[0] is not instrs[1].operands[0]
+    assert instrs[2].operands[0].value == -1
+    assert instrs[3].size == 3
+    assert instrs[3].operands[0].value == 127
+
+    assert instrs[0] == Instruction(Opcode.LOCAL_GET, [IndexOperand(0)], 2)
+    assert instrs[4] == Instruction(Opcode.I32_ADD, [], 1)
+    assert instrs[4] != Instruction(Opcode.I32_ADD)
+    assert isinstance(instrs[4].operands, list)
+    with pytest.raises(AttributeError):
+        instrs[4].size = 3
+    with pytest.raises(AttributeError):
+        instrs[4].operands.append(IndexOperand(0))
+
+    # Only the instruction that was changed changes.
+    instrs[0].set_operand(0, IndexOperand(5))
+    instrs[0].set_size(3)
+    instrs[2].operands[0].value = 5
+    assert str(instrs[0]) == "local.get 5"
+    assert str(instrs[1]) == "local.get 0"
+    assert str(instrs[2]) == "i32.const 5"
+    assert str(disassemble(code)[2]) == "i32.const -1"
+
+    assert pickle.loads(pickle.dumps(instrs)) == instrs
+    assert pickle.loads(pickle.dumps(instrs[4])) is instrs[4]
+    assert copy.deepcopy(instrs)[4] is instrs[4]
+    compact = CompactInstructions.decode(code)
+    assert [a is b for a, b in zip(compact.to_list(), instrs)] == [
+        False, False, False, False, True, True, True
+    ]
+    assert compact[4] is instrs[4]
+    assert compact[0].operands[0] == instrs[1].operands[0]
+
+
+def test_slots():
+    operand = I32Operand(1 << 20)
+    objects = [
+        disassemble(b"\x41\x80\x80\xc0\x00")[0],
+        operand,
+        Function(0, [Local(ValueType.i32)]),
+        Local(ValueType.i64),
+        FunctionType([ValueType.i32], []),
+    ]
+    for obj in objects:
+        assert not hasattr(obj, "__dict__")
+    assert pickle.loads(pickle.dumps(operand)) == operand
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from .context import wasamole
+from wasamole.core import LazyFunction
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def test_lazy_functions_not_decoded():
+    wasm_binary = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", lazy=True)
+    assert len(wasm_binary.functions) == 4
+    for function in wasm_binary.functions:
+        assert isinstance(function, LazyFunction)
+        assert not function.decoded
+
+
+def test_lazy_matches_eager():
+    eager = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm")
+    lazy = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", lazy=True)
+    for e, l in zip(eager.functions, lazy.functions):
+        assert l.address == e.address
+        assert l.size == e.size
+        assert l.name == e.name
+        assert l.instructions == e.instructions
+        assert l.decoded
+        assert l.locals == e.locals
+    assert wasamole.io.to_text_string(lazy) == wasamole.io.to_text_string(eager)
+
+
+def test_lazy_assignment():
+    wasm_binary = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", lazy=True)
+    function = wasm_binary.functions[3]
+    function.instructions = function.instructions[:1]
+    assert len(function.instructions) == 1
+    assert len(function.locals) == 0
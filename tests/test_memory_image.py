@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from .context import wasamole
+from wasamole.analysis import MemoryImage, evaluate_constant
+from wasamole.core import (
+    DataSegment,
+    Global,
+    GlobalImport,
+    GlobalType,
+    LimitType,
+    MemoryType,
+    Module,
+    MutType,
+    ValueType,
+    disassemble,
+)
+
+
+def const(value):
+    return disassemble(b"\x41" + bytes([value]) + b"\x0b")
+
+
+def global_get(index):
+    return disassemble(b"\x23" + bytes([index]) + b"\x0b")
+
+
+def make_module():
+    module = Module()
+    module.add_import(
+        GlobalImport("env", "base", GlobalType(ValueType.i32, MutType.const))
+    )
+    module.add_global(Global(GlobalType(ValueType.i32, MutType.const), const(32)))
+    module.add_memory(MemoryType(LimitType(1, None)))
+    # 0x0b is also ``end``: offset 11 used to cut the expression short.
+    module.add_data(DataSegment(0, const(11), b"hello\x00wor"))
+    module.add_data(DataSegment(0, const(20), b"ld\x00\x01abc\x00"))
+    module.add_data(DataSegment(0, global_get(1), b"config=1\x00"))
+    module.add_data(DataSegment(0, const(25), b"xy"))
+    return module
+
+
+def read_back(module):
+    bytez = wasamole.io.to_bytes(module)
+    return bytez, wasamole.io.from_bytes(bytez)
+
+
+def test_segments_are_views_of_the_input():
+    bytez, module = read_back(make_module())
+    assert [len(d.data) for d in module.datas] == [9, 8, 9, 2]
+    for segment in module.datas:
+        assert isinstance(segment.data, memoryview)
+        assert segment.data.obj is bytez
+    assert bytes(module.datas[0].data) == b"hello\x00wor"
+    assert evaluate_constant(module.datas[0].offset_expression, module) == 11
+
+
+def test_build():
+    _, module = read_back(make_module())
+    image = MemoryImage.build(module)
+    assert (image.base, image.end) == (11, 41)
+    assert [address for address, _ in image.placements] == [11, 20, 32, 25]
+    assert image.read(9, 8) == b"\x00\x00hello\x00"
+    assert image.read(17, 5) == b"world"
+    assert image.read(24, 4) == b"axy\x00"
+    assert image.read(39, 4) == b"1\x00\x00\x00"
+    assert image.segment_at(12) is module.datas[0]
+    assert image.segment_at(24) is module.datas[1]
+    assert image.segment_at(25) is module.datas[3]
+    assert image.segment_at(27) is module.datas[1]
+    assert image.segment_at(28) is None
+    assert MemoryImage.build(module, 1).extents == []
+
+
+def test_search():
+    image = MemoryImage.build(make_module())
+    assert list(image.find(b"o")) == [15, 18, 33]
+    # Segments are adjacent, so a string can span two of them.
+    assert list(image.find(b"world")) == [17]
+    assert [(a, m.group(1)) for a, m in image.search(rb"(\w+)=(\d)")] == [
+        (32, b"config")
+    ]
+    assert list(image.strings()) == [(11, b"hello"), (17, b"world"), (32, b"config=1")]
+    assert list(image.strings(6)) == [(32, b"config=1")]
+    assert image.cstring(17) == b"world"
+    assert image.cstring(32, limit=6) == b"config"
+    assert image.cstring(100) == b""
+
+
+def test_strings_need_a_terminator():
+    module = Module()
+    module.add_data(DataSegment(0, const(0), b"a" * 100000 + b"\xff" + b"tail\x00"))
+    image = MemoryImage.build(module)
+    assert list(image.strings()) == [(100001, b"tail")]
+
+
+def test_far_apart_segments_are_held_sparsely():
+    module = Module()
+    high = disassemble(b"\x41\x80\x80\x80\x80\x7f\x0b")  # i32.const 0xf0000000
+    module.add_data(DataSegment(0, const(16), b"low\x00"))
+    module.add_data(DataSegment(0, high, b"high\x00"))
+    image = MemoryImage.build(module)
+    assert [(start, bytes(data)) for start, data in image.extents] == [
+        (16, b"low\x00"),
+        (0xF0000000, b"high\x00"),
+    ]
+    assert (image.base, image.end) == (16, 0xF0000005)
+    assert list(image.strings(3)) == [(16, b"low"), (0xF0000000, b"high")]
+    assert list(image.find(b"h")) == [0xF0000000, 0xF0000003]
+    assert image.read(0xEFFFFFFE, 4) == b"\x00\x00hi"
+    assert image.cstring(0xF0000001) == b"igh"
+    assert image.cstring(0x1000) == b""
+    assert image.segment_at(0xF0000004) is module.datas[1]
+
+
+def test_imported_globals():
+    module = make_module()
+    module.datas[0].offset_expression = global_get(0)
+    with pytest.raises(ValueError, match="env.base"):
+        MemoryImage.build(module)
+    image = MemoryImage.build(module, imported={0: 1000})
+    assert image.cstring(1000) == b"hello"
+    assert image.base == 20
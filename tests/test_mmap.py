@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from .context import wasamole
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+CUSTOM_SECTION = b"\x00\x0a\x05.blob" + bytes(range(4))
+
+
+def test_mmap_matches_read():
+    for path in sorted(TEST_DATA_DIR.glob("*.wasm")):
+        mapped = wasamole.io.from_file(path, use_mmap=True)
+        assert mapped == wasamole.io.from_file(path)
+
+
+def test_custom_sections(tmp_path):
+    path = tmp_path / "custom.wasm"
+    path.write_bytes((TEST_DATA_DIR / "funcs.wasm").read_bytes() + CUSTOM_SECTION)
+
+    for use_mmap in (False, True):
+        for lazy in (False, True):
+            wasm_binary = wasamole.io.from_file(path, lazy=lazy, use_mmap=use_mmap)
+            assert len(wasm_binary.customs) == 1
+            custom = wasm_binary.customs[0]
+            assert custom.name == ".blob"
+            # Eager reads copy custom sections rather than pin the input.
+            assert isinstance(custom.data, memoryview) == lazy
+            assert bytes(custom.data) == bytes(range(4))
+
+
+def test_close_unmaps(tmp_path):
+    path = tmp_path / "custom.wasm"
+    path.write_bytes((TEST_DATA_DIR / "funcs.wasm").read_bytes() + CUSTOM_SECTION)
+    expected = wasamole.io.from_file(path)
+
+    with wasamole.io.from_file(path, use_mmap=True) as module:
+        mapping = module._mapping
+        assert not mapping.closed
+    assert mapping.closed
+    assert module == expected
+    assert wasamole.io.to_bytes(module) == wasamole.io.to_bytes(expected)
+
+    lazy = wasamole.io.from_file(path, lazy=True, use_mmap=True)
+    mapping = lazy._mapping
+    lazy.close()
+    assert mapping.closed
+    assert not lazy.functions[0].decoded
+    assert wasamole.io.to_text_string(lazy) == wasamole.io.to_text_string(expected)
+    lazy.close()
+
+    assert wasamole.io.from_file(path)._mapping is None
+
+
+def test_mmap_empty_file(tmp_path):
+    path = tmp_path / "empty.wasm"
+    path.write_bytes(b"")
+    reader = wasamole.io.BinaryReader.from_file(path, use_mmap=True)
+    assert reader.r.eos()
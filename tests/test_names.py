@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+
+from .context import wasamole
+from wasamole.core import (
+    CustomSection,
+    Function,
+    FunctionType,
+    Module,
+    SymbolTable,
+    TypeImport,
+    disassemble,
+)
+
+
+def name(s):
+    data = s.encode()
+    return bytes([len(data)]) + data
+
+
+def subsection(section_id, payload):
+    return bytes([section_id, len(payload)]) + payload
+
+
+def name_map(names):
+    return bytes([len(names)]) + b"".join(bytes([i]) + name(n) for i, n in names)
+
+
+NAMES = (
+    subsection(0, name("demo"))
+    + subsection(1, name_map([(0, "imported"), (2, "main"), (4, "helper")]))
+    + subsection(
+        2,
+        b"\x02"
+        + b"\x02"
+        + name_map([(0, "argc"), (1, "argv")])
+        + b"\x04"
+        + name_map([(0, "x")]),
+    )
+)
+
+
+def make_module():
+    module = Module()
+    module.add_type(FunctionType([], []))
+    module.add_import(TypeImport("env", "a", 0))
+    module.add_import(TypeImport("env", "b", 0))
+    for _ in range(3):
+        module.add_function(Function(0, [], disassemble(b"\x0b")))
+    module.add_custom(CustomSection("name", NAMES))
+    return module
+
+
+def test_function_names_use_combined_index_space():
+    module = wasamole.io.from_bytes(wasamole.io.to_bytes(make_module()))
+    # Function names are not decoded until asked for either.
+    assert module.names._functions is None
+    assert [f.name for f in module.functions] == ["main", "(;3;)", "helper"]
+    assert module.names._functions is not None
+
+
+def test_function_names_are_kept(tmp_path):
+    module = wasamole.io.from_bytes(wasamole.io.to_bytes(make_module()))
+    module.functions[0].set_name("renamed")
+    copies = pickle.loads(pickle.dumps(module.functions))
+    assert [f.name for f in copies] == ["renamed", "(;3;)", "helper"]
+    assert copies == module.functions
+
+    path = tmp_path / "names.wasm"
+    path.write_bytes(wasamole.io.to_bytes(make_module()))
+    with wasamole.io.from_file(path, lazy=True, use_mmap=True) as mapped:
+        pass
+    assert mapped.functions[2].name == "helper"
+
+
+def test_symbol_table():
+    module = wasamole.io.from_bytes(wasamole.io.to_bytes(make_module()))
+    names = module.names
+    assert names
+    assert names.module_name == "demo"
+    assert names.functions == {0: "imported", 2: "main", 4: "helper"}
+    assert names.function_name(4) == "helper"
+    assert names.function_name(3) is None
+    assert names.function_index("main") == 2
+    assert names.function_index("missing") is None
+    # Local names are not touched until asked for.
+    assert names._local_offsets is None
+    assert names.local_name(2, 1) == "argv"
+    assert names.locals(4) == {0: "x"}
+    assert names.locals(3) == {}
+    assert module.customs[0].name == "name"
+
+
+def test_pickle():
+    module = wasamole.io.from_bytes(wasamole.io.to_bytes(make_module()))
+    names = pickle.loads(pickle.dumps(module.names))
+    assert names.function_index("helper") == 4
+    assert names.locals(2) == {0: "argc", 1: "argv"}
+
+
+def test_empty():
+    names = SymbolTable()
+    assert not names
+    assert names.module_name is None
+    assert names.function_name(0) is None
+    assert names.locals(0) == {}
+    assert not wasamole.io.from_bytes(wasamole.io.to_bytes(Module())).names
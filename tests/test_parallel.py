@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from .context import wasamole
+from wasamole.core import CompactInstructions
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def test_parallel_matches_serial():
+    for path in sorted(TEST_DATA_DIR.glob("*.wasm")):
+        serial = wasamole.io.from_file(path)
+        assert wasamole.io.from_file(path, parallel=2) == serial
+        assert wasamole.io.from_file(path, parallel=2, use_mmap=True) == serial
+
+
+def test_parallel_bodies_follow_compact(tmp_path):
+    path = TEST_DATA_DIR / "funcs.wasm"
+    m = wasamole.io.from_file(path, parallel=2)
+    assert all(type(f.instructions) is list for f in m.functions)
+    assert all(f.body is not None for f in m.functions)
+
+    cache = wasamole.io.ModuleCache(tmp_path)
+    m = cache.load(path.read_bytes(), compact=False, parallel=2, filename=str(path))
+    assert all(type(f.instructions) is list for f in m.functions)
+
+
+def test_parallel_compact():
+    path = TEST_DATA_DIR / "funcs.wasm"
+    serial = wasamole.io.from_file(path)
+    wasm_binary = wasamole.io.from_file(path, parallel=3, compact=True)
+    for s, p in zip(serial.functions, wasm_binary.functions):
+        assert isinstance(p.instructions, CompactInstructions)
+        assert p.instructions == s.instructions
+        assert p.address == s.address
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pathlib import Path
+from .context import wasamole
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def test_headers():
+    headers = wasamole.io.headers_from_file(TEST_DATA_DIR / "start.wasm")
+    assert [(h.id, h.name) for h in headers] == [
+        (1, "type"),
+        (3, "function"),
+        (8, "start"),
+        (10, "code"),
+    ]
+    assert headers[0].offset == 10
+    assert headers[0].size == 4
+    for prev, header in zip(headers, headers[1:]):
+        assert header.offset > prev.offset + prev.size
+
+
+def test_selected_sections():
+    wasm_binary = wasamole.io.from_file(
+        TEST_DATA_DIR / "imports.wasm", sections={"import", "export"}
+    )
+    assert len(wasm_binary.imports) == 13
+    assert len(wasm_binary.types) == 0
+    assert len(wasm_binary.functions) == 0
+
+
+def test_code_implies_function():
+    wasm_binary = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", sections={"code"})
+    assert len(wasm_binary.types) == 0
+    assert len(wasm_binary.functions) == 4
+    assert len(wasm_binary.functions[3].instructions) == 18
+
+
+def test_unknown_section():
+    with pytest.raises(ValueError):
+        wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", sections={"bogus"})
+
+
+def test_read_stats():
+    path = TEST_DATA_DIR / "funcs.wasm"
+    assert wasamole.io.from_file(path).read_stats is None
+    wasm_binary = wasamole.io.from_file(path, compact=True, stats=True)
+    stats = wasm_binary.read_stats
+    headers = wasamole.io.headers_from_file(path)
+    assert list(stats.sections) == [h.id for h in headers]
+    # Each section's size covers its header, so they add up to all but the
+    # preamble.
+    assert sum(s.size for s in stats.sections.values()) == stats.size - 8
+    assert stats.size == path.stat().st_size
+    code = stats.sections[10]
+    assert (code.name, code.sections, code.entries) == ("code", 1, 4)
+    assert stats.sections[1].entries == len(wasm_binary.types)
+    assert stats.instructions == 27
+    assert stats.seconds >= sum(s.seconds for s in stats.sections.values())
+
+    slowest = stats.slowest_functions
+    assert sorted(f.index for f in slowest) == [0, 1, 2, 3]
+    assert [f.seconds for f in slowest] == sorted(
+        (f.seconds for f in slowest), reverse=True
+    )
+    longest = next(f for f in slowest if f.index == 3)
+    assert (longest.name, longest.instructions) == ("(;3;)", 18)
+    assert wasm_binary == wasamole.io.from_file(path, compact=True)
+
+
+def test_read_stats_skipped_and_lazy():
+    path = TEST_DATA_DIR / "imports.wasm"
+    stats = wasamole.io.from_file(path, sections={"import"}, stats=True).read_stats
+    assert stats.sections[2].entries == 13
+    assert not stats.sections[2].skipped
+    assert stats.sections[1].skipped
+
+    lazy = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm", lazy=True, stats=True)
+    assert lazy.read_stats.instructions == 0
+    assert lazy.read_stats.slowest_functions == []
+
+
+def test_read_stats_bypass_cache(tmp_path):
+    cache = wasamole.io.ModuleCache(tmp_path)
+    path = TEST_DATA_DIR / "funcs.wasm"
+    assert wasamole.io.from_file(path, cache=cache, stats=True).read_stats
+    assert cache.entries() == []
+    assert wasamole.io.from_file(path, cache=cache).read_stats is None
+    assert wasamole.io.from_file(path, cache=cache).read_stats is None
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def imported(code):
+    """The modules ``code`` imports, from ``python -X importtime``."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    modules = set()
+    for line in out.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def test_packages_import_nothing_up_front():
+    modules = imported("import wasamole.core, wasamole.io, wasamole.analysis")
+    assert {m for m in modules if m.startswith("wasamole")} == {
+        "wasamole",
+        "wasamole.analysis",
+        "wasamole.core",
+        "wasamole.io",
+        "wasamole.util",
+        "wasamole.util.lazy",
+    }
+
+
+def test_reading_imports_only_the_reader():
+    modules = imported(
+        "import wasamole.io; "
+        f"wasamole.io.from_file({str(TEST_DATA_DIR / 'funcs.wasm')!r})"
+    )
+    assert "wasamole.io.reader.binary_format" in modules
+    for module in [
+        "wasamole.io.cache",
+        "wasamole.io.writer.binary_format",
+        "concurrent.futures",
+        "multiprocessing",
+        "numpy",
+    ]:
+        assert module not in modules
+
+
+def test_objdump_imports():
+    modules = imported(
+        "import runpy, sys; "
+        f"sys.argv = ['wasm-objdump', '-d', {str(TEST_DATA_DIR / 'funcs.wasm')!r}]; "
+        f"runpy.run_path({str(ROOT / 'bin' / 'wasm-objdump')!r}, run_name='__main__')"
+    )
+    assert "wasamole.io.writer.text_format" in modules
+    assert "multiprocessing" not in modules
+    assert "wasamole.io.cache" not in modules
+
+
+def test_tables_are_built_on_first_use():
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import wasamole.core.instructions as i; print(i._tables_built); "
+            "i.disassemble(b'\\x0b'); print(i._tables_built)",
+        ],
+        env=dict(os.environ, PYTHONPATH=str(ROOT)),
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    assert out.stdout.split() == ["False", "True"]
+
+
+def test_lazy_names():
+    assert wasamole.core.Instruction is wasamole.core.instructions.Instruction
+    assert wasamole.vm.Instance.__name__ == "Instance"
+    assert "Module" in dir(wasamole.core)
+    assert wasamole.io.BinaryReader.__name__ == "BinaryReader"
+    assert wasamole.io.Module is wasamole.core.Module
+    with pytest.raises(AttributeError, match="nothing"):
+        wasamole.core.nothing
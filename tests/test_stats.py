@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.core import Function, FunctionType, Module, disassemble
+
+np = pytest.importorskip("numpy")
+
+from wasamole.analysis.stats import OPCODES, OpcodeArrays, corpus
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def same(a, b):
+    return all(
+        np.array_equal(getattr(a, name), getattr(b, name))
+        for name in ["opcodes", "offsets", "module_offsets"]
+    )
+
+
+def make_module():
+    module = Module()
+    module.add_type(FunctionType([], []))
+    bodies = [
+        b"\x41\x01"  # i32.const 1
+        b"\x41\x02"  # i32.const 2
+        b"\x6a"  # i32.add
+        b"\x1a"  # drop
+        b"\x0b",  # end
+        b"\x0b",  # end
+        b"\x41\x03"  # i32.const 3
+        b"\x1a"  # drop
+        b"\x41\x04"  # i32.const 4
+        b"\x1a"  # drop
+        b"\x0b",  # end
+    ]
+    for body in bodies:
+        module.add_function(Function(0, [], disassemble(body)))
+    return module
+
+
+def test_arrays():
+    module = make_module()
+    arrays = OpcodeArrays.from_bytes(wasamole.io.to_bytes(module))
+    assert bytes(arrays.opcodes) == b"\x41\x41\x6a\x1a\x0b\x0b\x41\x1a\x41\x1a\x0b"
+    assert arrays.offsets.tolist() == [0, 5, 6, 11]
+    assert arrays.module_offsets.tolist() == [0, 3]
+    assert same(arrays, OpcodeArrays.from_module(module))
+
+
+def test_histograms():
+    arrays = OpcodeArrays.from_module(make_module())
+    histogram = arrays.histogram()
+    assert histogram.shape == (256,)
+    assert (histogram[0x41], histogram[0x1A], histogram[0x0B]) == (4, 3, 3)
+    functions = arrays.function_histograms()
+    assert functions.shape == (3, 256)
+    assert functions[1, 0x0B] == 1 and functions[1].sum() == 1
+    assert np.array_equal(functions.sum(axis=0), histogram)
+    assert np.array_equal(arrays.module_histograms()[0], histogram)
+
+    matrix = arrays.feature_matrix()
+    assert matrix.shape == (3, len(OPCODES))
+    assert np.allclose(matrix.sum(axis=1), 1.0)
+    counts = arrays.feature_matrix([0x41, 0x6A], normalize=False)
+    assert counts.tolist() == [[2, 1], [0, 0], [2, 0]]
+
+
+def test_ngrams():
+    arrays = OpcodeArrays.from_module(make_module())
+    grams, counts = arrays.ngrams(2)
+    found = {tuple(g): c for g, c in zip(grams.tolist(), counts.tolist())}
+    # Pairs do not cross from one function into the next.
+    assert found == {
+        (0x41, 0x41): 1,
+        (0x41, 0x6A): 1,
+        (0x6A, 0x1A): 1,
+        (0x1A, 0x0B): 2,
+        (0x41, 0x1A): 2,
+        (0x1A, 0x41): 1,
+    }
+    assert list(counts) == sorted(counts, reverse=True)
+    grams, counts = arrays.ngrams(5)
+    assert sorted(grams.tolist()) == [
+        [0x41, 0x1A, 0x41, 0x1A, 0x0B],
+        [0x41, 0x41, 0x6A, 0x1A, 0x0B],
+    ]
+    assert arrays.ngrams(6)[0].shape == (0, 6)
+    with pytest.raises(ValueError):
+        arrays.ngrams(9)
+
+
+def test_corpus():
+    paths = sorted(str(p) for p in TEST_DATA_DIR.glob("*.wasm"))
+    arrays = corpus(paths)
+    assert arrays.modules == len(paths)
+    assert same(corpus(paths, jobs=2), arrays)
+    histograms = arrays.module_histograms()
+    for path, row, start, stop in zip(
+        paths, histograms, arrays.module_offsets, arrays.module_offsets[1:]
+    ):
+        module = wasamole.io.from_file(path)
+        assert stop - start == len(module.functions)
+        expected = Counter(
+            i.opcode.value for f in module.functions for i in f.instructions
+        )
+        assert {op: n for op, n in enumerate(row.tolist()) if n} == dict(expected)
+    assert OpcodeArrays.concatenate([]).functions == 0
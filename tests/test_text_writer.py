@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+from pathlib import Path
+from .context import wasamole
+from wasamole.io import TextWriter
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+def test_write():
+    wasm_binary = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm")
+    text = TextWriter(wasm_binary).write()
+    assert text.startswith("(module\n  (type (;0;) (func (result i32)))\n")
+    assert "    if\n      i32.const 1\n      return\n    end\n" in text
+    assert text.endswith("  )\n)\n")
+
+
+def test_write_to_stream():
+    wasm_binary = wasamole.io.from_file(TEST_DATA_DIR / "imports.wasm")
+    stream = io.StringIO()
+    wasamole.io.to_text_stream(wasm_binary, stream)
+    assert stream.getvalue() == wasamole.io.to_text_string(wasm_binary)
+
+
+def test_chunks(monkeypatch):
+    wasm_binary = wasamole.io.from_file(TEST_DATA_DIR / "funcs.wasm")
+    monkeypatch.setattr(TextWriter, "CHUNK_SIZE", 16)
+    chunks = list(TextWriter(wasm_binary).chunks())
+    assert len(chunks) > 4
+    assert "".join(chunks) == wasamole.io.to_text_string(wasm_binary)
+
+
+def test_chunks_within_a_function(monkeypatch):
+    m = wasamole.core.Module()
+    m.add_type(wasamole.core.FunctionType([], []))
+    body = wasamole.core.disassemble(b"\x01" * 1000 + b"\x0b")  # nop ... end
+    m.add_function(wasamole.core.Function(0, [], body))
+    monkeypatch.setattr(TextWriter, "CHUNK_SIZE", 64)
+    chunks = list(TextWriter(m).chunks())
+    assert len(chunks) > 100
+    assert max(map(len, chunks)) < 2 * TextWriter.CHUNK_SIZE
+    assert "".join(chunks) == wasamole.io.to_text_string(m)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+from pathlib import Path
+
+import pytest
+
+from .context import wasamole
+from wasamole.analysis import ValidationError, validate
+from wasamole.core import (
+    CompactInstructions,
+    FuncExport,
+    Function,
+    FunctionType,
+    Global,
+    GlobalType,
+    LimitType,
+    Local,
+    MemoryType,
+    Module,
+    MutType,
+    TableType,
+    ValueType,
+    disassemble,
+)
+from wasamole.core.types import ElemType
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / "data"
+
+I32 = ValueType.i32
+I64 = ValueType.i64
+
+
+def module(code, params=(), results=(), locals=(), compact=True):
+    """A module with one function of type ``params -> results``, global 0
+    an immutable i32, global 1 a mutable i64 and function 1 ``[i32] -> []``."""
+    m = Module()
+    m.add_type(FunctionType(list(params), list(results)))
+    m.add_type(FunctionType([I32], []))
+    instructions = CompactInstructions.decode(code) if compact else disassemble(code)
+    m.add_function(Function(0, [Local(t) for t in locals], instructions))
+    m.add_function(Function(1, [], disassemble(b"\x0b")))
+    m.add_global(Global(GlobalType(I32, MutType.const), disassemble(b"\x41\x00\x0b")))
+    m.add_global(Global(GlobalType(I64, MutType.var), disassemble(b"\x42\x00\x0b")))
+    return m
+
+
+VALID = [
+    (
+        b"\x20\x00"  # 0: local.get 0
+        b"\x04\x7f"  # 1: if (result i32)
+        b"\x41\x01"  # 2: i32.const 1
+        b"\x05"  # 3: else
+        b"\x41\x02"  # 4: i32.const 2
+        b"\x0b"  # 5: end
+        b"\x0b",  # 6: end
+        [I32],
+        [I32],
+    ),
+    (
+        b"\x02\x40"  # 0: block
+        b"\x03\x40"  # 1: loop
+        b"\x20\x00"  # 2: local.get 0
+        b"\x45"  # 3: i32.eqz
+        b"\x0d\x01"  # 4: br_if 1
+        b"\x20\x00"  # 5: local.get 0
+        b"\x41\x01"  # 6: i32.const 1
+        b"\x6b"  # 7: i32.sub
+        b"\x22\x00"  # 8: local.tee 0
+        b"\x10\x01"  # 9: call 1
+        b"\x0c\x00"  # 10: br 0
+        b"\x0b"  # 11: end
+        b"\x0b"  # 12: end
+        b"\x0b",  # 13: end
+        [I32],
+        [],
+    ),
+    (
+        b"\x02\x7e"  # 0: block (result i64)
+        b"\x23\x01"  # 1: global.get 1
+        b"\x20\x00"  # 2: local.get 0
+        b"\x0e\x01\x00\x00"  # 3: br_table [0] 0
+        b"\x7c"  # 4: i64.add, unreachable
+        b"\x0b"  # 5: end
+        b"\x24\x01"  # 6: global.set 1
+        b"\x23\x00"  # 7: global.get 0
+        b"\x0f"  # 8: return
+        b"\x0b",  # 9: end
+        [I32],
+        [I32],
+    ),
+    (
+        b"\x00"  # 0: unreachable
+        b"\x1b"  # 1: select
+        b"\x7a"  # 2: i64.ctz
+        b"\x0b",  # 3: end
+        [],
+        [I64],
+    ),
+    (
+        b"\x42\x01"  # 0: i64.const 1
+        b"\x21\x01"  # 1: local.set 1
+        b"\x20\x01"  # 2: local.get 1
+        b"\x20\x01"  # 3: local.get 1
+        b"\x20\x00"  # 4: local.get 0
+        b"\x1b"  # 5: select
+        b"\x1a"  # 6: drop
+        b"\x0b",  # 7: end
+        [I32],
+        [],
+    ),
+]
+
+
+@pytest.mark.parametrize("compact", [True, False])
+@pytest.mark.parametrize("code, params, results", VALID)
+def test_valid(code, params, results, compact):
+    validate(module(code, params, results, [I64], compact))
+
+
+INVALID = [
+    (b"\x41\x01\x42\x01\x6a\x1a\x0b", 2, "expected i32, found i64"),
+    (b"\x6a\x0b", 0, "expected i32, found nothing"),
+    (b"\x20\x02\x0b", 0, "unknown local 2"),
+    (b"\x42\x00\x21\x00\x20\x07\x0b", 2, "unknown local 7"),
+    (b"\x23\x02\x0b", 0, "unknown global 2"),
+    (b"\x41\x00\x24\x00\x0b", 1, "global 0 is immutable"),
+    (b"\x02\x40\x0c\x02\x0b\x0b", 1, "unknown label 2"),
+    (b"\x02\x7f\x42\x00\x0b\x1a\x0b", 2, "expected i32, found i64"),
+    (b"\x41\x00\x0b", 1, "values left on the stack"),
+    (b"\x41\x01\x04\x7f\x41\x01\x0b\x1a\x0b", 3, "if without else"),
+    (b"\x41\x01\x05\x0b", 1, "else without if"),
+    (b"\x01", 1, "function body does not end"),
+    (b"\x0b\x01", 1, "instructions after the end"),
+    (b"\x10\x05\x0b", 0, "unknown function 5"),
+    (b"\x10\x01\x0b", 0, "expected i32, found nothing"),
+    (b"\x41\x00\x11\x01\x00\x0b", 1, "unknown table 0"),
+    (b"\x41\x00\x28\x02\x00\x1a\x0b", 1, "unknown memory 0"),
+    (b"\x02\x01\x0b\x0b", 0, "invalid block type 0x1"),
+    (
+        b"\x02\x40\x02\x7f\x41\x00\x41\x00"
+        b"\x0e\x01\x00\x01"  # br_table [0] 1, to labels of different types
+        b"\x0b\x0b\x0b",
+        4,
+        "br_table labels differ",
+    ),
+    (b"\x00\x1b\x41\x00\x42\x00\x41\x00\x1b\x1a\x0b", 5, "select of i32 and i64"),
+]
+
+
+@pytest.mark.parametrize("compact", [True, False])
+@pytest.mark.parametrize("code, instruction, message", INVALID)
+def test_invalid(code, instruction, message, compact):
+    if not compact and code.startswith(b"\x02\x01"):
+        pytest.skip("the list form cannot hold an invalid block type")
+    with pytest.raises(ValidationError, match=message) as e:
+        validate(module(code, locals=[I64], compact=compact))
+    assert e.value.function == 0
+    assert e.value.instruction == instruction
+
+
+def test_memory_and_alignment():
+    load = b"\x41\x00\x29\x03\x00\x1a\x0b"  # i32.const 0; i64.load align=3; drop
+    m = module(load)
+    m.add_memory(MemoryType(LimitType(1, None)))
+    validate(m)
+
+    m = module(load.replace(b"\x29\x03", b"\x2c\x01"))  # i32.load8_s align=1
+    m.add_memory(MemoryType(LimitType(1, None)))
+    with pytest.raises(ValidationError, match="alignment") as e:
+        validate(m)
+    assert e.value.instruction == 1
+
+
+def test_module_checks():
+    m = module(b"\x0b")
+    m.add_export(FuncExport("f", 2))
+    with pytest.raises(ValidationError, match="unknown function 2"):
+        validate(m)
+
+    m = module(b"\x0b")
+    m.add_export(FuncExport("f", 0))
+    m.add_export(FuncExport("f", 1))
+    with pytest.raises(ValidationError, match="duplicate export"):
+        validate(m)
+
+    m = module(b"\x0b")
+    m.set_start(1)
+    with pytest.raises(ValidationError, match="start"):
+        validate(m)
+
+    m = module(b"\x0b")
+    m.globals[0].init_expression = disassemble(b"\x42\x00\x0b")
+    with pytest.raises(ValidationError, match="global 0: type mismatch"):
+        validate(m)
+
+    m = module(b"\x0b")
+    m.add_table(TableType(ElemType.funcref, LimitType(2, 1)))
+    with pytest.raises(ValidationError, match="minimum"):
+        validate(m)
+
+    m = module(b"\x0b")
+    m.functions[1].type_index = 2
+    with pytest.raises(ValidationError, match="unknown type 2") as e:
+        validate(m)
+    assert e.value.function == 1
+
+
+@pytest.mark.parametrize("path", sorted(TEST_DATA_DIR.glob("*.wasm")))
+def test_test_data_is_valid(path):
+    for compact in (False, True):
+        wasamole.io.from_file(path, compact=compact, validate=True)
+    lazy = wasamole.io.from_file(path, lazy=True, validate=True)
+    assert not any(f.decoded for f in lazy.functions)
+
+
+def test_reader_rejects_invalid_modules():
+    bytez = wasamole.io.to_bytes(module(b"\x41\x00\x0b"))
+    wasamole.io.from_bytes(bytez)
+    with pytest.raises(ValidationError, match="values left") as e:
+        wasamole.io.from_bytes(bytez, compact=True, validate=True)
+    assert (e.value.function, e.value.instruction) == (0, 1)
+    with pytest.raises(ValidationError, match="values left"):
+        wasamole.io.from_bytes(bytez, lazy=True, validate=True)
+    with pytest.raises(ValueError, match="whole modules"):
+        wasamole.io.from_bytes(bytez, sections={"code"}, validate=True)
+
+
+@pytest.mark.parametrize("bad", [b"\xff\x01", b"\x02\x01"])
+def test_reader_rejects_undecodable_bodies(bad, tmp_path):
+    bytez = wasamole.io.to_bytes(module(b"\x41\x00\x1a\x01\x01\x0b"))
+    bytez = bytez.replace(b"\x1a\x01\x01\x0b", b"\x1a" + bad + b"\x0b")
+    path = tmp_path / "bad.wasm"
+    path.write_bytes(bytez)
+    reads = [
+        lambda: wasamole.io.from_bytes(bytez, validate=True),
+        lambda: wasamole.io.from_bytes(bytez, compact=True, validate=True),
+        lambda: wasamole.io.from_bytes(bytez, lazy=True, validate=True),
+        lambda: wasamole.io.from_file(path, parallel=2, validate=True),
+    ]
+    for read in reads:
+        with pytest.raises(ValidationError) as e:
+            read()
+        assert (e.value.function, e.value.instruction) == (0, 2)
+
+
+def test_validation_in_workers():
+    m = module(b"\x0b")
+    for i in range(8):
+        m.add_function(Function(1, [], disassemble(b"\x20\x00\x1a\x0b")))
+    validate(m, jobs=2)
+    m.functions[5].instructions = disassemble(b"\x20\x01\x0b")
+    with pytest.raises(ValidationError, match="unknown local 1") as e:
+        validate(m, jobs=2)
+    assert (e.value.function, e.value.instruction) == (5, 0)
+
+
+def test_error_pickles():
+    error = pickle.loads(pickle.dumps(ValidationError("bad", 3, 4)))
+    assert (error.message, error.function, error.instruction) == ("bad", 3, 4)
+    assert str(error) == "function 3: instruction 4: bad"
+    assert isinstance(error, ValueError)
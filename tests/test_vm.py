@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+import math
+from typing import Any, List, Optional, Sequence
+
+import pytest
+
+from .context import wasamole
+from wasamole.core import (
+    BlockTypeOperand,
+    DataSegment,
+    Elem,
+    F32Operand,
+    F64Operand,
+    FuncExport,
+    Function,
+    FunctionType,
+    Global,
+    GlobalType,
+    I32Operand,
+    I64Operand,
+    IndexOperand,
+    IndexVectorOperand,
+    Instruction,
+    LimitType,
+    Local,
+    MemArgOperand,
+    MemoryType,
+    Module,
+    MutType,
+    Opcode,
+    TableType,
+    ElemType,
+    TypeImport,
+    ValueType,
+    ZeroOperand,
+)
+from wasamole.vm import (
+    CompileError,
+    Instance,
+    LinkError,
+    Memory,
+    RuntimeFunction,
+    Trap,
+)
+
+
+def assemble(text: str) -> List[Instruction]:
+    instrs = []
+    for line in text.strip().splitlines():
+        words = line.split()
+        opcode = Opcode[words[0].upper().replace(".", "_")]
+        args = words[1:]
+        operands: List[Any] = []
+        for operand_type in Instruction(opcode).operand_types:
+            if operand_type is BlockTypeOperand:
+                operands.append(BlockTypeOperand(ValueType[args.pop(0)] if args else None))
+            elif operand_type is IndexVectorOperand:
+                operands.append(IndexVectorOperand([int(a) for a in args.pop(0).split(",")]))
+            elif operand_type is MemArgOperand:
+                operands.append(MemArgOperand(0, int(args.pop(0)) if args else 0))
+            elif operand_type is ZeroOperand:
+                operands.append(ZeroOperand())
+            elif operand_type is IndexOperand:
+                operands.append(IndexOperand(int(args.pop(0))))
+            elif operand_type in (I32Operand, I64Operand):
+                operands.append(operand_type(int(args.pop(0), 0)))
+            else:
+                operands.append(operand_type(float(args.pop(0))))
+        instrs.append(Instruction(opcode, operands))
+    return instrs + [Instruction(Opcode.END)]
+
+
+def types(names: Sequence[str]) -> List[ValueType]:
+    return [ValueType[name] for name in names]
+
+
+def instantiate(module: Module, imports: Optional[dict] = None) -> Instance:
+    # Run what the reader produces, which also exercises the writer.
+    module = wasamole.io.from_bytes(wasamole.io.to_bytes(module))
+    return Instance(module, imports)
+
+
+def run(text: str, results="i32", params="", args=(), locals="") -> Any:
+    module = Module()
+    module.add_type(FunctionType(types(params.split()), types(results.split())))
+    module.add_memory(MemoryType(LimitType(1, 2)))
+    local_types = types(locals.split())
+    module.add_function(Function(0, [Local(t) for t in local_types], assemble(text)))
+    module.add_export(FuncExport("f", 0))
+    return instantiate(module).invoke("f", *args)
+
+
+FACTORIAL = """
+i32.const 1
+local.set 1
+block
+loop
+local.get 0
+i32.eqz
+br_if 1
+local.get 1
+local.get 0
+i32.mul
+local.set 1
+local.get 0
+i32.const 1
+i32.sub
+local.set 0
+br 0
+end
+end
+local.get 1
+"""
+
+FIB = """
+local.get 0
+i32.const 2
+i32.lt_s
+if i32
+local.get 0
+else
+local.get 0
+i32.const 1
+i32.sub
+call 0
+local.get 0
+i32.const 2
+i32.sub
+call 0
+i32.add
+end
+"""
+
+
+def test_loop():
+    assert run(FACTORIAL, params="i32", args=(10,), locals="i32") == 3628800
+    assert run(FACTORIAL, params="i32", args=(13,), locals="i32") == 1932053504
+
+
+def test_recursion():
+    assert run(FIB, params="i32", args=(15,)) == 610
+
+
+def test_block_results_and_unwinding():
+    # br carries the block's result past values left on the stack.
+    text = """
+block i32
+i32.const 1
+i32.const 2
+i32.const 3
+br 0
+end
+"""
+    assert run(text) == 3
+    text = """
+block i32
+i32.const 7
+i32.const 8
+local.get 0
+br_if 0
+drop
+end
+"""
+    assert run(text, params="i32", args=(1,)) == 8
+    assert run(text, params="i32", args=(0,)) == 7
+
+
+def test_br_table():
+    text = """
+block
+block
+block
+local.get 0
+br_table 0,1 2
+end
+i32.const 10
+return
+end
+i32.const 11
+return
+end
+i32.const 12
+"""
+    assert [run(text, params="i32", args=(i,)) for i in range(4)] == [10, 11, 12, 12]
+
+
+def test_dead_code_is_skipped():
+    text = """
+block i32
+i32.const 5
+br 0
+i32.const 1
+i32.add
+block
+unreachable
+end
+end
+"""
+    assert run(text) == 5
+
+
+def test_return_from_nested_blocks():
+    text = """
+block
+loop
+i32.const 1
+i32.const 9
+return
+end
+end
+i32.const 0
+"""
+    assert run(text) == 9
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("i32.const -1\ni32.const 1\ni32.add", 0),
+        ("i32.const 0x7fffffff\ni32.const 1\ni32.add", -(1 << 31)),
+        ("i32.const -7\ni32.const 2\ni32.div_s", -3),
+        ("i32.const -7\ni32.const 2\ni32.div_u", 0x7FFFFFFC),
+        ("i32.const -7\ni32.const 2\ni32.rem_s", -1),
+        ("i32.const 7\ni32.const -2\ni32.rem_s", 1),
+        ("i32.const -8\ni32.const 1\ni32.shr_s", -4),
+        ("i32.const -8\ni32.const 1\ni32.shr_u", 0x7FFFFFFC),
+        ("i32.const 1\ni32.const 33\ni32.shl", 2),
+        ("i32.const 0x80000001\ni32.const 1\ni32.rotl", 3),
+        ("i32.const 1\ni32.const 1\ni32.rotr", -(1 << 31)),
+        ("i32.const 1\ni32.clz", 31),
+        ("i32.const 0\ni32.ctz", 32),
+        ("i32.const -1\ni32.popcnt", 32),
+        ("i32.const -1\ni32.const 1\ni32.lt_s", 1),
+        ("i32.const -1\ni32.const 1\ni32.lt_u", 0),
+        ("i32.const 0\ni32.eqz", 1),
+        ("i32.const 1\ni32.const 2\ni32.const 0\nselect", 2),
+        ("i64.const -1\ni32.wrap_i64", -1),
+        ("i64.const 0x100000002\ni32.wrap_i64", 2),
+    ],
+)
+def test_i32(text, expected):
+    assert run(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("i64.const 0x7fffffffffffffff\ni64.const 1\ni64.add", -(1 << 63)),
+        ("i64.const -9\ni64.const 4\ni64.div_s", -2),
+        ("i64.const -1\ni64.const 1\ni64.shr_u", (1 << 63) - 1),
+        ("i64.const 1\ni64.const 63\ni64.shl", -(1 << 63)),
+        ("i64.const 1\ni64.clz", 63),
+        ("i32.const -1\ni64.extend_i32_s", -1),
+        ("i32.const -1\ni64.extend_i32_u", 0xFFFFFFFF),
+        ("i64.const -2\ni64.const 1\ni64.gt_s\ni64.extend_i32_u", 0),
+    ],
+)
+def test_i64(text, expected):
+    assert run(text, results="i64") == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "i32.const 1\ni32.const 0\ni32.div_s",
+        "i32.const 1\ni32.const 0\ni32.rem_u",
+        "i32.const 0x80000000\ni32.const -1\ni32.div_s",
+        "f64.const nan\ni32.trunc_f64_s",
+        "f64.const 3e9\ni32.trunc_f64_s",
+        "f32.const -1.5\ni32.trunc_f32_u",
+        "unreachable",
+        "i32.const 65536\ni32.load",
+        "i32.const 65535\ni32.const 0\ni32.store16",
+        "i32.const -1\ni32.load 1",
+    ],
+)
+def test_traps(text):
+    with pytest.raises(Trap):
+        run(text)
+
+
+def test_rem_s_overflow_is_zero():
+    assert run("i32.const 0x80000000\ni32.const -1\ni32.rem_s") == 0
+
+
+@pytest.mark.parametrize(
+    "text, results, expected",
+    [
+        ("f32.const 0.1\nf32.const 0.2\nf32.add", "f32", 0.30000001192092896),
+        ("f64.const 0.1\nf64.const 0.2\nf64.add", "f64", 0.30000000000000004),
+        ("f64.const 1\nf64.const 0\nf64.div", "f64", math.inf),
+        ("f64.const -0.0\nf64.const 0\nf64.min", "f64", -0.0),
+        ("f64.const 2.5\nf64.nearest", "f64", 2.0),
+        ("f64.const -0.5\nf64.ceil", "f64", -0.0),
+        ("f64.const 2\nf64.sqrt", "f64", math.sqrt(2)),
+        ("f32.const 1e38\nf32.const 10\nf32.mul", "f32", math.inf),
+        ("f64.const 1e300\nf32.demote_f64", "f32", math.inf),
+        ("i32.const -1\nf64.convert_i32_u", "f64", 4294967295.0),
+        ("i32.const -1\nf64.convert_i32_s", "f64", -1.0),
+        ("f64.const -3.9\ni64.trunc_f64_s", "i64", -3),
+        ("f32.const 1\ni32.reinterpret_f32", "i32", 0x3F800000),
+        ("i64.const 0x4000000000000000\nf64.reinterpret_i64", "f64", 2.0),
+    ],
+)
+def test_floats(text, results, expected):
+    result = run(text, results=results)
+    assert result == expected
+    assert math.copysign(1, result) == math.copysign(1, expected)
+
+
+def test_float_nan():
+    assert math.isnan(run("f64.const nan\nf64.const 1\nf64.max", results="f64"))
+    assert math.isnan(run("f64.const -1\nf64.sqrt", results="f64"))
+    assert run("f64.const nan\nf64.const nan\nf64.eq") == 0
+
+
+def test_memory():
+    text = """
+i32.const 8
+i32.const -2
+i32.store
+i32.const 8
+i32.load8_s
+i32.const 9
+i32.load8_u
+i32.add
+i32.const 6
+i64.load16_s 2
+i32.wrap_i64
+i32.add
+"""
+    # -2 as bytes fe ff ff ff: load8_s -> -2, load8_u(9) -> 255, and
+    # load16_s(8) -> -2.
+    assert run(text) == -2 + 255 - 2
+
+
+def test_memory_grow():
+    text = """
+i32.const 1
+memory.grow
+memory.size
+i32.const 10
+i32.mul
+i32.add
+i32.const 1
+memory.grow
+i32.add
+"""
+    # grow returns 1 (old size), size is then 2, growing past the
+    # maximum of 2 returns -1.
+    assert run(text) == 1 + 20 - 1
+
+
+def test_module_linking():
+    i32 = ValueType.i32
+    module = Module()
+    module.add_type(FunctionType([i32], [i32]))
+    module.add_type(FunctionType([], []))
+    module.add_import(TypeImport("env", "double", 0))
+    module.add_import(TypeImport("env", "start", 1))
+    module.add_memory(MemoryType(LimitType(1, None)))
+    module.add_table(TableType(ElemType.funcref, LimitType(4, None)))
+    module.add_global(
+        Global(GlobalType(i32, MutType.var), assemble("i32.const 40"))
+    )
+    # 2: f(x) = double(x) + global, 3: g(x) = x + 1, 4: call table[i](100)
+    module.add_function(
+        Function(0, [], assemble("local.get 0\ncall 0\nglobal.get 0\ni32.add"))
+    )
+    module.add_function(
+        Function(0, [], assemble("local.get 0\ni32.const 1\ni32.add"))
+    )
+    module.add_function(
+        Function(0, [], assemble("i32.const 100\nlocal.get 0\ncall_indirect 0"))
+    )
+    module.add_function(Function(1, [], assemble("nop")))
+    module.add_elem(Elem(0, assemble("i32.const 1"), [2, 3, 5]))
+    module.add_data(DataSegment(0, assemble("i32.const 16"), b"hello"))
+    module.start = 1
+    for name, index in [("f", 2), ("g", 3), ("dispatch", 4)]:
+        module.add_export(FuncExport(name, index))
+
+    started = []
+    instance = instantiate(
+        module, {"env": {"double": lambda x: 2 * x, "start": lambda: started.append(1)}}
+    )
+    assert started == [1]
+    assert instance.invoke("f", 1) == 42
+    assert instance.invoke("dispatch", 1) == 2 * 100 + 40
+    assert instance.invoke("dispatch", 2) == 101
+    assert bytes(instance.memory[16:21]) == b"hello"
+    with pytest.raises(Trap, match="uninitialized"):
+        instance.invoke("dispatch", 0)
+    with pytest.raises(Trap, match="type mismatch"):
+        instance.invoke("dispatch", 3)
+    with pytest.raises(Trap, match="undefined"):
+        instance.invoke("dispatch", 4)
+
+
+def test_errors():
+    module = Module()
+    module.add_type(FunctionType([], [ValueType.i32]))
+    module.add_function(Function(0, [], assemble("i32.const 0\ni32.load")))
+    with pytest.raises(CompileError, match="memory"):
+        instantiate(module)
+    module.functions[0].instructions = assemble("i32.const 0\ncall_indirect 0")
+    with pytest.raises(CompileError, match="table"):
+        instantiate(module)
+
+    module.add_import(TypeImport("env", "f", 0))
+    with pytest.raises(LinkError, match="env.f"):
+        instantiate(module)
+    with pytest.raises(TypeError):
+        RuntimeFunction()
+
+
+def test_imported_memory_is_shared():
+    i32 = ValueType.i32
+    module = Module()
+    module.add_type(FunctionType([], [i32]))
+    from wasamole.core import MemoryImport
+
+    module.add_import(MemoryImport("env", "memory", MemoryType(LimitType(1, None))))
+    module.add_function(Function(0, [], assemble("i32.const 4\ni32.load")))
+    module.add_export(FuncExport("read", 0))
+    memory = Memory(1)
+    instance = instantiate(module, {"env": {"memory": memory}})
+    memory.data[4:8] = (1234).to_bytes(4, "little")
+    assert instance.invoke("read") == 1234
+
+
+def test_recursion_limit_traps():
+    text = "local.get 0\ncall 0"
+    with pytest.raises(Trap, match="call stack"):
+        run(text, params="i32", args=(1,))
@@ -0,0 +1,11 @@
+__version__ = "0.5.0"
+
+import importlib
+from typing import Any
+
+
+def __getattr__(name: str) -> Any:
+    # Subpackages are imported on first use, like the names inside them.
+    if name in ("analysis", "core", "io", "vm"):
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,34 @@
+from typing import TYPE_CHECKING
+
+from wasamole.util.lazy import exports, lazy_exports
+
+if TYPE_CHECKING:
+    from .callgraph import *
+    from .cfg import *
+    from .index import *
+    from .memory import *
+    from .stats import *
+    from .validation import *
+
+_EXPORTS = exports(
+    [
+        (".callgraph", ["CallGraph"]),
+        (".cfg", ["BasicBlock", "ControlFlowGraph", "function_cfg", "module_cfgs"]),
+        (".index", ["INDEX_SUFFIX", "InstructionIndex", "Posting"]),
+        (".memory", ["evaluate_constant", "MemoryImage"]),
+        (".stats", ["OPCODES", "OpcodeArrays", "corpus"]),
+        (
+            ".validation",
+            [
+                "ValidationContext",
+                "ValidationError",
+                "validate",
+                "validate_code",
+                "validate_function",
+            ],
+        ),
+    ]
+)
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,161 @@
+"""The direct call graph of a module.
+
+Functions are numbered in the combined index space that ``call`` uses: the
+imported functions first, then ``Module.functions``.  Only ``call`` makes
+an edge.  The target of a ``call_indirect`` depends on the table's contents
+at run time, so those calls are not in the graph; to account for them,
+pass the functions of the element segments to ``reachable`` as extra roots.
+"""
+
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from wasamole.core.compact import CompactInstructions
+from wasamole.core.exports import FuncExport
+from wasamole.core.function import Function
+from wasamole.core.instructions import Opcode
+from wasamole.core.module import Module
+
+from .csr import replace_rows, transpose
+
+
+@dataclass
+class CallGraph:
+    """Callers and callees of every function, as compressed sparse rows.
+
+    The callees of function ``i`` are
+    ``callee_list[callee_offsets[i]:callee_offsets[i + 1]]`` and its callers
+    likewise in ``caller_list``.  Both are sorted and free of duplicates.
+    ``roots`` are the exported functions and the start function.
+    """
+
+    imported: int
+    callee_offsets: "array[int]"
+    callee_list: "array[int]"
+    caller_offsets: "array[int]"
+    caller_list: "array[int]"
+    roots: "array[int]"
+    _views: Tuple[memoryview, memoryview] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        self._views = (memoryview(self.callee_list), memoryview(self.caller_list))
+
+    @staticmethod
+    def build(module: Module) -> "CallGraph":
+        imported = len(module.function_imports())
+        rows = [function.analysis(_callees) for function in module.functions]
+        callee_offsets, callee_list = _rows(imported, rows)
+        caller_offsets, caller_list = transpose(callee_offsets, callee_list)
+        return CallGraph(
+            imported,
+            callee_offsets,
+            callee_list,
+            caller_offsets,
+            caller_list,
+            _roots(module),
+        )
+
+    def __len__(self) -> int:
+        return len(self.callee_offsets) - 1
+
+    def callees(self, i: int) -> Sequence[int]:
+        """The functions ``i`` calls, as a view into ``callee_list``."""
+        offsets = self.callee_offsets
+        return self._views[0][offsets[i] : offsets[i + 1]]
+
+    def callers(self, i: int) -> Sequence[int]:
+        """The functions that call ``i``, as a view into ``caller_list``."""
+        offsets = self.caller_offsets
+        return self._views[1][offsets[i] : offsets[i + 1]]
+
+    def reachable(self, roots: Optional[Iterable[int]] = None) -> List[bool]:
+        """Whether each function can be called, directly or not, from ``roots``.
+
+        ``roots`` defaults to the exported functions and the start function.
+        """
+        offsets = self.callee_offsets
+        callees = self.callee_list
+        seen = [False] * len(self)
+        work = []
+        for root in self.roots if roots is None else roots:
+            if not seen[root]:
+                seen[root] = True
+                work.append(root)
+        while work:
+            i = work.pop()
+            for callee in callees[offsets[i] : offsets[i + 1]]:
+                if not seen[callee]:
+                    seen[callee] = True
+                    work.append(callee)
+        return seen
+
+    def update(self, module: Module, i: int) -> None:
+        """Rescan the body of function ``i`` after it has changed.
+
+        The callees of each function are cached on it, so only bodies
+        modified since (see ``Function.mark_modified``) are scanned again.
+        The changed rows are spliced into copies of the arrays.  Adding or
+        removing functions, imports or exports needs a new graph.
+        """
+        if len(module.function_imports()) + len(module.functions) != len(self):
+            raise ValueError("module functions changed; rebuild the graph")
+        if i < self.imported:
+            raise ValueError(f"function {i} is imported")
+        old = set(self.callees(i))
+        new = module.functions[i - self.imported].analysis(_callees)
+
+        callers: Dict[int, List[int]] = {}
+        for callee in old.symmetric_difference(new):
+            row = set(self.callers(callee))
+            if callee in old:
+                row.discard(i)
+            else:
+                row.add(i)
+            callers[callee] = sorted(row)
+
+        self.callee_offsets, self.callee_list = replace_rows(
+            self.callee_offsets, self.callee_list, {i: new}
+        )
+        self.caller_offsets, self.caller_list = replace_rows(
+            self.caller_offsets, self.caller_list, callers
+        )
+        self.__post_init__()
+
+
+def _callees(function: Function) -> List[int]:
+    instructions = function.peek_instructions()
+    if isinstance(instructions, CompactInstructions):
+        opcodes = instructions.opcodes.tobytes()
+        payloads = instructions.payloads
+        found: Set[int] = set()
+        i = opcodes.find(b"\x10")
+        while i >= 0:
+            found.add(payloads[i])
+            i = opcodes.find(b"\x10", i + 1)
+    else:
+        call = Opcode.CALL
+        found = {
+            instr.operands[0].index  # type: ignore
+            for instr in instructions
+            if instr.opcode is call
+        }
+    return sorted(found)
+
+
+def _roots(module: Module) -> "array[int]":
+    roots = {e.index for e in module.exports if isinstance(e, FuncExport)}
+    if module.start is not None:
+        roots.add(module.start)
+    return array("I", sorted(roots))
+
+
+def _rows(imported: int, rows: List[List[int]]) -> Tuple["array[int]", "array[int]"]:
+    offsets = array("I", bytes(4 * (imported + 1)))
+    values = array("I")
+    for row in rows:
+        values.extend(row)
+        offsets.append(len(values))
+    return offsets, values
@@ -0,0 +1,331 @@
+"""Basic blocks and control-flow edges of function bodies.
+
+The graph is built in a single pass over the instructions.  A stack of the
+enclosing ``block``, ``loop`` and ``if`` constructs is kept along the way,
+so the target of a branch to label depth ``d`` is just the ``d``th entry
+from the top: a loop's target is already known, and a branch out of a
+block is recorded on the block's entry and resolved when its ``end`` is
+reached.  Only control instructions are visited; the others are skipped by
+a regular expression over the opcode bytes.
+
+Targets are instruction indices: a branch to a ``loop`` continues at the
+``loop`` instruction and a branch out of a ``block`` or ``if`` (or out of
+the function) continues at its ``end``.
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from wasamole.core.compact import CompactInstructions
+from wasamole.core.function import Function
+from wasamole.core.instructions import Instruction
+from wasamole.core.module import Module
+from wasamole.util.collector import paused_collection
+
+from .csr import transpose
+
+# unreachable, block, loop, if, else, end, br, br_if, br_table and return.
+_CONTROL = re.compile(b"[\x00\x02-\x05\x0b-\x0f]")
+
+_BLOCK = 0
+_LOOP = 1
+_IF = 2
+_FUNCTION = 3
+
+
+@dataclass
+class BasicBlock:
+    """Instructions ``start`` up to but not including ``end``.
+
+    ``successors`` and ``predecessors`` are block indices.
+    """
+
+    start: int
+    end: int
+    successors: List[int] = field(default_factory=list)
+    predecessors: List[int] = field(default_factory=list)
+
+
+@dataclass
+class ControlFlowGraph:
+    """The basic blocks of a function body and the edges between them.
+
+    Block ``b`` spans instructions ``starts[b]`` up to ``starts[b + 1]``;
+    block 0 is the entry.  Its successors are
+    ``successors[edge_offsets[b]:edge_offsets[b + 1]]``.  ``exits`` are the
+    blocks that leave the function, by ``return``, by a branch out of the
+    function or by reaching its last ``end``.  Blocks ending in
+    ``unreachable`` have no successors but are not exits.
+
+    The side tables map instructions to instructions.  ``branches`` lists
+    the branch instructions in order; the ``i``th one continues at
+    ``targets[target_offsets[i]:target_offsets[i + 1]]``, one target per
+    label with the ``br_table`` default last.  ``openers`` lists the
+    ``block``, ``loop``, ``if`` and ``else`` instructions in order and
+    ``closers`` their ``end``.
+
+    Everything is kept in arrays rather than objects per block, so graphs
+    are cheap to keep around for every function of a large module.
+    ``blocks`` materialises ``BasicBlock`` objects when that is more
+    convenient.
+    """
+
+    starts: "array[int]"
+    edge_offsets: "array[int]"
+    successors: "array[int]"
+    exits: "array[int]"
+    branches: "array[int]"
+    target_offsets: "array[int]"
+    targets: "array[int]"
+    openers: "array[int]"
+    closers: "array[int]"
+    _predecessors: Optional[Tuple["array[int]", "array[int]"]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @staticmethod
+    def build(instructions: Sequence[Instruction]) -> "ControlFlowGraph":
+        return _build(instructions)
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def successors_of(self, block: int) -> List[int]:
+        offsets = self.edge_offsets
+        return self.successors[offsets[block] : offsets[block + 1]].tolist()
+
+    def predecessors_of(self, block: int) -> List[int]:
+        if self._predecessors is None:
+            self._predecessors = transpose(self.edge_offsets, self.successors)
+        offsets, predecessors = self._predecessors
+        return predecessors[offsets[block] : offsets[block + 1]].tolist()
+
+    def block(self, block: int) -> BasicBlock:
+        if not 0 <= block < len(self):
+            raise IndexError("block index out of range")
+        return BasicBlock(
+            self.starts[block],
+            self.starts[block + 1],
+            self.successors_of(block),
+            self.predecessors_of(block),
+        )
+
+    @property
+    def blocks(self) -> List[BasicBlock]:
+        return [self.block(b) for b in range(len(self))]
+
+    def block_at(self, index: int) -> int:
+        """The block containing instruction ``index``."""
+        if not 0 <= index < self.starts[-1]:
+            raise IndexError("instruction index out of range")
+        return bisect_right(self.starts, index) - 1
+
+    def targets_of(self, index: int) -> List[int]:
+        """Where the branch instruction ``index`` continues, per label."""
+        i = _find(self.branches, index)
+        offsets = self.target_offsets
+        return self.targets[offsets[i] : offsets[i + 1]].tolist()
+
+    def end_of(self, index: int) -> int:
+        """The ``end`` of the ``block``, ``loop``, ``if`` or ``else`` at ``index``."""
+        return self.closers[_find(self.openers, index)]
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        offsets = self.edge_offsets
+        successors = self.successors
+        for b in range(len(self)):
+            for i in range(offsets[b], offsets[b + 1]):
+                yield b, successors[i]
+
+    def reachable(self) -> List[bool]:
+        """Whether each block can be reached from the entry."""
+        offsets = self.edge_offsets
+        successors = self.successors
+        seen = [False] * len(self)
+        seen[0] = True
+        work = [0]
+        while work:
+            b = work.pop()
+            for successor in successors[offsets[b] : offsets[b + 1]]:
+                if not seen[successor]:
+                    seen[successor] = True
+                    work.append(successor)
+        return seen
+
+
+def _find(indices: "array[int]", index: int) -> int:
+    i = bisect_left(indices, index)
+    if i == len(indices) or indices[i] != index:
+        raise KeyError(index)
+    return i
+
+
+def _labels(instructions: Sequence[Instruction], i: int) -> List[int]:
+    operands: List[Any] = instructions[i].operands
+    labels: List[int]
+    if len(operands) == 2:
+        labels = operands[0].indices + [operands[1].index]
+    else:
+        labels = [operands[0].index]
+    return labels
+
+
+def _build(instructions: Sequence[Instruction]) -> ControlFlowGraph:
+    if isinstance(instructions, CompactInstructions):
+        opcodes = instructions.opcodes.tobytes()
+        labels = instructions.labels
+    else:
+        # ``_value_`` is a plain attribute; ``value`` is a descriptor and
+        # several times slower.
+        opcodes = bytes([instr.opcode._value_ for instr in instructions])
+        labels = partial(_labels, instructions)
+    n = len(opcodes)
+    starts = [0]
+    # Successors per block; flattened at the end, since a forward branch
+    # adds an edge to a block that is no longer the current one.
+    successors: List[List[int]] = [[]]
+    exits: List[int] = []
+    branches = array("I")
+    target_offsets = array("I", [0])
+    targets = array("I")
+    openers = array("I")
+    closers = array("I")
+    # One entry per enclosing construct: [kind, opener's slot in
+    # ``openers``, block, else's slot, sources, fixups].  ``block`` is a
+    # loop's header, or the block of an ``if`` whose false edge is still to
+    # be added.  ``sources`` are the blocks that branch to or fall into the
+    # ``end`` and ``fixups`` the positions in ``targets`` waiting for it.
+    frames: List[List[Any]] = [[_FUNCTION, -1, -1, -1, [], []]]
+
+    def split(at: int, falls: bool) -> int:
+        """Start a block at ``at`` unless the current one is still empty."""
+        if starts[-1] != at:
+            if falls:
+                successors[-1].append(len(starts))
+            starts.append(at)
+            successors.append([])
+        return len(starts) - 1
+
+    for match in _CONTROL.finditer(opcodes):
+        i = match.start()
+        opcode = opcodes[i]
+        current = len(starts) - 1
+        if opcode == 0x0B:
+            frame = frames.pop()
+            kind = frame[0]
+            if kind == _FUNCTION:
+                if current not in exits:
+                    exits.append(current)
+                for position in frame[5]:
+                    targets[position] = i
+                break
+            closers[frame[1]] = i
+            if kind == _LOOP:
+                continue
+            sources = frame[4]
+            if frame[2] >= 0:
+                sources.append(frame[2])
+            if sources:
+                end = split(i, True)
+                for source in sources:
+                    if end not in successors[source]:
+                        successors[source].append(end)
+            if frame[3] >= 0:
+                closers[frame[3]] = i
+            for position in frame[5]:
+                targets[position] = i
+        elif opcode == 0x0C or opcode == 0x0D or opcode == 0x0E:
+            branches.append(i)
+            edges = successors[current]
+            for depth in labels(i):
+                frame = frames[-1 - depth]
+                kind = frame[0]
+                if kind == _LOOP:
+                    targets.append(openers[frame[1]])
+                    if frame[2] not in edges:
+                        edges.append(frame[2])
+                    continue
+                frame[5].append(len(targets))
+                targets.append(0)
+                if kind == _FUNCTION:
+                    if current not in exits:
+                        exits.append(current)
+                elif current not in frame[4]:
+                    frame[4].append(current)
+            target_offsets.append(len(targets))
+            if i + 1 < n:
+                split(i + 1, opcode == 0x0D)
+        elif opcode == 0x02 or opcode == 0x03:
+            openers.append(i)
+            closers.append(0)
+            if opcode == 0x02:
+                frames.append([_BLOCK, len(openers) - 1, -1, -1, [], []])
+            else:
+                header = split(i, True)
+                frames.append([_LOOP, len(openers) - 1, header, -1, [], []])
+        elif opcode == 0x04:
+            openers.append(i)
+            closers.append(0)
+            frames.append([_IF, len(openers) - 1, current, -1, [], []])
+            split(i + 1, True)
+        elif opcode == 0x05:
+            frame = frames[-1]
+            openers.append(i)
+            closers.append(0)
+            frame[3] = len(openers) - 1
+            frame[4].append(current)
+            successors[frame[2]].append(split(i + 1, False))
+            frame[2] = -1
+        elif opcode == 0x0F:
+            if current not in exits:
+                exits.append(current)
+            split(i + 1, False)
+        else:
+            split(i + 1, False)
+    else:
+        raise ValueError("function body does not end")
+
+    edge_offsets = array("I", [0])
+    flat = array("I")
+    for edges in successors:
+        flat.extend(edges)
+        edge_offsets.append(len(flat))
+    starts.append(n)
+    return ControlFlowGraph(
+        array("I", starts),
+        edge_offsets,
+        flat,
+        array("I", exits),
+        branches,
+        target_offsets,
+        targets,
+        openers,
+        closers,
+    )
+
+
+def _function_cfg(function: Function) -> ControlFlowGraph:
+    return _build(function.peek_instructions())
+
+
+def function_cfg(function: Function) -> ControlFlowGraph:
+    """The control-flow graph of ``function``, cached on the function.
+
+    The cache is dropped when the function's locals or instructions are
+    replaced, or when ``Function.mark_modified`` is called after editing
+    them in place.
+    """
+    return function.analysis(_function_cfg)
+
+
+def module_cfgs(module: Module) -> List[ControlFlowGraph]:
+    """The control-flow graphs of all functions defined in ``module``.
+
+    Each is cached on its function as by ``function_cfg``.
+    """
+    with paused_collection():
+        return [function_cfg(function) for function in module.functions]
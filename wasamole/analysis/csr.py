@@ -0,0 +1,53 @@
+"""Helpers for graphs stored as compressed sparse rows.
+
+Row ``i`` of a graph is ``values[offsets[i]:offsets[i + 1]]``, where
+``offsets`` has one more entry than there are rows.
+"""
+
+from array import array
+from typing import Dict, List, Tuple
+
+
+def transpose(
+    offsets: "array[int]", values: "array[int]"
+) -> Tuple["array[int]", "array[int]"]:
+    """The reverse edges, with every row sorted."""
+    n = len(offsets) - 1
+    counts = [0] * (n + 1)
+    for target in values:
+        counts[target + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+    reverse = array("I", bytes(4 * len(values)))
+    fill = counts[:n]
+    # Sources are visited in order, so each reverse row comes out sorted.
+    for source in range(n):
+        for j in range(offsets[source], offsets[source + 1]):
+            target = values[j]
+            reverse[fill[target]] = source
+            fill[target] += 1
+    return array("I", counts), reverse
+
+
+def replace_rows(
+    offsets: "array[int]", values: "array[int]", rows: Dict[int, List[int]]
+) -> Tuple["array[int]", "array[int]"]:
+    """Copies of ``offsets`` and ``values`` with some rows replaced.
+
+    The unchanged stretches between replaced rows are copied wholesale, so
+    the cost is mostly a copy of the arrays however many rows change.
+    """
+    new_offsets = array("I")
+    new_values = array("I")
+    delta = 0
+    previous = 0
+    for row in sorted(rows):
+        new_offsets.extend(map(delta.__add__, offsets[previous:row]))
+        new_values.extend(values[offsets[previous] : offsets[row]])
+        new_offsets.append(len(new_values))
+        new_values.extend(rows[row])
+        delta = len(new_values) - offsets[row + 1]
+        previous = row + 1
+    new_offsets.extend(map(delta.__add__, offsets[previous:]))
+    new_values.extend(values[offsets[previous] :])
+    return new_offsets, new_values
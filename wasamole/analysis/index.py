@@ -0,0 +1,398 @@
+"""An inverted index from opcodes and operands to instruction positions.
+
+``InstructionIndex`` lists every instruction of a module under its opcode,
+so finding every ``call_indirect`` or every ``global.set 0`` is a lookup
+instead of a scan of every function body.  Everything is held in ``array``
+columns, with compressed sparse rows as in ``wasamole.analysis.csr``: the
+postings of opcode byte ``b`` are ``opcode_offsets[b]`` up to
+``opcode_offsets[b + 1]``.  Within an opcode they are sorted by operand,
+then by position, so operand lookups are binary searches.
+
+A posting is a function index, imports first, the position of the
+instruction in the function's body and its byte address in the module.
+Indices are written to disk in a flat binary format that loads with a few
+copies, and ``from_file`` can keep them next to the module they were built
+from or in a directory of their own.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple, Union
+
+import wasamole.io
+from wasamole.core.compact import (
+    LAYOUT_BR_TABLE,
+    LAYOUT_F32,
+    LAYOUT_F64,
+    LAYOUT_I32,
+    LAYOUT_INDEX,
+    LAYOUT_MEMARG,
+    LAYOUT_NONE,
+    LAYOUT_ZERO,
+    OPCODE_LAYOUTS,
+    CompactInstructions,
+)
+from wasamole.core.instructions import I32Operand, IndexOperand, Opcode, Operand
+from wasamole.core.module import Module
+from wasamole.util.slots import add_slots
+
+# Written at the start of every saved index.  The SHA-256 of the module the
+# index was built from follows, then the number of imported functions and
+# the length of each column.
+_MAGIC = b"WSMI\x01"
+_HEADER = struct.Struct("<32sQ8Q")
+
+INDEX_SUFFIX = ".idx"
+
+_F32_BITS = struct.Struct("<I")
+_F32_VALUE = struct.Struct("<f")
+_F64_BITS = struct.Struct("<q")
+_F64_VALUE = struct.Struct("<d")
+
+
+@add_slots()
+@dataclass(frozen=True)
+class Posting:
+    """Where one instruction is: ``function`` is the function index,
+    imports first, and ``instruction`` the instruction's position in its
+    body.  ``address`` is its offset in the module, if the function was
+    read from one."""
+
+    function: int
+    instruction: int
+    address: int
+
+
+class InstructionIndex:
+    """The instructions of a module by opcode and operand.
+
+    Instructions are numbered in order of function and position, and
+    instruction ``r`` is at ``offsets[r]`` bytes into its body, with its
+    operands packed into ``payloads[r]`` as in ``CompactInstructions`` and
+    ``br_table`` label vectors in ``vectors``.  The instructions of the
+    ``f``-th defined function are ``function_rows[f]`` up to
+    ``function_rows[f + 1]``, and its body starts at byte
+    ``function_addresses[f]`` of the module.
+
+    Posting ``j`` is instruction ``order[j]``, looked up by ``keys[j]``.
+    The key of an instruction is its index operand for calls, branches and
+    variable and table accesses, its value for ``i32.const`` and
+    ``i64.const``, its offset for loads and stores, its block type byte for
+    blocks and the bits of its value for float constants.  Instructions
+    with no operands, and ``br_table``, can only be looked up by opcode.
+
+    ``digest`` is the SHA-256 of the module's bytes, when the index was
+    built from them, and is used to tell whether a saved index is stale.
+    """
+
+    def __init__(self) -> None:
+        self.opcode_offsets = array("I", bytes(4 * 257))
+        self.order = array("I")
+        self.keys = array("q")
+        self.offsets = array("I")
+        self.payloads = array("q")
+        self.function_rows = array("I", [0])
+        self.function_addresses = array("I")
+        self.vectors = array("I")
+        self.imported = 0
+        self.digest = b""
+
+    @staticmethod
+    def build(module: Module) -> "InstructionIndex":
+        """Index every instruction of ``module`` in one pass over its bodies.
+
+        Bodies are copied a column at a time from ``CompactInstructions``,
+        so modules read with ``compact=True`` are indexed quickest.
+        """
+        index = InstructionIndex()
+        index.imported = len(module.function_imports())
+        offsets = index.offsets
+        payloads = index.payloads
+        vectors = index.vectors
+        opcodes = array("B")
+        for function in module.functions:
+            instructions = function.peek_instructions()
+            if isinstance(instructions, CompactInstructions):
+                ci = instructions
+            else:
+                ci = CompactInstructions.from_instructions(instructions)
+            offsets.extend(ci.offsets)
+            del offsets[-1]
+            opcodes.extend(ci.opcodes)
+            if ci.vectors:
+                # Label vectors move to the index's own side table.
+                base = len(vectors)
+                vectors.extend(ci.vectors)
+                shifted = array("q", ci.payloads)
+                for i, byte in enumerate(ci.opcodes):
+                    if OPCODE_LAYOUTS[byte] == LAYOUT_BR_TABLE:
+                        shifted[i] += base
+                payloads.extend(shifted)
+            else:
+                payloads.extend(ci.payloads)
+            index.function_rows.append(len(payloads))
+            index.function_addresses.append(function.address)
+
+        buckets: List[List[int]] = [[] for byte in range(256)]
+        appenders = [bucket.append for bucket in buckets]
+        for row, byte in enumerate(opcodes):
+            appenders[byte](row)
+
+        opcode_offsets = index.opcode_offsets
+        keys = index.keys
+        for byte, bucket in enumerate(buckets):
+            opcode_offsets[byte + 1] = opcode_offsets[byte] + len(bucket)
+            kind = OPCODE_LAYOUTS[byte]
+            # The sorts are stable, so instructions with equal keys stay in
+            # order of position.
+            if kind == LAYOUT_MEMARG:
+                memargs = {row: (payloads[row] >> 32) & 0xFFFFFFFF for row in bucket}
+                bucket.sort(key=memargs.__getitem__)
+                keys.extend(map(memargs.__getitem__, bucket))
+            elif kind in (LAYOUT_NONE, LAYOUT_ZERO, LAYOUT_BR_TABLE):
+                keys.extend(array("q", bytes(8 * len(bucket))))
+            else:
+                bucket.sort(key=payloads.__getitem__)
+                keys.extend(map(payloads.__getitem__, bucket))
+            index.order.extend(bucket)
+        return index
+
+    @staticmethod
+    def from_bytes(bytez: bytes) -> "InstructionIndex":
+        module = wasamole.io.from_bytes(
+            bytez, sections=["import", "function", "code"], compact=True
+        )
+        index = InstructionIndex.build(module)
+        index.digest = hashlib.sha256(bytez).digest()
+        return index
+
+    @staticmethod
+    def from_file(
+        filename: str, cache: bool = False, directory: Optional[str] = None
+    ) -> "InstructionIndex":
+        """The index of the module in ``filename``.
+
+        With ``cache``, the index saved under the module's file name plus
+        ``INDEX_SUFFIX`` is loaded if it was built from the same bytes, and
+        the index is built and saved there otherwise.  It is saved next to
+        the module unless ``directory`` is given.  The cache is best effort:
+        an index that cannot be saved is still returned.
+        """
+        with open(filename, "rb") as f:
+            bytez = f.read()
+        path = str(filename) + INDEX_SUFFIX
+        if directory is not None:
+            path = os.path.join(directory, os.path.basename(path))
+        if cache:
+            try:
+                index = InstructionIndex.load(path)
+            except (OSError, ValueError):
+                pass
+            else:
+                if index.digest == hashlib.sha256(bytez).digest():
+                    return index
+        index = InstructionIndex.from_bytes(bytez)
+        if cache:
+            try:
+                index.save(path)
+            except OSError:
+                pass
+        return index
+
+    #
+    # Queries
+    #
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def count(self, opcode: Union[Opcode, int]) -> int:
+        byte = _byte(opcode)
+        return self.opcode_offsets[byte + 1] - self.opcode_offsets[byte]
+
+    def find(
+        self, opcode: Union[Opcode, int], key: Union[int, float, None] = None
+    ) -> List[Posting]:
+        """Every ``opcode`` instruction, or those whose key is ``key``.
+
+        For instance ``find(Opcode.GLOBAL_SET, 0)`` or
+        ``find(Opcode.F64_CONST, 0.5)``.  Postings come in order of key,
+        then of position.
+        """
+        byte = _byte(opcode)
+        if key is None:
+            return self._postings(*self._rows(byte))
+        bits = _bits(byte, key)
+        return self._postings(*self._rows(byte, bits, bits))
+
+    def between(
+        self,
+        opcode: Union[Opcode, int],
+        low: Optional[int] = None,
+        high: Optional[int] = None,
+    ) -> List[Posting]:
+        """The ``opcode`` instructions with keys from ``low`` to ``high``
+        inclusive, either of which may be left open.
+
+        ``between(Opcode.I32_LOAD, 0x10001)`` finds the 32-bit loads with
+        an offset over 0x10000.  Float constants, which are keyed by their
+        bits, cannot be searched by range.
+        """
+        byte = _byte(opcode)
+        if OPCODE_LAYOUTS[byte] in (LAYOUT_F32, LAYOUT_F64):
+            raise ValueError("float constants cannot be searched by range")
+        if low is not None:
+            _bits(byte, low)
+        if high is not None:
+            _bits(byte, high)
+        return self._postings(*self._rows(byte, low, high))
+
+    def where(
+        self,
+        opcode: Union[Opcode, int],
+        predicate: Callable[[List[Operand]], bool],
+    ) -> List[Posting]:
+        """The ``opcode`` instructions whose operands satisfy ``predicate``.
+
+        Each instruction's operands are decoded to call ``predicate``, so
+        this costs a pass over the postings of ``opcode``, where ``find``
+        and ``between`` only search them.
+        """
+        byte = _byte(opcode)
+        kind = OPCODE_LAYOUTS[byte]
+        start, stop = self._rows(byte)
+        payloads = self.payloads
+        return [
+            self._posting(row)
+            for row in self.order[start:stop]
+            if predicate(_operands(kind, payloads[row], self.vectors))
+        ]
+
+    def _rows(
+        self, byte: int, low: Optional[int] = None, high: Optional[int] = None
+    ) -> Tuple[int, int]:
+        start = self.opcode_offsets[byte]
+        stop = self.opcode_offsets[byte + 1]
+        if low is not None:
+            start = bisect_left(self.keys, low, start, stop)
+        if high is not None:
+            stop = bisect_right(self.keys, high, start, stop)
+        return start, stop
+
+    def _posting(self, row: int) -> Posting:
+        function_rows = self.function_rows
+        # The last function starting at or before ``row``, skipping over
+        # empty functions that start there too.
+        f = bisect_right(function_rows, row) - 1
+        return Posting(
+            self.imported + f,
+            row - function_rows[f],
+            self.function_addresses[f] + self.offsets[row],
+        )
+
+    def _postings(self, start: int, stop: int) -> List[Posting]:
+        return list(map(self._posting, self.order[start:stop]))
+
+    #
+    # Serialization
+    #
+
+    def _columns(self) -> List["array[int]"]:
+        return [
+            self.opcode_offsets,
+            self.order,
+            self.keys,
+            self.offsets,
+            self.payloads,
+            self.function_rows,
+            self.function_addresses,
+            self.vectors,
+        ]
+
+    def to_bytes(self) -> bytes:
+        columns = self._columns()
+        lengths = map(len, columns)
+        parts = [_MAGIC, _HEADER.pack(self.digest, self.imported, *lengths)]
+        for column in columns:
+            if sys.byteorder == "big":
+                column = array(column.typecode, column)
+                column.byteswap()
+            parts.append(column.tobytes())
+        return b"".join(parts)
+
+    @staticmethod
+    def from_serialized(data: bytes) -> "InstructionIndex":
+        """The index ``to_bytes`` wrote to ``data``."""
+        if not data.startswith(_MAGIC):
+            raise ValueError("not a wasamole instruction index")
+        header = _HEADER.unpack_from(data, len(_MAGIC))
+        index = InstructionIndex()
+        # An index that was not built from bytes is saved with zeros.
+        index.digest = header[0] if any(header[0]) else b""
+        index.imported = header[1]
+        offset = len(_MAGIC) + _HEADER.size
+        for column, length in zip(index._columns(), header[2:]):
+            end = offset + length * column.itemsize
+            if end > len(data):
+                raise ValueError("truncated instruction index")
+            del column[:]
+            column.frombytes(data[offset:end])
+            if sys.byteorder == "big":
+                column.byteswap()
+            offset = end
+        if len(index.opcode_offsets) != 257 or not index.function_rows:
+            raise ValueError("corrupt instruction index")
+        return index
+
+    def save(self, filename: str) -> None:
+        # Written to a temporary file and renamed, so that a concurrent
+        # reader never sees half an index.
+        fd, tmp = tempfile.mkstemp(
+            prefix=".", suffix=".tmp", dir=os.path.dirname(filename) or "."
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.to_bytes())
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def load(filename: str) -> "InstructionIndex":
+        with open(filename, "rb") as f:
+            return InstructionIndex.from_serialized(f.read())
+
+
+def _byte(opcode: Union[Opcode, int]) -> int:
+    return opcode._value_ if isinstance(opcode, Opcode) else opcode
+
+
+def _bits(byte: int, key: Union[int, float]) -> int:
+    # The key ``key`` is stored as for an instruction with opcode ``byte``.
+    kind = OPCODE_LAYOUTS[byte]
+    if kind in (LAYOUT_NONE, LAYOUT_ZERO, LAYOUT_BR_TABLE):
+        raise ValueError(f"opcode {byte:#04x} has no operand to look up")
+    if kind == LAYOUT_F32:
+        return int(_F32_BITS.unpack(_F32_VALUE.pack(key))[0])
+    if kind == LAYOUT_F64:
+        return int(_F64_BITS.unpack(_F64_VALUE.pack(key))[0])
+    if not isinstance(key, int):
+        raise TypeError(f"opcode {byte:#04x} is looked up by an integer")
+    return key
+
+
+def _operands(kind: int, payload: int, vectors: "array[int]") -> List[Operand]:
+    if kind == LAYOUT_NONE:
+        return []
+    elif kind == LAYOUT_INDEX:
+        return [IndexOperand(payload)]
+    elif kind == LAYOUT_I32:
+        return [I32Operand(payload)]
+    return CompactInstructions._instruction_operands(kind, payload, vectors)
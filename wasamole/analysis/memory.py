@@ -0,0 +1,248 @@
+"""The initial contents of linear memory, and searching them.
+
+Data segments hold views of the reader's input rather than copies, so
+segments can be inspected without touching the rest of the file.  A
+``MemoryImage`` lays the segments of one memory out at the addresses their
+offset expressions evaluate to, so data can be searched as the program
+sees it: a string that straddles two segments is found, and addresses are
+the ones code uses.
+"""
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Iterator, List, Mapping, Optional, Pattern, Tuple, Union
+
+from wasamole.core.data import DataSegment
+from wasamole.core.globalvar import Global
+from wasamole.core.imports import GlobalImport
+from wasamole.core.instructions import Instruction, Opcode
+from wasamole.core.module import Module
+
+_M32 = (1 << 32) - 1
+
+# Segments closer together than this many bytes share an extent.
+MERGE_GAP = 4096
+
+# Printable ASCII and the usual whitespace.
+_TEXT = b"[\\x20-\\x7e\\t\\n\\r]"
+
+
+def evaluate_constant(
+    expression: List[Instruction],
+    module: Module,
+    imported: Optional[Mapping[int, int]] = None,
+) -> int:
+    """The value of an i32 constant expression, such as a segment offset.
+
+    Globals defined in the module are evaluated in turn; the values of
+    imported globals have to be given in ``imported``, keyed by global
+    index.  ``i32.add``, ``i32.sub`` and ``i32.mul`` from the extended
+    constant expressions are accepted as well.
+    """
+    return _evaluate(expression, module, imported, _global_imports(module))
+
+
+def _evaluate(
+    expression: List[Instruction],
+    module: Module,
+    imported: Optional[Mapping[int, int]],
+    imports: List[GlobalImport],
+) -> int:
+    stack: List[int] = []
+    for instr in expression:
+        opcode = instr.opcode
+        if opcode == Opcode.I32_CONST:
+            stack.append(int(instr.operands[0].value) & _M32)  # type: ignore
+        elif opcode == Opcode.GLOBAL_GET:
+            index = instr.operands[0].index  # type: ignore
+            stack.append(_global(index, module, imported, imports))
+        elif opcode == Opcode.I32_ADD:
+            b = stack.pop()
+            stack.append((stack.pop() + b) & _M32)
+        elif opcode == Opcode.I32_SUB:
+            b = stack.pop()
+            stack.append((stack.pop() - b) & _M32)
+        elif opcode == Opcode.I32_MUL:
+            b = stack.pop()
+            stack.append((stack.pop() * b) & _M32)
+        elif opcode != Opcode.END:
+            raise ValueError(f"{instr.opname} is not a constant instruction")
+    if len(stack) != 1:
+        raise ValueError("constant expression does not produce one value")
+    return stack[0]
+
+
+def _global_imports(module: Module) -> List[GlobalImport]:
+    return [bi for bi in module.imports if isinstance(bi, GlobalImport)]
+
+
+def _global(
+    index: int,
+    module: Module,
+    imported: Optional[Mapping[int, int]],
+    imports: List[GlobalImport],
+) -> int:
+    if index < len(imports):
+        if imported is None or index not in imported:
+            bi = imports[index]
+            raise ValueError(
+                f"value of imported global {index} ({bi.module_name}.{bi.name}) "
+                "is not known"
+            )
+        return imported[index] & _M32
+    globl: Global = module.globals[index - len(imports)]
+    return _evaluate(globl.init_expression, module, imported, imports)
+
+
+@dataclass
+class MemoryImage:
+    """Memory ``memory_index`` as its data segments initialise it.
+
+    Only the parts of memory that segments cover are held, as ``extents``:
+    ``(address, bytes)`` runs in address order, so segments at far apart
+    addresses cost no more than their own size.  Segments less than
+    ``MERGE_GAP`` bytes apart share an extent, with the gap between them
+    zero, so that data spanning them is found by searches; matches never
+    span two extents.  Addresses outside the extents read as zero.  Later
+    segments overwrite earlier ones where they overlap, as at
+    instantiation.  ``placements`` lists each segment with its address, in
+    section order.
+    """
+
+    memory_index: int
+    extents: List[Tuple[int, bytearray]]
+    placements: List[Tuple[int, DataSegment]]
+    _starts: List[Tuple[int, int]] = field(init=False, repr=False, compare=False)
+    _addresses: List[int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._starts = sorted(
+            (address, i) for i, (address, _) in enumerate(self.placements)
+        )
+        self._addresses = [address for address, _ in self.extents]
+
+    @staticmethod
+    def build(
+        module: Module,
+        memory_index: int = 0,
+        imported: Optional[Mapping[int, int]] = None,
+    ) -> "MemoryImage":
+        """Evaluate the segment offsets and copy the segments into place.
+
+        ``imported`` gives the values of imported globals that offsets
+        refer to, as for ``evaluate_constant``.
+        """
+        imports = _global_imports(module)
+        placements = [
+            (_evaluate(segment.offset_expression, module, imported, imports), segment)
+            for segment in module.datas
+            if segment.memory_index == memory_index
+        ]
+
+        spans: List[List[int]] = []
+        for address, segment in sorted(placements, key=lambda p: p[0]):
+            end = address + len(segment.data)
+            if spans and address <= spans[-1][1] + MERGE_GAP:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([address, end])
+        extents = [(start, bytearray(end - start)) for start, end in spans]
+        starts = [start for start, _ in spans]
+        for address, segment in placements:
+            start, data = extents[bisect_right(starts, address) - 1]
+            data[address - start : address - start + len(segment.data)] = segment.data
+        return MemoryImage(memory_index, extents, placements)
+
+    @property
+    def base(self) -> int:
+        """The lowest address a segment covers, or 0 without segments."""
+        return self.extents[0][0] if self.extents else 0
+
+    @property
+    def end(self) -> int:
+        """The address after the highest one a segment covers."""
+        if not self.extents:
+            return 0
+        start, data = self.extents[-1]
+        return start + len(data)
+
+    def read(self, address: int, size: int) -> bytes:
+        """``size`` bytes at ``address``; bytes outside the image read as zero."""
+        out = bytearray(size)
+        i = max(bisect_right(self._addresses, address) - 1, 0)
+        for start, data in self.extents[i:]:
+            if start >= address + size:
+                break
+            lo = max(address, start)
+            hi = min(address + size, start + len(data))
+            if lo < hi:
+                out[lo - address : hi - address] = data[lo - start : hi - start]
+        return bytes(out)
+
+    def segment_at(self, address: int) -> Optional[DataSegment]:
+        """The segment whose bytes are at ``address``, if any.
+
+        Where segments overlap, the last one to be written wins.
+        """
+        found = None
+        stop = bisect_right(self._starts, (address, len(self.placements)))
+        for start, i in self._starts[:stop]:
+            segment = self.placements[i][1]
+            if address < start + len(segment.data) and (found is None or i > found):
+                found = i
+        return None if found is None else self.placements[found][1]
+
+    def find(self, needle: bytes) -> Iterator[int]:
+        """The address of every occurrence of ``needle``, overlapping or not."""
+        for start, data in self.extents:
+            i = data.find(needle)
+            while i >= 0:
+                yield start + i
+                i = data.find(needle, i + 1)
+
+    def search(
+        self, pattern: Union[bytes, Pattern[bytes]], flags: int = 0
+    ) -> Iterator[Tuple[int, "re.Match[bytes]"]]:
+        """The address and match of every match of the regular expression.
+
+        Each extent is searched on its own, so ``^`` and ``$`` match at the
+        ends of every extent.
+        """
+        if isinstance(pattern, bytes):
+            pattern = re.compile(pattern, flags)
+        for start, data in self.extents:
+            for match in pattern.finditer(data):
+                yield start + match.start(), match
+
+    def strings(self, min_length: int = 4) -> Iterator[Tuple[int, bytes]]:
+        """NUL-terminated runs of at least ``min_length`` printable characters.
+
+        Yields each string's address and its bytes, without the NUL.
+        """
+        # The lookbehind only lets a match start where a run does.  Without
+        # it, a long run lacking the NUL would be retried, and backtracked
+        # through, from every position in it.
+        pattern = re.compile(
+            b"(?<!%s)(%s{%d,})\\x00" % (_TEXT, _TEXT, max(min_length, 1))
+        )
+        for start, data in self.extents:
+            for match in pattern.finditer(data):
+                yield start + match.start(), match.group(1)
+
+    def cstring(self, address: int, limit: Optional[int] = None) -> bytes:
+        """The NUL-terminated string at ``address``, without the NUL.
+
+        Reads stop at the end of the extent, where memory is zero, or after
+        ``limit`` bytes.
+        """
+        i = bisect_right(self._addresses, address) - 1
+        if i < 0:
+            return b""
+        extent_start, data = self.extents[i]
+        start = address - extent_start
+        if start >= len(data):
+            return b""
+        stop = len(data) if limit is None else min(start + limit, len(data))
+        nul = data.find(b"\x00", start, stop)
+        return bytes(data[start : stop if nul < 0 else nul])
@@ -0,0 +1,219 @@
+"""Opcode statistics computed with NumPy.
+
+Function bodies are decoded into ``CompactInstructions`` columns, the
+reader's compact form, and their opcode bytes are joined into one flat
+array with an offset per function.  Histograms, n-gram counts and feature
+matrices are then whole-array operations, with no per-instruction Python
+work.  Corpora of many files are handled the same way, with an extra level
+of offsets from modules to functions.
+
+NumPy is an optional dependency (``pip install wasamole[stats]``) and is
+only imported when this module is first used.
+"""
+
+import multiprocessing
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional, Sequence, Tuple
+
+import wasamole.io
+from wasamole.core.compact import CompactInstructions
+from wasamole.core.instructions import Opcode
+from wasamole.core.module import Module
+
+if TYPE_CHECKING:
+    import numpy
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "wasamole.analysis.stats needs NumPy; install wasamole[stats]"
+        ) from e
+    return numpy
+
+
+# The opcode bytes that are defined, in order: the default feature columns.
+OPCODES = sorted(opcode.value for opcode in Opcode)
+
+
+@dataclass
+class OpcodeArrays:
+    """The opcodes of many functions, possibly from many modules.
+
+    Function ``i``'s opcodes are ``opcodes[offsets[i]:offsets[i + 1]]`` and
+    module ``m``'s functions are ``module_offsets[m]`` up to
+    ``module_offsets[m + 1]``.  Only functions defined in a module count;
+    imports have no body.
+    """
+
+    opcodes: "numpy.ndarray"
+    offsets: "numpy.ndarray"
+    module_offsets: "numpy.ndarray"
+
+    @staticmethod
+    def from_module(module: Module) -> "OpcodeArrays":
+        np = _numpy()
+        chunks = []
+        for function in module.functions:
+            instructions = function.peek_instructions()
+            if isinstance(instructions, CompactInstructions):
+                chunks.append(instructions.opcodes.tobytes())
+            else:
+                # ``_value_`` is a plain attribute, unlike ``value``.
+                chunks.append(bytes([i.opcode._value_ for i in instructions]))
+        lengths = np.fromiter(map(len, chunks), np.int64, len(chunks))
+        offsets = np.zeros(len(chunks) + 1, np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        opcodes = np.frombuffer(b"".join(chunks), np.uint8)
+        return OpcodeArrays(opcodes, offsets, np.array([0, len(chunks)], np.int64))
+
+    @staticmethod
+    def from_bytes(bytez: bytes) -> "OpcodeArrays":
+        module = wasamole.io.from_bytes(bytez, sections=["code"], compact=True)
+        return OpcodeArrays.from_module(module)
+
+    @staticmethod
+    def from_file(filename: str, parallel: int = 0) -> "OpcodeArrays":
+        """Read only the code section of ``filename``.
+
+        ``parallel`` is passed on to the reader, to decode the bodies of
+        one large file in several processes.
+        """
+        module = wasamole.io.from_file(
+            filename, sections=["code"], compact=True, parallel=parallel
+        )
+        return OpcodeArrays.from_module(module)
+
+    @staticmethod
+    def concatenate(arrays: Sequence["OpcodeArrays"]) -> "OpcodeArrays":
+        """One set of arrays holding the modules of all of ``arrays`` in order."""
+        np = _numpy()
+        if not arrays:
+            empty = np.zeros(1, np.int64)
+            return OpcodeArrays(np.zeros(0, np.uint8), empty, empty.copy())
+        instruction_base = np.cumsum([0] + [len(a.opcodes) for a in arrays])
+        function_base = np.cumsum([0] + [a.functions for a in arrays])
+        offsets = [arrays[0].offsets[:1]]
+        module_offsets = [arrays[0].module_offsets[:1]]
+        for a, instructions, functions in zip(arrays, instruction_base, function_base):
+            offsets.append(a.offsets[1:] + instructions)
+            module_offsets.append(a.module_offsets[1:] + functions)
+        return OpcodeArrays(
+            np.concatenate([a.opcodes for a in arrays]),
+            np.concatenate(offsets),
+            np.concatenate(module_offsets),
+        )
+
+    @property
+    def functions(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def modules(self) -> int:
+        return len(self.module_offsets) - 1
+
+    def lengths(self) -> "numpy.ndarray":
+        """The number of instructions in each function."""
+        lengths: "numpy.ndarray" = _numpy().diff(self.offsets)
+        return lengths
+
+    def function_ids(self) -> "numpy.ndarray":
+        """The function each instruction belongs to."""
+        np = _numpy()
+        ids: "numpy.ndarray" = np.repeat(np.arange(self.functions), self.lengths())
+        return ids
+
+    def module_ids(self) -> "numpy.ndarray":
+        """The module each instruction belongs to."""
+        np = _numpy()
+        per_module = np.diff(self.offsets[self.module_offsets])
+        ids: "numpy.ndarray" = np.repeat(np.arange(self.modules), per_module)
+        return ids
+
+    def histogram(self) -> "numpy.ndarray":
+        """Occurrences of each opcode byte over everything, 256 entries."""
+        counts: "numpy.ndarray" = _numpy().bincount(self.opcodes, minlength=256)
+        return counts
+
+    def function_histograms(self) -> "numpy.ndarray":
+        """A (functions, 256) matrix of opcode counts."""
+        return self._histograms(self.function_ids(), self.functions)
+
+    def module_histograms(self) -> "numpy.ndarray":
+        """A (modules, 256) matrix of opcode counts."""
+        return self._histograms(self.module_ids(), self.modules)
+
+    def _histograms(self, rows: "numpy.ndarray", count: int) -> "numpy.ndarray":
+        np = _numpy()
+        # One bincount over (row, opcode) pairs flattened into a single
+        # index does the whole matrix at once.
+        index = rows * 256 + self.opcodes
+        counts: "numpy.ndarray" = np.bincount(index, minlength=count * 256)
+        return counts.reshape(count, 256)
+
+    def ngrams(self, n: int = 2) -> Tuple["numpy.ndarray", "numpy.ndarray"]:
+        """Counts of each sequence of ``n`` consecutive opcodes.
+
+        Sequences do not cross function boundaries.  Returns an (k, n)
+        array of the distinct sequences and their counts, most frequent
+        first.
+        """
+        np = _numpy()
+        if not 1 <= n <= 8:
+            raise ValueError("n-grams are packed into 64 bits; n must be 1 to 8")
+        opcodes = self.opcodes.astype(np.uint64)
+        count = len(opcodes) - n + 1
+        if count <= 0:
+            return np.zeros((0, n), np.uint8), np.zeros(0, np.int64)
+        codes = np.zeros(count, np.uint64)
+        for k in range(n):
+            codes <<= np.uint64(8)
+            codes |= opcodes[k : k + count]
+        # A sequence starting at i is whole if its function ends at i + n or
+        # later.
+        ends = np.repeat(self.offsets[1:], self.lengths())[:count]
+        codes = codes[np.arange(count) + n <= ends]
+
+        grams, counts = np.unique(codes, return_counts=True)
+        order = np.argsort(-counts, kind="stable")
+        grams, counts = grams[order], counts[order]
+        shifts = np.arange(n - 1, -1, -1, dtype=np.uint64) * np.uint64(8)
+        unpacked = ((grams[:, None] >> shifts) & np.uint64(0xFF)).astype(np.uint8)
+        return unpacked, counts
+
+    def feature_matrix(
+        self, columns: Optional[Iterable[int]] = None, normalize: bool = True
+    ) -> "numpy.ndarray":
+        """One row per function of opcode counts, by default as frequencies.
+
+        ``columns`` chooses the opcode bytes and their order; it defaults to
+        ``OPCODES``.  Rows of empty functions are all zero.
+        """
+        np = _numpy()
+        selected = np.array(OPCODES if columns is None else list(columns), np.intp)
+        matrix = self.function_histograms()[:, selected].astype(np.float64)
+        if normalize:
+            totals = self.lengths().astype(np.float64)
+            np.divide(matrix, totals[:, None], out=matrix, where=totals[:, None] > 0)
+        return matrix
+
+
+def _from_file(filename: str) -> OpcodeArrays:
+    return OpcodeArrays.from_file(filename)
+
+
+def corpus(filenames: Iterable[str], jobs: int = 1) -> OpcodeArrays:
+    """The opcodes of every function of every file, one module per file.
+
+    With ``jobs`` > 1 the files are read in that many processes.
+    """
+    filenames = list(filenames)
+    arrays: List[OpcodeArrays]
+    if jobs > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            arrays = pool.map(_from_file, filenames)
+    else:
+        arrays = [_from_file(filename) for filename in filenames]
+    return OpcodeArrays.concatenate(arrays)
@@ -0,0 +1,819 @@
+"""Validation of modules against the WebAssembly 1.0 type system.
+
+``validate`` checks that every index a module uses is in range and type
+checks the operand stack of every function body, following the validation
+algorithm in the appendix of the specification.  The tables a body is
+checked against -- function signatures, global types and the numbers of
+tables and memories -- are resolved once per module into a
+``ValidationContext``.  Each body is then checked in a single pass over its
+instructions and independently of the others, so bodies can be checked in
+worker processes.
+
+Bodies are checked in the columns of ``CompactInstructions``.  From lists
+of instructions only the columns the checks read are gathered, so
+validation is quickest for modules read with ``compact=True``.  Readers
+that validate check each body as they decode it, with
+``read_checked_locals`` and ``decode_checked``, so that a body that cannot
+be decoded is reported like any other invalid one.
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+
+from wasamole.core.compact import CompactInstructions
+from wasamole.core.exports import FuncExport, GlobalExport, MemExport, TypeExport
+from wasamole.core.function import (
+    Function,
+    LazyFunction,
+    decode_instructions,
+    read_locals,
+)
+from wasamole.core.imports import GlobalImport, MemoryImport, TableImport, TypeImport
+from wasamole.core.instructions import (
+    BlockTypeOperand,
+    IndexOperand,
+    IndexVectorOperand,
+    Instruction,
+    MemArgOperand,
+    Opcode,
+    read_instruction,
+)
+from wasamole.core.localvar import Local
+from wasamole.core.module import Module
+from wasamole.core.types import LimitType, MutType, ValueType
+from wasamole.util.bytes_reader import Buffer, ByteReader
+
+# Value types are handled as their binary encodings.  An operand popped
+# from the stack after an unconditional branch may have any type, which is
+# written as 0.
+_I32 = ValueType.i32._value_
+_I64 = ValueType.i64._value_
+_F32 = ValueType.f32._value_
+_F64 = ValueType.f64._value_
+_UNKNOWN = 0
+
+_TYPE_NAMES = {t._value_: t.name for t in ValueType}
+_TYPE_NAMES[_UNKNOWN] = "unknown"
+
+# A signature as two lists of value types, which compare directly against
+# slices of the operand stack.
+Signature = Tuple[List[int], List[int]]
+
+# What decoding a malformed body raises: bad encodings are a ValueError and
+# truncated ones fail reading past the end.
+_DECODE_ERRORS = (ValueError, IndexError, struct.error)
+
+
+class ValidationError(ValueError):
+    """A module is not valid.
+
+    ``function`` is the index of the offending function, imports first,
+    and ``instruction`` the position of the offending instruction in its
+    body, where there is one.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        function: Optional[int] = None,
+        instruction: Optional[int] = None,
+    ) -> None:
+        super().__init__(message)
+        self.message = message
+        self.function = function
+        self.instruction = instruction
+
+    def __str__(self) -> str:
+        where = []
+        if self.function is not None:
+            where.append(f"function {self.function}")
+        if self.instruction is not None:
+            where.append(f"instruction {self.instruction}")
+        return ": ".join(where + [self.message])
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (ValidationError, (self.message, self.function, self.instruction))
+
+
+@dataclass
+class ValidationContext:
+    """What a function body is checked against, resolved from its module.
+
+    ``types`` holds the signature of each type, ``functions`` that of each
+    function, imports first, and ``globals`` each global's value type and
+    whether it is mutable.
+    """
+
+    types: List[Signature]
+    functions: List[Signature]
+    globals: List[Tuple[int, bool]]
+    tables: int
+    memories: int
+
+    @staticmethod
+    def from_module(module: Module) -> "ValidationContext":
+        types = [
+            ([t._value_ for t in ft.params], [t._value_ for t in ft.results])
+            for ft in module.types
+        ]
+        type_indices = [i.index for i in module.imports if isinstance(i, TypeImport)]
+        type_indices += [f.type_index for f in module.functions]
+        for function_i, type_index in enumerate(type_indices):
+            if type_index >= len(types):
+                raise ValidationError(f"unknown type {type_index}", function_i)
+
+        globals = [
+            (i.global_type.valtype._value_, i.global_type.mut is MutType.var)
+            for i in module.imports
+            if isinstance(i, GlobalImport)
+        ]
+        globals += [
+            (g.type.valtype._value_, g.type.mut is MutType.var) for g in module.globals
+        ]
+        tables = sum(isinstance(i, TableImport) for i in module.imports)
+        memories = sum(isinstance(i, MemoryImport) for i in module.imports)
+        return ValidationContext(
+            types,
+            [types[i] for i in type_indices],
+            globals,
+            tables + len(module.tables),
+            memories + len(module.memories),
+        )
+
+
+#
+# Instruction tables
+#
+
+# How each opcode is checked.
+_INVALID = 0
+_NUMERIC = 1
+_LOCAL_GET = 2
+_CONST = 3
+_LOCAL_SET = 4
+_MEMORY = 5
+_LOCAL_TEE = 6
+_END = 7
+_BR_IF = 8
+_CALL = 9
+_BLOCK = 10
+_GLOBAL_GET = 11
+_GLOBAL_SET = 12
+_IF = 13
+_ELSE = 14
+_BR = 15
+_BR_TABLE = 16
+_RETURN = 17
+_CALL_INDIRECT = 18
+_DROP = 19
+_SELECT = 20
+_UNREACHABLE = 21
+_NOP = 22
+
+_KINDS = [_INVALID] * 256
+# For numeric and memory instructions: the number of operands popped, their
+# types and the types pushed.
+_SIGNATURES: List[Tuple[int, List[int], List[int]]] = [(0, [], [])] * 256
+# For memory instructions: the largest alignment, as a power of two.
+_MAX_ALIGN = [0] * 256
+# For constants: the type pushed.
+_CONSTANTS = [_UNKNOWN] * 256
+
+_TYPES = {"I32": _I32, "I64": _I64, "F32": _F32, "F64": _F64}
+_NATURAL_ALIGN = {_I32: 2, _I64: 3, _F32: 2, _F64: 3}
+
+# The numeric instructions before the conversions, by range of opcodes.
+_NUMERIC_RANGES = [
+    (Opcode.I32_EQZ, Opcode.I32_EQZ, [_I32], [_I32]),
+    (Opcode.I32_EQ, Opcode.I32_GE_U, [_I32, _I32], [_I32]),
+    (Opcode.I64_EQZ, Opcode.I64_EQZ, [_I64], [_I32]),
+    (Opcode.I64_EQ, Opcode.I64_GE_U, [_I64, _I64], [_I32]),
+    (Opcode.F32_EQ, Opcode.F32_GE, [_F32, _F32], [_I32]),
+    (Opcode.F64_EQ, Opcode.F64_GE, [_F64, _F64], [_I32]),
+    (Opcode.I32_CLZ, Opcode.I32_POPCNT, [_I32], [_I32]),
+    (Opcode.I32_ADD, Opcode.I32_ROTR, [_I32, _I32], [_I32]),
+    (Opcode.I64_CLZ, Opcode.I64_POPCNT, [_I64], [_I64]),
+    (Opcode.I64_ADD, Opcode.I64_ROTR, [_I64, _I64], [_I64]),
+    (Opcode.F32_ABS, Opcode.F32_SQRT, [_F32], [_F32]),
+    (Opcode.F32_ADD, Opcode.F32_COPYSIGN, [_F32, _F32], [_F32]),
+    (Opcode.F64_ABS, Opcode.F64_SQRT, [_F64], [_F64]),
+    (Opcode.F64_ADD, Opcode.F64_COPYSIGN, [_F64, _F64], [_F64]),
+]
+
+
+def _build_tables() -> None:
+    for first, last, params, results in _NUMERIC_RANGES:
+        for byte in range(first._value_, last._value_ + 1):
+            _KINDS[byte] = _NUMERIC
+            _SIGNATURES[byte] = (len(params), params, results)
+
+    for opcode in Opcode:
+        byte = opcode._value_
+        parts = opcode.name.split("_")
+        if Opcode.I32_WRAP_I64._value_ <= byte <= Opcode.F64_REINTERPRET_I64._value_:
+            # Conversions are named result_operation_operand.
+            _KINDS[byte] = _NUMERIC
+            _SIGNATURES[byte] = (1, [_TYPES[parts[2]]], [_TYPES[parts[0]]])
+        elif Opcode.I32_LOAD._value_ <= byte <= Opcode.I64_STORE32._value_:
+            # Loads and stores are named type_load or type_store, with the
+            # width in bits for the narrower ones.
+            t = _TYPES[parts[0]]
+            load = parts[1].startswith("LOAD")
+            bits = parts[1][4:] if load else parts[1][5:]
+            _KINDS[byte] = _MEMORY
+            _MAX_ALIGN[byte] = {"": _NATURAL_ALIGN[t], "8": 0, "16": 1, "32": 2}[bits]
+            if load:
+                _SIGNATURES[byte] = (1, [_I32], [t])
+            else:
+                _SIGNATURES[byte] = (2, [_I32, t], [])
+        elif Opcode.I32_CONST._value_ <= byte <= Opcode.F64_CONST._value_:
+            _KINDS[byte] = _CONST
+            _CONSTANTS[byte] = _TYPES[parts[0]]
+
+    _KINDS[Opcode.MEMORY_SIZE._value_] = _MEMORY
+    _SIGNATURES[Opcode.MEMORY_SIZE._value_] = (0, [], [_I32])
+    _KINDS[Opcode.MEMORY_GROW._value_] = _MEMORY
+    _SIGNATURES[Opcode.MEMORY_GROW._value_] = (1, [_I32], [_I32])
+
+    for opcode, kind in [
+        (Opcode.UNREACHABLE, _UNREACHABLE),
+        (Opcode.NOP, _NOP),
+        (Opcode.BLOCK, _BLOCK),
+        (Opcode.LOOP, _BLOCK),
+        (Opcode.IF, _IF),
+        (Opcode.ELSE, _ELSE),
+        (Opcode.END, _END),
+        (Opcode.BR, _BR),
+        (Opcode.BR_IF, _BR_IF),
+        (Opcode.BR_TABLE, _BR_TABLE),
+        (Opcode.RETURN, _RETURN),
+        (Opcode.CALL, _CALL),
+        (Opcode.CALL_INDIRECT, _CALL_INDIRECT),
+        (Opcode.DROP, _DROP),
+        (Opcode.SELECT, _SELECT),
+        (Opcode.LOCAL_GET, _LOCAL_GET),
+        (Opcode.LOCAL_SET, _LOCAL_SET),
+        (Opcode.LOCAL_TEE, _LOCAL_TEE),
+        (Opcode.GLOBAL_GET, _GLOBAL_GET),
+        (Opcode.GLOBAL_SET, _GLOBAL_SET),
+    ]:
+        _KINDS[opcode._value_] = kind
+
+
+_build_tables()
+
+_BLOCK_RESULTS = {0x40: [], _I32: [_I32], _I64: [_I64], _F32: [_F32], _F64: [_F64]}
+_LOOP = Opcode.LOOP._value_
+_IF_OPCODE = Opcode.IF._value_
+_I32_ONLY = [_I32]
+# Marks the bottom of each block's stretch of the operand stack, so that
+# checking the types on top of the stack also checks that they are there.
+_BOTTOM = -1
+
+# An enclosing block: its opcode, result types, the height of the operand
+# stack at its start and whether the rest of it is unreachable.
+_Frame = Tuple[int, List[int], int, bool]
+
+
+#
+# Function bodies
+#
+
+
+def _mismatch(want: int, got: int) -> ValidationError:
+    return ValidationError(
+        f"type mismatch: expected {_TYPE_NAMES[want]}, found {_TYPE_NAMES[got]}"
+    )
+
+
+def _pop(stack: List[int], height: int, unreachable: bool, expected: List[int]) -> None:
+    """Pop values of the ``expected`` types, the last one from the top."""
+    for want in reversed(expected):
+        if len(stack) > height:
+            got = stack.pop()
+            if got != want and got and want:
+                raise _mismatch(want, got)
+        elif not unreachable:
+            raise ValidationError(
+                f"type mismatch: expected {_TYPE_NAMES[want]}, found nothing"
+            )
+
+
+def _pop_any(stack: List[int], height: int, unreachable: bool) -> int:
+    if len(stack) > height:
+        return stack.pop()
+    if not unreachable:
+        raise ValidationError("type mismatch: expected a value, found nothing")
+    return _UNKNOWN
+
+
+def _label(
+    frames: List[_Frame], kind: int, results: List[int], depth: int
+) -> List[int]:
+    """The types a branch to ``depth`` carries."""
+    if depth:
+        if depth > len(frames):
+            raise ValidationError(f"unknown label {depth}")
+        kind, results = frames[-depth][0], frames[-depth][1]
+    return [] if kind == _LOOP else results
+
+
+def _check(
+    context: ValidationContext,
+    local_types: Sequence[int],
+    results: List[int],
+    opcodes: Sequence[int],
+    payloads: Sequence[int],
+    vectors: Sequence[int],
+    complete: bool = True,
+) -> None:
+    # The instruction at fault is not tracked here, which would slow down
+    # checking valid bodies; ``validate_code`` finds it after the fact.
+    # Local indices are not checked either: the only index that can be out
+    # of range is a local's, which raises IndexError.  Everything but
+    # ``local.get`` and ``local.set``, the most common instructions by far,
+    # is dispatched on the kind of check it needs.
+    kinds = _KINDS
+    signatures = _SIGNATURES
+    functions = context.functions
+    function_results = results
+    stack: List[int] = [_BOTTOM]
+    # The enclosing blocks, outermost first.  The innermost one is kept in
+    # locals; its opcode is 0 for the function itself.  ``height`` is where
+    # its values start on the stack.
+    frames: List[_Frame] = []
+    kind = 0
+    height = 1
+    unreachable = False
+
+    instructions = zip(opcodes, payloads)
+    try:
+        for byte, payload in instructions:
+            if byte == 0x20:
+                stack.append(local_types[payload])
+                continue
+            if byte == 0x21:
+                t = local_types[payload]
+                if stack[-1] == t:
+                    stack.pop()
+                else:
+                    _pop(stack, height, unreachable, [t])
+                continue
+
+            check = kinds[byte]
+            if check == _NUMERIC:
+                n, params, pushes = signatures[byte]
+                if stack[-n:] == params:
+                    stack[-n:] = pushes
+                else:
+                    _pop(stack, height, unreachable, params)
+                    stack += pushes
+            elif check == _CONST:
+                stack.append(_CONSTANTS[byte])
+            elif check == _LOCAL_TEE:
+                t = local_types[payload]
+                if stack[-1] != t:
+                    _pop(stack, height, unreachable, [t])
+                    stack.append(t)
+            elif check == _MEMORY:
+                if not context.memories:
+                    raise ValidationError("unknown memory 0")
+                if payload & 0xFFFFFFFF > _MAX_ALIGN[byte]:
+                    raise ValidationError("alignment must not be larger than natural")
+                n, params, pushes = signatures[byte]
+                if n and stack[-n:] == params:
+                    stack[-n:] = pushes
+                else:
+                    _pop(stack, height, unreachable, params)
+                    stack += pushes
+            elif check == _DROP:
+                _pop_any(stack, height, unreachable)
+            elif check == _CALL:
+                if payload >= len(functions):
+                    raise ValidationError(f"unknown function {payload}")
+                params, pushes = functions[payload]
+                n = len(params)
+                if n and stack[-n:] == params:
+                    del stack[-n:]
+                else:
+                    _pop(stack, height, unreachable, params)
+                stack += pushes
+            elif check == _END:
+                if len(stack) - height != len(results) or stack[height:] != results:
+                    _pop(stack, height, unreachable, results)
+                    if len(stack) != height:
+                        raise ValidationError("type mismatch: values left on the stack")
+                    stack += results
+                if kind == _IF_OPCODE and results:
+                    raise ValidationError(
+                        "type mismatch: if without else must not produce a result"
+                    )
+                if not frames:
+                    break
+                del stack[height - 1]
+                kind, results, height, unreachable = frames.pop()
+            elif check == _BLOCK or check == _IF:
+                if check == _IF:
+                    _pop(stack, height, unreachable, _I32_ONLY)
+                block_results = _BLOCK_RESULTS.get(payload)
+                if block_results is None:
+                    raise ValidationError(f"invalid block type {payload:#x}")
+                frames.append((kind, results, height, unreachable))
+                stack.append(_BOTTOM)
+                kind, results, unreachable = byte, block_results, False
+                height = len(stack)
+            elif check == _BR_IF:
+                if stack[-1] == _I32:
+                    stack.pop()
+                else:
+                    _pop(stack, height, unreachable, _I32_ONLY)
+                label = _label(frames, kind, results, payload)
+                n = len(label)
+                if n and stack[-n:] != label:
+                    _pop(stack, height, unreachable, label)
+                    stack += label
+            elif check == _GLOBAL_GET:
+                if payload >= len(context.globals):
+                    raise ValidationError(f"unknown global {payload}")
+                stack.append(context.globals[payload][0])
+            elif check == _GLOBAL_SET:
+                if payload >= len(context.globals):
+                    raise ValidationError(f"unknown global {payload}")
+                t, mutable = context.globals[payload]
+                if not mutable:
+                    raise ValidationError(f"global {payload} is immutable")
+                _pop(stack, height, unreachable, [t])
+            elif check == _ELSE:
+                if kind != _IF_OPCODE:
+                    raise ValidationError("else without if")
+                _pop(stack, height, unreachable, results)
+                if len(stack) != height:
+                    raise ValidationError("type mismatch: values left on the stack")
+                kind, unreachable = byte, False
+            elif check == _BR:
+                _pop(stack, height, unreachable, _label(frames, kind, results, payload))
+                del stack[height:]
+                unreachable = True
+            elif check == _BR_TABLE:
+                _pop(stack, height, unreachable, _I32_ONLY)
+                count = vectors[payload]
+                depths = vectors[payload + 1 : payload + 2 + count]
+                label = _label(frames, kind, results, depths[-1])
+                for depth in depths[:-1]:
+                    if _label(frames, kind, results, depth) != label:
+                        raise ValidationError(
+                            "type mismatch: br_table labels differ in type"
+                        )
+                _pop(stack, height, unreachable, label)
+                del stack[height:]
+                unreachable = True
+            elif check == _RETURN:
+                _pop(stack, height, unreachable, function_results)
+                del stack[height:]
+                unreachable = True
+            elif check == _CALL_INDIRECT:
+                if not context.tables:
+                    raise ValidationError("unknown table 0")
+                if payload >= len(context.types):
+                    raise ValidationError(f"unknown type {payload}")
+                params, pushes = context.types[payload]
+                _pop(stack, height, unreachable, _I32_ONLY)
+                _pop(stack, height, unreachable, params)
+                stack += pushes
+            elif check == _SELECT:
+                _pop(stack, height, unreachable, _I32_ONLY)
+                a = _pop_any(stack, height, unreachable)
+                b = _pop_any(stack, height, unreachable)
+                if a != b and a and b:
+                    raise ValidationError(
+                        f"type mismatch: select of {_TYPE_NAMES[b]} "
+                        f"and {_TYPE_NAMES[a]}"
+                    )
+                stack.append(a or b)
+            elif check == _UNREACHABLE:
+                del stack[height:]
+                unreachable = True
+            elif check == _INVALID:
+                raise ValidationError(f"{byte} is not a valid opcode")
+        else:
+            if complete:
+                raise ValidationError("function body does not end")
+            return
+    except IndexError:
+        raise ValidationError(f"unknown local {payload}") from None
+
+    if next(instructions, None) is not None:
+        raise ValidationError("instructions after the end of the function")
+
+
+def validate_code(
+    context: ValidationContext,
+    local_types: Sequence[int],
+    results: List[int],
+    code: Sequence[Instruction],
+) -> None:
+    """Type check a function body given its locals, parameters first.
+
+    Raises ``ValidationError`` naming the first invalid instruction.
+    """
+    opcodes: Sequence[int]
+    payloads: Sequence[int]
+    vectors: Sequence[int]
+    if isinstance(code, CompactInstructions):
+        opcodes, payloads, vectors = code.opcodes, code.payloads, code.vectors
+    else:
+        opcodes, payloads, vectors = _columns(code)
+    try:
+        _check(context, local_types, results, opcodes, payloads, vectors)
+    except ValidationError as e:
+        error = e
+    else:
+        return
+
+    # The shortest invalid prefix of the body ends at the first instruction
+    # at fault; a body that is only missing its end has none.
+    def check_prefix(end: int) -> None:
+        prefix = opcodes[:end], payloads[:end], vectors
+        _check(context, local_types, results, *prefix, complete=False)
+
+    low, high = 0, len(opcodes)
+    while low < high:
+        middle = (low + high) // 2
+        try:
+            check_prefix(middle + 1)
+        except ValidationError:
+            high = middle
+        else:
+            low = middle + 1
+    if low < len(opcodes):
+        try:
+            check_prefix(low + 1)
+        except ValidationError as e:
+            error = e
+    error.instruction = low
+    raise error
+
+
+def _columns(
+    instructions: Sequence[Instruction],
+) -> Tuple[List[int], List[int], List[int]]:
+    """The columns ``_check`` reads, taken from a list of instructions.
+
+    Only the operands that are checked are kept, so this is quicker than
+    packing the list into ``CompactInstructions``: constants and memory
+    offsets are left as 0.
+    """
+    opcodes: List[int] = []
+    payloads: List[int] = []
+    vectors: List[int] = []
+    for instruction in instructions:
+        opcodes.append(instruction.opcode._value_)
+        operands: List[Any] = instruction.operands
+        if not operands:
+            payloads.append(0)
+            continue
+        operand = operands[0]
+        operand_type = type(operand)
+        if operand_type is IndexOperand:
+            payloads.append(operand.index)
+        elif operand_type is MemArgOperand:
+            payloads.append(operand.align)
+        elif operand_type is BlockTypeOperand:
+            result_type = operand.result_type
+            payloads.append(0x40 if result_type is None else result_type._value_)
+        elif operand_type is IndexVectorOperand:
+            payloads.append(len(vectors))
+            vectors.append(len(operand.indices))
+            vectors += operand.indices
+            vectors.append(operands[1].index)
+        else:
+            payloads.append(0)
+    return opcodes, payloads, vectors
+
+
+def _decode_message(error: Exception) -> str:
+    if isinstance(error, ValueError):
+        return str(error)
+    return "unexpected end of function body"
+
+
+def _decode(code: Buffer, compact: bool) -> List[Instruction]:
+    try:
+        return decode_instructions(code, compact)
+    except _DECODE_ERRORS as e:
+        error = e
+    # Decoding one instruction at a time finds the one at fault.
+    r = ByteReader(code)
+    instruction = 0
+    try:
+        while not r.eos():
+            read_instruction(r)
+            instruction += 1
+    except _DECODE_ERRORS:
+        pass
+    raise ValidationError(_decode_message(error), None, instruction) from error
+
+
+def read_checked_locals(r: ByteReader, index: int) -> List[Local]:
+    """Read the locals of function ``index`` from the start of its body,
+    raising ``ValidationError`` if they cannot be decoded."""
+    try:
+        return read_locals(r)
+    except _DECODE_ERRORS as e:
+        raise ValidationError(_decode_message(e), index) from e
+
+
+def decode_checked(
+    context: ValidationContext,
+    index: int,
+    function: Function,
+    code: Buffer,
+    compact: bool = False,
+) -> List[Instruction]:
+    """Decode the instructions ``code`` of ``function``, whose locals are
+    read, and type check them.  ``index`` is the function's, imports first.
+
+    Errors decoding the instructions are raised as ``ValidationError`` too.
+    """
+    try:
+        if function.type_index >= len(context.types):
+            raise ValidationError(f"unknown type {function.type_index}")
+        params, results = context.types[function.type_index]
+        instructions = _decode(code, compact)
+        local_types = params + [local.type._value_ for local in function.peek_locals()]
+        validate_code(context, local_types, results, instructions)
+    except ValidationError as e:
+        e.function = index
+        raise
+    return instructions
+
+
+def validate_function(context: ValidationContext, function: Function) -> None:
+    """Type check one function defined in the module ``context`` is from.
+
+    A lazy function not decoded yet is checked from its body, in compact
+    form, and left undecoded.
+    """
+    if function.type_index >= len(context.types):
+        raise ValidationError(f"unknown type {function.type_index}")
+    params, results = context.types[function.type_index]
+    body = function.body
+    if isinstance(function, LazyFunction) and not function.decoded:
+        assert body is not None
+        r = ByteReader(body)
+        try:
+            locals = read_locals(r)
+        except _DECODE_ERRORS as e:
+            raise ValidationError(_decode_message(e)) from e
+        instructions = _decode(r.view(), True)
+    else:
+        locals, instructions = function.peek_locals(), function.peek_instructions()
+    local_types = params + [local.type._value_ for local in locals]
+    validate_code(context, local_types, results, instructions)
+
+
+#
+# Modules
+#
+
+
+def _check_limits(limits: LimitType, bound: int, what: str) -> None:
+    if limits.maximum is not None and limits.maximum < limits.minimum:
+        raise ValidationError(f"{what}: size minimum must not be greater than maximum")
+    if max(limits.minimum, limits.maximum or 0) > bound:
+        raise ValidationError(f"{what}: size must be at most {bound}")
+
+
+def _check_constant(
+    context: ValidationContext,
+    expression: List[Instruction],
+    t: int,
+    imported_globals: int,
+    what: str,
+) -> None:
+    # A constant, or the value of an imported immutable global.
+    if len(expression) != 2 or expression[-1].opcode is not Opcode.END:
+        raise ValidationError(f"{what}: constant expression required")
+    instr = expression[0]
+    byte = instr.opcode._value_
+    if _KINDS[byte] == _CONST:
+        found = _CONSTANTS[byte]
+    elif instr.opcode is Opcode.GLOBAL_GET:
+        index = instr.operands[0].index  # type: ignore
+        if index >= imported_globals:
+            raise ValidationError(f"{what}: unknown global {index}")
+        found, mutable = context.globals[index]
+        if mutable:
+            raise ValidationError(f"{what}: constant expression required")
+    else:
+        raise ValidationError(f"{what}: constant expression required")
+    if found != t:
+        raise ValidationError(
+            f"{what}: type mismatch: expected {_TYPE_NAMES[t]}, "
+            f"found {_TYPE_NAMES[found]}"
+        )
+
+
+def _check_module(module: Module, context: ValidationContext) -> None:
+    if context.tables > 1:
+        raise ValidationError("multiple tables")
+    if context.memories > 1:
+        raise ValidationError("multiple memories")
+    for i in module.imports:
+        if isinstance(i, TableImport):
+            _check_limits(i.table_type.limits, 2**32 - 1, f"table import {i.name}")
+        elif isinstance(i, MemoryImport):
+            _check_limits(i.memory_type.limits, 65536, f"memory import {i.name}")
+    for table in module.tables:
+        _check_limits(table.limits, 2**32 - 1, "table")
+    for memory in module.memories:
+        _check_limits(memory.limits, 65536, "memory")
+
+    imported_globals = len(context.globals) - len(module.globals)
+    for global_i, g in enumerate(module.globals):
+        what = f"global {imported_globals + global_i}"
+        valtype = g.type.valtype._value_
+        _check_constant(context, g.init_expression, valtype, imported_globals, what)
+
+    spaces = [
+        (FuncExport, len(context.functions), "function"),
+        (TypeExport, context.tables, "table"),
+        (MemExport, context.memories, "memory"),
+        (GlobalExport, len(context.globals), "global"),
+    ]
+    names = set()
+    for export in module.exports:
+        if export.name in names:
+            raise ValidationError(f"duplicate export name {export.name!r}")
+        names.add(export.name)
+        for export_type, count, space in spaces:
+            if type(export) is export_type and export.index >= count:
+                raise ValidationError(
+                    f"export {export.name!r}: unknown {space} {export.index}"
+                )
+
+    if module.start is not None:
+        if module.start >= len(context.functions):
+            raise ValidationError(f"start: unknown function {module.start}")
+        if context.functions[module.start] != ([], []):
+            raise ValidationError("start: function must take and return nothing")
+
+    for elem_i, elem in enumerate(module.elems):
+        what = f"elem {elem_i}"
+        if elem.table_index >= context.tables:
+            raise ValidationError(f"{what}: unknown table {elem.table_index}")
+        _check_constant(context, elem.offset_expression, _I32, imported_globals, what)
+        for index in elem.function_indices:
+            if index >= len(context.functions):
+                raise ValidationError(f"{what}: unknown function {index}")
+
+    for data_i, data in enumerate(module.datas):
+        what = f"data {data_i}"
+        if data.memory_index >= context.memories:
+            raise ValidationError(f"{what}: unknown memory {data.memory_index}")
+        _check_constant(context, data.offset_expression, _I32, imported_globals, what)
+
+
+def _validate_chunk(
+    context: ValidationContext, chunk: List[Tuple[int, Function]]
+) -> Optional[ValidationError]:
+    for index, function in chunk:
+        try:
+            validate_function(context, function)
+        except ValidationError as e:
+            e.function = index
+            return e
+    return None
+
+
+def validate(module: Module, jobs: int = 0, functions: bool = True) -> None:
+    """Check that ``module`` is valid, raising ``ValidationError`` if not.
+
+    With ``jobs`` > 1 the function bodies are checked in that many worker
+    processes, which pays off for large modules only.  The first invalid
+    function in index order is reported either way.  Without ``functions``
+    the bodies are not checked, for readers that checked them as they went.
+    """
+    context = ValidationContext.from_module(module)
+    _check_module(module, context)
+    if not functions:
+        return
+    imported = len(context.functions) - len(module.functions)
+    bodies = [(imported + i, f) for i, f in enumerate(module.functions)]
+
+    if jobs > 1 and len(bodies) > 1:
+        # Imported here: process pools take a while to import.
+        from concurrent.futures import ProcessPoolExecutor
+
+        size = -(-len(bodies) // (jobs * 4))
+        chunks = [bodies[i : i + size] for i in range(0, len(bodies), size)]
+        with ProcessPoolExecutor(jobs) as executor:
+            for error in executor.map(_validate_chunk, [context] * len(chunks), chunks):
+                if error is not None:
+                    raise error
+        return
+
+    error = _validate_chunk(context, bodies)
+    if error is not None:
+        raise error
@@ -1,9 +1,89 @@
-from .elem import *
-from .exports import *
-from .function import *
-from .globalvar import *
-from .imports import *
-from .instructions import *
-from .localvar import *
-from .module import *
-from .types import *
+# Submodules are imported the first time one of their names is used, so
+# importing the package, or one submodule of it, does not pay for the rest.
+from typing import TYPE_CHECKING
+
+from wasamole.util.lazy import exports, lazy_exports
+
+if TYPE_CHECKING:
+    from .compact import *
+    from .custom import *
+    from .data import *
+    from .elem import *
+    from .exports import *
+    from .function import *
+    from .globalvar import *
+    from .imports import *
+    from .instructions import *
+    from .localvar import *
+    from .module import *
+    from .names import *
+    from .types import *
+
+_EXPORTS = exports(
+    [
+        (".compact", ["CompactInstructions"]),
+        (".custom", ["CustomSection"]),
+        (".data", ["DataSegment"]),
+        (".elem", ["Elem"]),
+        (
+            ".exports",
+            ["BaseExport", "FuncExport", "TypeExport", "MemExport", "GlobalExport"],
+        ),
+        (
+            ".function",
+            [
+                "Function",
+                "LazyFunction",
+                "read_locals",
+                "skip_locals",
+                "decode_instructions",
+                "decode_body",
+            ],
+        ),
+        (".globalvar", ["Global"]),
+        (
+            ".imports",
+            ["BaseImport", "TypeImport", "TableImport", "MemoryImport", "GlobalImport"],
+        ),
+        (
+            ".instructions",
+            [
+                "Opcode",
+                "Operand",
+                "BlockTypeOperand",
+                "MemArgOperand",
+                "IndexOperand",
+                "IndexVectorOperand",
+                "ZeroOperand",
+                "NumericOperand",
+                "I32Operand",
+                "I64Operand",
+                "F32Operand",
+                "F64Operand",
+                "Instruction",
+                "read_instruction",
+                "disassemble_instruction",
+                "disassemble",
+            ],
+        ),
+        (".localvar", ["Local"]),
+        (".module", ["Module"]),
+        (".names", ["SymbolTable"]),
+        (
+            ".types",
+            [
+                "ValueType",
+                "ElemType",
+                "MutType",
+                "FunctionType",
+                "LimitType",
+                "TableType",
+                "MemoryType",
+                "GlobalType",
+            ],
+        ),
+    ]
+)
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,465 @@
+import struct
+from array import array
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    overload,
+)
+
+from .instructions import (
+    BlockTypeOperand,
+    F32Operand,
+    F64Operand,
+    I32Operand,
+    I64Operand,
+    IndexOperand,
+    IndexVectorOperand,
+    Instruction,
+    MemArgOperand,
+    Opcode,
+    Operand,
+    ZeroOperand,
+    _OPERAND_TYPES,
+    _SHARED,
+    _build_tables,
+)
+from .types import ValueType
+from wasamole.util.bytes_reader import Buffer, ByteReader
+
+# Operand layouts.  Every opcode byte maps to one of these in
+# ``OPCODE_LAYOUTS``, which says how its operands are packed into the single
+# 64-bit payload column.  Code reading the columns directly dispatches on it.
+LAYOUT_INVALID = 0
+LAYOUT_NONE = 1
+LAYOUT_BLOCKTYPE = 2
+LAYOUT_INDEX = 3
+LAYOUT_CALL_INDIRECT = 4
+LAYOUT_BR_TABLE = 5
+LAYOUT_MEMARG = 6
+LAYOUT_ZERO = 7
+LAYOUT_I32 = 8
+LAYOUT_I64 = 9
+LAYOUT_F32 = 10
+LAYOUT_F64 = 11
+
+_LAYOUTS = {
+    (): LAYOUT_NONE,
+    (BlockTypeOperand,): LAYOUT_BLOCKTYPE,
+    (IndexOperand,): LAYOUT_INDEX,
+    (IndexOperand, ZeroOperand): LAYOUT_CALL_INDIRECT,
+    (IndexVectorOperand, IndexOperand): LAYOUT_BR_TABLE,
+    (MemArgOperand,): LAYOUT_MEMARG,
+    (ZeroOperand,): LAYOUT_ZERO,
+    (I32Operand,): LAYOUT_I32,
+    (I64Operand,): LAYOUT_I64,
+    (F32Operand,): LAYOUT_F32,
+    (F64Operand,): LAYOUT_F64,
+}
+
+OPCODE_LAYOUTS = [LAYOUT_INVALID] * 256
+_OPCODES: List[Any] = [None] * 256
+for _opcode in Opcode:
+    _types = tuple(_OPERAND_TYPES[_opcode._value_])
+    OPCODE_LAYOUTS[_opcode._value_] = _LAYOUTS[_types]
+    _OPCODES[_opcode._value_] = _opcode
+
+_F32_BITS = struct.Struct("<I")
+_F32_VALUE = struct.Struct("<f")
+_F64_BITS = struct.Struct("<q")
+_F64_VALUE = struct.Struct("<d")
+
+
+def _signed64(value: int) -> int:
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _memarg(align: int, offset: int) -> int:
+    if align >= (1 << 32) or offset >= (1 << 32):
+        raise ValueError("memarg out of range")
+    return _signed64((offset << 32) | align)
+
+
+def _uleb_size(value: int) -> int:
+    return max(1, (value.bit_length() + 6) // 7)
+
+
+def _sleb_size(value: int) -> int:
+    # One more bit than the magnitude needs, for the sign.
+    bits = (value if value >= 0 else ~value).bit_length() + 1
+    return max(1, (bits + 6) // 7)
+
+
+def _shared(byte: int, size: int) -> Optional[Instruction]:
+    # The shared instruction the decoder would have returned, if any.
+    return _SHARED[byte] if size == 1 else None
+
+
+class CompactInstructions(Sequence[Instruction]):
+    """A function body stored as parallel arrays instead of objects.
+
+    Instruction ``i`` is described by ``opcodes[i]`` (the opcode byte),
+    ``payloads[i]`` (its operands packed into 64 bits) and ``offsets[i]``
+    (its byte offset from the start of the body's instructions;
+    ``offsets[-1]`` is the total size).  ``br_table`` label vectors do not
+    fit in a payload, so they live in the ``vectors`` side table as a count
+    followed by the labels and the default label, and the payload holds the
+    position of that entry.
+
+    Indexing materialises an ``Instruction``, so the object can stand in
+    for a list of instructions wherever one is only read or appended to.
+    """
+
+    def __init__(self) -> None:
+        self.opcodes = array("B")
+        self.payloads = array("q")
+        self.offsets = array("I", [0])
+        self.vectors = array("I")
+        # Counts changes made through the methods below, so that a function
+        # can tell whether its instructions changed since it was read.
+        self.version = 0
+
+    @staticmethod
+    def decode(data: Buffer) -> "CompactInstructions":
+        """Decode an instruction stream directly into columns."""
+        ci = CompactInstructions()
+        opcodes = ci.opcodes
+        payloads = ci.payloads
+        offsets = ci.offsets
+        vectors = ci.vectors
+        kinds = OPCODE_LAYOUTS
+
+        r = ByteReader(data)
+        view = r.data
+        end = len(view)
+        while r.offset < end:
+            byte = view[r.offset]
+            r.offset += 1
+            kind = kinds[byte]
+            if kind == LAYOUT_NONE:
+                payload = 0
+            elif kind == LAYOUT_INDEX or kind == LAYOUT_BLOCKTYPE:
+                payload = r.uleb()
+            elif kind == LAYOUT_I32 or kind == LAYOUT_I64:
+                payload = r.sleb()
+            elif kind == LAYOUT_MEMARG:
+                payload = _memarg(r.uleb(), r.uleb())
+            elif kind == LAYOUT_CALL_INDIRECT:
+                payload = r.uleb()
+                r.u8()
+            elif kind == LAYOUT_ZERO:
+                payload = 0
+                r.u8()
+            elif kind == LAYOUT_BR_TABLE:
+                payload = len(vectors)
+                count = r.uleb()
+                vectors.append(count)
+                for label_i in range(count + 1):
+                    vectors.append(r.uleb())
+            elif kind == LAYOUT_F32:
+                payload = _F32_BITS.unpack_from(view, r.offset)[0]
+                r.offset += 4
+            elif kind == LAYOUT_F64:
+                payload = _F64_BITS.unpack_from(view, r.offset)[0]
+                r.offset += 8
+            else:
+                raise ValueError(f"{byte} is not a valid Opcode")
+            opcodes.append(byte)
+            payloads.append(payload)
+            offsets.append(r.offset)
+
+        return ci
+
+    @staticmethod
+    def from_instructions(instrs: Iterable[Instruction]) -> "CompactInstructions":
+        ci = CompactInstructions()
+        ci.extend(instrs)
+        return ci
+
+    def copy(self) -> "CompactInstructions":
+        """A copy with columns of its own."""
+        ci = CompactInstructions()
+        ci.opcodes = self.opcodes[:]
+        ci.payloads = self.payloads[:]
+        ci.offsets = self.offsets[:]
+        ci.vectors = self.vectors[:]
+        return ci
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the columns, in bytes."""
+        return sum(
+            len(column) * column.itemsize
+            for column in (self.opcodes, self.payloads, self.offsets, self.vectors)
+        )
+
+    def append(self, instr: Instruction) -> None:
+        self.version += 1
+        byte, payload = self._pack(instr)
+        self.opcodes.append(byte)
+        self.payloads.append(payload)
+        size = instr.size or self._encoded_size(byte, payload)
+        self.offsets.append(self.offsets[-1] + size)
+
+    def insert(self, i: int, instr: Instruction) -> None:
+        """Insert ``instr`` before row ``i``, as in a list.  This rebuilds
+        the columns."""
+        instrs = self.to_list()
+        instrs.insert(i, instr)
+        self._rebuild(instrs)
+
+    def _rebuild(self, instrs: Iterable[Instruction]) -> None:
+        self.version += 1
+        rebuilt = CompactInstructions.from_instructions(instrs)
+        self.opcodes = rebuilt.opcodes
+        self.payloads = rebuilt.payloads
+        self.offsets = rebuilt.offsets
+        self.vectors = rebuilt.vectors
+
+    def _encoded_size(self, byte: int, payload: int) -> int:
+        """The size of the shortest encoding of a packed row, for
+        instructions that were built rather than decoded and so have no
+        size of their own."""
+        kind = OPCODE_LAYOUTS[byte]
+        if kind == LAYOUT_NONE:
+            return 1
+        elif kind == LAYOUT_INDEX:
+            return 1 + _uleb_size(payload)
+        elif kind == LAYOUT_BLOCKTYPE or kind == LAYOUT_ZERO:
+            return 2
+        elif kind == LAYOUT_CALL_INDIRECT:
+            return 2 + _uleb_size(payload)
+        elif kind == LAYOUT_I32 or kind == LAYOUT_I64:
+            return 1 + _sleb_size(payload)
+        elif kind == LAYOUT_MEMARG:
+            align = payload & 0xFFFFFFFF
+            offset = (payload >> 32) & 0xFFFFFFFF
+            return 1 + _uleb_size(align) + _uleb_size(offset)
+        elif kind == LAYOUT_BR_TABLE:
+            count = self.vectors[payload]
+            labels = self.vectors[payload : payload + 2 + count]
+            return 1 + sum(_uleb_size(label) for label in labels)
+        elif kind == LAYOUT_F32:
+            return 5
+        else:
+            return 9
+
+    def _pack(self, instr: Instruction) -> Tuple[int, int]:
+        """The opcode byte and payload of ``instr``, adding its label vector
+        to ``vectors`` if it has one."""
+        byte = instr.opcode.value
+        kind = OPCODE_LAYOUTS[byte]
+        operands: List[Any] = instr.operands
+        if kind == LAYOUT_NONE or kind == LAYOUT_ZERO:
+            payload = 0
+        elif kind == LAYOUT_INDEX or kind == LAYOUT_CALL_INDIRECT:
+            payload = operands[0].index
+        elif kind == LAYOUT_BLOCKTYPE:
+            result_type = operands[0].result_type
+            payload = result_type.value if result_type else 0x40
+        elif kind == LAYOUT_I32 or kind == LAYOUT_I64:
+            payload = int(operands[0].value)
+        elif kind == LAYOUT_MEMARG:
+            payload = _memarg(operands[0].align, operands[0].offset)
+        elif kind == LAYOUT_BR_TABLE:
+            payload = len(self.vectors)
+            self.vectors.append(len(operands[0].indices))
+            self.vectors.extend(operands[0].indices)
+            self.vectors.append(operands[1].index)
+        elif kind == LAYOUT_F32:
+            payload = _F32_BITS.unpack(_F32_VALUE.pack(operands[0].value))[0]
+        else:
+            payload = _F64_BITS.unpack(_F64_VALUE.pack(operands[0].value))[0]
+        return byte, payload
+
+    def extend(self, instrs: Iterable[Instruction]) -> None:
+        for instr in instrs:
+            self.append(instr)
+
+    def __iadd__(self, instrs: Iterable[Instruction]) -> "CompactInstructions":
+        self.extend(instrs)
+        return self
+
+    def opcode_at(self, i: int) -> Opcode:
+        return _OPCODES[self.opcodes[i]]  # type: ignore
+
+    def labels(self, i: int) -> List[int]:
+        """The label depths of the ``br``, ``br_if`` or ``br_table`` at ``i``.
+
+        For ``br_table`` the default label comes last.
+        """
+        payload = self.payloads[i]
+        if self.opcodes[i] != 0x0E:
+            return [payload]
+        count = self.vectors[payload]
+        return self.vectors[payload + 1 : payload + 2 + count].tolist()
+
+    def _instruction(self, i: int) -> Instruction:
+        _build_tables()
+        byte = self.opcodes[i]
+        payload = self.payloads[i]
+        size = self.offsets[i + 1] - self.offsets[i]
+        shared = _shared(byte, size)
+        if shared is not None:
+            return shared
+        kind = OPCODE_LAYOUTS[byte]
+        operands: List[Operand]
+        if kind == LAYOUT_NONE:
+            operands = []
+        elif kind == LAYOUT_INDEX:
+            operands = [IndexOperand(payload)]
+        elif kind == LAYOUT_I32:
+            operands = [I32Operand(payload)]
+        else:
+            operands = self._instruction_operands(kind, payload, self.vectors)
+        return Instruction(_OPCODES[byte], operands, size)
+
+    def to_list(self) -> List[Instruction]:
+        """Materialise every instruction.
+
+        Equivalent to ``list(self)``, but walks the columns once instead of
+        indexing them per instruction.
+        """
+        _build_tables()
+        out: List[Instruction] = []
+        append = out.append
+        kinds = OPCODE_LAYOUTS
+        opcodes = _OPCODES
+        index = IndexOperand
+        i32 = I32Operand
+        vectors = self.vectors
+        offsets = self.offsets
+        operands: List[Operand]
+        for byte, payload, start, end in zip(
+            self.opcodes, self.payloads, offsets, offsets[1:]
+        ):
+            shared = _shared(byte, end - start)
+            if shared is not None:
+                append(shared)
+                continue
+            kind = kinds[byte]
+            if kind == LAYOUT_NONE:
+                operands = []
+            elif kind == LAYOUT_INDEX:
+                operands = [index(payload)]
+            elif kind == LAYOUT_I32:
+                operands = [i32(payload)]
+            else:
+                operands = self._instruction_operands(kind, payload, vectors)
+            append(Instruction(opcodes[byte], operands, end - start))
+        return out
+
+    @staticmethod
+    def _instruction_operands(
+        kind: int, payload: int, vectors: "array[int]"
+    ) -> List[Operand]:
+        if kind == LAYOUT_MEMARG:
+            return [MemArgOperand(payload & 0xFFFFFFFF, (payload >> 32) & 0xFFFFFFFF)]
+        elif kind == LAYOUT_BLOCKTYPE:
+            if payload != 0x40:
+                return [BlockTypeOperand(ValueType(payload))]
+            return [BlockTypeOperand()]
+        elif kind == LAYOUT_I64:
+            return [I64Operand(payload)]
+        elif kind == LAYOUT_CALL_INDIRECT:
+            return [IndexOperand(payload), ZeroOperand()]
+        elif kind == LAYOUT_ZERO:
+            return [ZeroOperand()]
+        elif kind == LAYOUT_BR_TABLE:
+            count = vectors[payload]
+            labels = vectors[payload + 1 : payload + 2 + count]
+            return [IndexVectorOperand(list(labels[:-1])), IndexOperand(labels[-1])]
+        elif kind == LAYOUT_F32:
+            bits = _F32_BITS.pack(payload)
+            return [F32Operand(_F32_VALUE.unpack(bits)[0])]
+        else:
+            bits = _F64_BITS.pack(payload)
+            return [F64Operand(_F64_VALUE.unpack(bits)[0])]
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    @overload
+    def __getitem__(self, i: int) -> Instruction:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[Instruction]:
+        ...
+
+    def __getitem__(
+        self, i: Union[int, slice]
+    ) -> Union[Instruction, List[Instruction]]:
+        if isinstance(i, slice):
+            return [self._instruction(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("instruction index out of range")
+        return self._instruction(i)
+
+    @overload
+    def __setitem__(self, i: int, instr: Instruction) -> None:
+        ...
+
+    @overload
+    def __setitem__(self, i: slice, instrs: Iterable[Instruction]) -> None:
+        ...
+
+    def __setitem__(self, i: Union[int, slice], value: Any) -> None:
+        """Replace instructions, as in a list.
+
+        A single instruction is packed into its row in place, shifting the
+        offsets of the rows after it if its size differs; a replaced label
+        vector is left unused in ``vectors``.  Slices rebuild the columns.
+        """
+        if isinstance(i, slice):
+            instrs = self.to_list()
+            instrs[i] = value
+            self._rebuild(instrs)
+            return
+        self.version += 1
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("instruction index out of range")
+        byte, payload = self._pack(value)
+        self.opcodes[i] = byte
+        self.payloads[i] = payload
+        offsets = self.offsets
+        size = value.size or self._encoded_size(byte, payload)
+        delta = size - (offsets[i + 1] - offsets[i])
+        if delta:
+            offsets[i + 1 :] = array("I", [o + delta for o in offsets[i + 1 :]])
+
+    def __delitem__(self, i: Union[int, slice]) -> None:
+        """Remove instructions, as in a list.  This rebuilds the columns."""
+        instrs = self.to_list()
+        del instrs[i]
+        self._rebuild(instrs)
+
+    def __iter__(self) -> Iterator[Instruction]:
+        for i in range(len(self.opcodes)):
+            yield self._instruction(i)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CompactInstructions):
+            return (
+                self.opcodes == other.opcodes
+                and self.payloads == other.payloads
+                and self.offsets == other.offsets
+                and self.vectors == other.vectors
+            )
+        if isinstance(other, Sequence):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return repr(list(self))
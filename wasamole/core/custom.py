@@ -0,0 +1,14 @@
+import dataclasses
+from typing import Optional
+
+from wasamole.util.bytes_reader import Buffer
+
+
+@dataclasses.dataclass
+class CustomSection:
+    name: str
+    data: Buffer
+    # The id of the known section this one followed when it was read, 0 if
+    # it came first, so that it is written back in the same place.  Custom
+    # sections without one are written last.
+    after: Optional[int] = None
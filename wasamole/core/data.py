@@ -0,0 +1,20 @@
+from .instructions import Instruction
+
+from dataclasses import dataclass
+from typing import List
+
+from wasamole.util.bytes_reader import Buffer
+
+
+@dataclass
+class DataSegment:
+    """An active data segment.
+
+    The reader leaves ``data`` as a view of its input rather than a copy, so
+    large segments cost nothing until they are used.  The input stays alive
+    as long as the view does.
+    """
+
+    memory_index: int
+    offset_expression: List[Instruction]
+    data: Buffer
@@ -1,25 +1,235 @@
-from .instructions import Instruction
+from .compact import CompactInstructions
+from .instructions import Instruction, disassemble
 from .types import FunctionType, GlobalType, MemoryType, TableType, ValueType
 from .localvar import Local
 
-from dataclasses import dataclass, field
-from typing import List
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+from wasamole.util.bytes_reader import Buffer, ByteReader
+from wasamole.util.slots import restore_slots, slot_state
+
+if TYPE_CHECKING:
+    from .names import SymbolTable
+
+T = TypeVar("T")
 
 
-@dataclass
 class Function:
-    type_index: int
-    locals: List[Local] = field(default_factory=list)
-    instructions: List[Instruction] = field(default_factory=list)
-    size: int = 0
-    address: int = 0
-    name: str = ""
+    """A function defined in the module.
+
+    ``body`` is the encoded code section entry the function was read from,
+    if any.  The binary writer copies it verbatim instead of re-encoding the
+    function for as long as it is known to match: it is dropped whenever
+    ``locals`` or ``instructions`` are replaced or extended through this
+    class, and once either list has been handed out through its attribute,
+    which could have been edited in place since, the writer encodes the
+    function again.  Compact instructions keep a count of their changes
+    instead, so reading them does not cost the copy.  Code that only reads
+    a function can use ``peek_locals`` and ``peek_instructions``, which do
+    not count as handing the lists out.
+
+    Results cached with ``analysis`` are dropped when the lists are
+    replaced or extended through this class; code that edits them in place
+    must call ``mark_modified`` itself.  Functions compare equal when
+    everything but their bodies is, like a dataclass with ``body`` left out
+    of the comparison.
+    """
+
+    __slots__ = (
+        "type_index",
+        "_locals",
+        "_instructions",
+        "size",
+        "address",
+        "_name",
+        "_names",
+        "body",
+        "_analyses",
+        "_lent",
+        "_version",
+    )
+
+    def __init__(
+        self,
+        type_index: int,
+        locals: Optional[List[Local]] = None,
+        instructions: Optional[List[Instruction]] = None,
+        size: int = 0,
+        address: int = 0,
+        name: str = "",
+        body: Optional[Buffer] = None,
+    ) -> None:
+        self.type_index = type_index
+        self._locals: List[Local] = [] if locals is None else locals
+        self._instructions: List[Instruction] = (
+            [] if instructions is None else instructions
+        )
+        self.size = size
+        self.address = address
+        self._name = name
+        # Where to look the name up on first access, if it is not known yet.
+        self._names: Optional[Tuple["SymbolTable", int]] = None
+        self._analyses: Optional[Dict[Any, Any]] = None
+        self.body: Optional[Buffer] = None
+        self._lent = False
+        self._version = 0
+        self.set_body(body)
+
+    def _fields(self) -> Tuple[Any, ...]:
+        return (
+            self.type_index,
+            self.peek_locals(),
+            self.peek_instructions(),
+            self.size,
+            self.address,
+            self.name,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Function):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(type_index={self.type_index!r}, "
+            f"locals={self.peek_locals()!r}, "
+            f"instructions={self.peek_instructions()!r}, size={self.size!r}, "
+            f"address={self.address!r}, name={self.name!r})"
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Views into the reader's input cannot be pickled, and cached
+        # analyses are cheaper to recompute than to store.
+        state = slot_state(self)
+        state["_analyses"] = None
+        return {
+            k: v.tobytes() if isinstance(v, memoryview) else v
+            for k, v in state.items()
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        restore_slots(self, state)
+
+    def _decode(self) -> None:
+        """Decode the locals and instructions, if that is still to be done."""
+
+    @property
+    def locals(self) -> List[Local]:
+        self._decode()
+        self._lent = True
+        return self._locals
+
+    @locals.setter
+    def locals(self, locals: List[Local]) -> None:
+        self._decode()
+        self._locals = locals
+        self.mark_modified()
+
+    @property
+    def instructions(self) -> List[Instruction]:
+        self._decode()
+        instructions = self._instructions
+        if not isinstance(instructions, CompactInstructions):
+            self._lent = True
+        return instructions
+
+    @instructions.setter
+    def instructions(self, instructions: List[Instruction]) -> None:
+        self._decode()
+        self._instructions = instructions
+        self.mark_modified()
+
+    def peek_locals(self) -> List[Local]:
+        """The locals, for code that does not change them."""
+        self._decode()
+        return self._locals
+
+    def peek_instructions(self) -> List[Instruction]:
+        """The instructions, for code that does not change them."""
+        self._decode()
+        return self._instructions
+
+    @property
+    def name(self) -> str:
+        pending = self._names
+        if pending is not None:
+            names, index = pending
+            self._names = None
+            name = names.function_name(index)
+            if name is not None:
+                self._name = name
+        return self._name
+
+    @name.setter
+    def name(self, name: str) -> None:
+        self._names = None
+        self._name = name
+
+    @property
+    def unchanged_body(self) -> Optional[Buffer]:
+        """``body``, if it is known to still encode the function."""
+        body = self.body
+        if body is None or self._lent:
+            return None
+        instructions = self._instructions
+        if (
+            isinstance(instructions, CompactInstructions)
+            and instructions.version != self._version
+        ):
+            return None
+        return body
 
     def add_local(self, local: Local) -> None:
-        self.locals.append(local)
+        self.peek_locals().append(local)
+        self.mark_modified()
 
     def append_instructions(self, instrs: List[Instruction]) -> None:
-        self.instructions += instrs
+        self.peek_instructions().extend(instrs)
+        self.mark_modified()
+
+    def mark_modified(self) -> None:
+        self.body = None
+        self._analyses = None
+
+    def analysis(self, compute: Callable[["Function"], T]) -> T:
+        """``compute(self)``, cached until the function is modified."""
+        analyses = self._analyses
+        if analyses is None:
+            analyses = self._analyses = {}
+        try:
+            return cast(T, analyses[compute])
+        except KeyError:
+            result = analyses[compute] = compute(self)
+            return result
+
+    def set_body(self, body: Optional[Buffer]) -> None:
+        """Record ``body`` as the encoding of the current locals and
+        instructions."""
+        self.body = body
+        self._lent = False
+        instructions = self._instructions
+        if isinstance(instructions, CompactInstructions):
+            self._version = instructions.version
+        else:
+            self._version = 0
+
+    def copy_body(self) -> None:
+        """Replace ``body`` with a copy of its bytes, for instance before
+        the buffer it views is released.  Whether it is still the current
+        encoding is kept."""
+        if self.body is not None:
+            self.body = bytes(self.body)
 
     def set_size(self, size: int) -> None:
         self.size = size
@@ -29,3 +239,84 @@ class Function:
 
     def set_name(self, name: str) -> None:
         self.name = name
+
+    def set_name_from(self, names: "SymbolTable", index: int) -> None:
+        """Name the function after entry ``index`` of ``names``, if there is
+        one, once the name is first asked for.  Until then the name section
+        is not decoded."""
+        self._names = (names, index)
+
+
+class LazyFunction(Function):
+    """A function whose body is decoded on first access.
+
+    The reader hands over the raw code section entry; ``locals`` and
+    ``instructions`` are decoded from it the first time either one is used
+    and cached from then on.  The body is a view into the reader's input, so
+    the input stays alive until the function has been decoded.
+    """
+
+    __slots__ = ("_pending", "_compact")
+
+    def __init__(self, type_index: int, body: Buffer, compact: bool = False) -> None:
+        self._pending: Optional[Buffer] = None
+        super().__init__(type_index, body=body)
+        self._pending = body
+        self._compact = compact
+
+    def set_body(self, body: Optional[Buffer]) -> None:
+        # An undecoded function decodes from the new body, which holds the
+        # same bytes.
+        if self._pending is not None and body is not None:
+            self._pending = body
+        Function.set_body(self, body)
+
+    def copy_body(self) -> None:
+        Function.copy_body(self)
+        if self._pending is not None:
+            self._pending = self.body
+
+    def _decode(self) -> None:
+        body = self._pending
+        if body is not None:
+            self._pending = None
+            self._locals, self._instructions = decode_body(body, self._compact)
+
+    @property
+    def decoded(self) -> bool:
+        return self._pending is None
+
+
+def read_locals(r: ByteReader) -> List[Local]:
+    locals = []
+    for local_i in range(r.uleb()):
+        local_count = r.uleb()
+        local_type = ValueType(r.u8())
+        locals += [Local(local_type) for _ in range(local_count)]
+    return locals
+
+
+def skip_locals(r: ByteReader) -> None:
+    for local_i in range(r.uleb()):
+        r.uleb()
+        r.u8()
+
+
+def decode_instructions(code: Buffer, compact: bool = False) -> List[Instruction]:
+    """Decode an instruction stream, optionally into ``CompactInstructions``.
+
+    The compact form is not a list, but it supports everything callers do
+    with ``Function.instructions``: indexing, iteration and appending.
+    """
+    if compact:
+        return cast(List[Instruction], CompactInstructions.decode(code))
+    return disassemble(code)
+
+
+def decode_body(
+    body: Buffer, compact: bool = False
+) -> Tuple[List[Local], List[Instruction]]:
+    """Decode a code section entry, without its size prefix."""
+    r = ByteReader(body)
+    locals = read_locals(r)
+    return locals, decode_instructions(r.view(), compact)
@@ -1,9 +1,21 @@
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Type, Union, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NoReturn,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
 from .types import ValueType
-from wasamole.util.bytes_reader import ByteReader
+from wasamole.util.bytes_reader import Buffer, ByteReader
+from wasamole.util.slots import add_slots
 
 # Instructions
 #
@@ -232,6 +244,7 @@ class Opcode(Enum):
     F64_REINTERPRET_I64 = 0xBF
 
 
+@add_slots()
 @dataclass
 class Operand(object):
     def __str__(self) -> str:
@@ -241,6 +254,7 @@ class Operand(object):
         return str(self)
 
 
+@add_slots()
 @dataclass
 class BlockTypeOperand(Operand):
     result_type: Optional[ValueType] = None
@@ -254,6 +268,7 @@ class BlockTypeOperand(Operand):
         return str(self)
 
 
+@add_slots()
 @dataclass
 class MemArgOperand(Operand):
     align: int
@@ -268,6 +283,7 @@ class MemArgOperand(Operand):
         return " ".join(me)
 
 
+@add_slots()
 @dataclass
 class IndexOperand(Operand):
     index: int
@@ -276,6 +292,7 @@ class IndexOperand(Operand):
         return str(self.index)
 
 
+@add_slots()
 @dataclass
 class IndexVectorOperand(Operand):
     indices: List[int] = field(default_factory=list)
@@ -288,10 +305,13 @@ class IndexVectorOperand(Operand):
 
 
 class ZeroOperand(Operand):
+    __slots__ = ()
+
     def __str__(self) -> str:
         return "0x0"
 
 
+@add_slots()
 @dataclass
 class NumericOperand(Operand):
     width: int = 0
@@ -305,26 +325,34 @@ class NumericOperand(Operand):
 
 
 class I32Operand(NumericOperand):
+    __slots__ = ()
+
     def __init__(self, value: int) -> None:
         super().__init__(4, value)
 
 
 class I64Operand(NumericOperand):
+    __slots__ = ()
+
     def __init__(self, value: int) -> None:
         super().__init__(8, value)
 
 
-@dataclass
 class F32Operand(NumericOperand):
+    __slots__ = ()
+
     def __init__(self, value: float) -> None:
         super().__init__(4, value)
 
 
 class F64Operand(NumericOperand):
+    __slots__ = ()
+
     def __init__(self, value: float) -> None:
         super().__init__(8, value)
 
 
+@add_slots()
 @dataclass
 class Instruction:
     opcode: Opcode
@@ -332,7 +360,21 @@ class Instruction:
     size: int = 0
 
     def __post_init__(self) -> None:
-        self.operands = [Operand()] * len(self.operand_types)
+        if not self.operands:
+            count = len(_OPERAND_TYPES[self.opcode.value])
+            if count:
+                self.operands = [Operand()] * count
+
+    def __eq__(self, other: object) -> bool:
+        # Unlike the generated method, shared instructions compare equal to
+        # plain ones.
+        if not isinstance(other, Instruction):
+            return NotImplemented
+        return (
+            self.opcode is other.opcode
+            and self.size == other.size
+            and self.operands == other.operands
+        )
 
     @property
     def opname(self) -> str:
@@ -340,31 +382,7 @@ class Instruction:
 
     @property
     def operand_types(self) -> List[Type[Operand]]:
-        opcode = self.opcode.value
-        if opcode in [Opcode.BLOCK.value, Opcode.LOOP.value, Opcode.IF.value]:
-            return [BlockTypeOperand]
-        elif opcode >= Opcode.LOCAL_GET.value and opcode <= Opcode.GLOBAL_SET.value:
-            return [IndexOperand]
-        elif opcode == Opcode.CALL_INDIRECT.value:
-            return [IndexOperand, ZeroOperand]
-        elif opcode in [Opcode.BR.value, Opcode.BR_IF.value, Opcode.CALL.value]:
-            return [IndexOperand]
-        elif opcode in [Opcode.BR_TABLE.value]:
-            return [IndexVectorOperand, IndexOperand]
-        elif opcode >= Opcode.I32_LOAD.value and opcode <= Opcode.I64_STORE32.value:
-            return [MemArgOperand]
-        elif opcode in [Opcode.MEMORY_SIZE.value, Opcode.MEMORY_GROW.value]:
-            return [ZeroOperand]
-        elif opcode == Opcode.I32_CONST.value:
-            return [I32Operand]
-        elif opcode == Opcode.I64_CONST.value:
-            return [I64Operand]
-        elif opcode == Opcode.F32_CONST.value:
-            return [F32Operand]
-        elif opcode == Opcode.F64_CONST.value:
-            return [F64Operand]
-
-        return []
+        return _OPERAND_TYPES[self.opcode.value]
 
     def set_operand(self, index: int, operand: Operand) -> None:
         self.operands[index] = operand
@@ -392,50 +410,250 @@ class Instruction:
         return str(self)
 
 
-def disassemble_instruction(data: bytes) -> Instruction:
-    r = ByteReader(data)
-    instr = Instruction(Opcode(r.u8()))
-
-    for i in range(0, len(instr.operand_types)):
-        operand = instr.operand_types[i]
-        size = 1
-        if operand == ZeroOperand:
-            instr.set_operand(i, ZeroOperand())
-        elif operand == IndexOperand:
-            instr.set_operand(i, IndexOperand(r.uleb()))
-        elif operand == IndexVectorOperand:
-            ivo = IndexVectorOperand()
-            for label_i in range(r.uleb()):
-                ivo.append_index(r.uleb())
-            instr.set_operand(i, ivo)
-        elif operand == BlockTypeOperand:
-            result_type = r.uleb()
-            if result_type != 0x40:
-                instr.set_operand(i, BlockTypeOperand(ValueType(result_type)))
-            else:
-                instr.set_operand(i, BlockTypeOperand())
-        elif operand == MemArgOperand:
-            instr.set_operand(i, MemArgOperand(r.uleb(), r.uleb()))
-        elif operand == I32Operand:
-            instr.set_operand(i, I32Operand(r.sleb()))
-        elif operand == I64Operand:
-            instr.set_operand(i, I64Operand(r.sleb()))
-        elif operand == F32Operand:
-            instr.set_operand(i, F32Operand(r.f32()))
-        elif operand == F64Operand:
-            instr.set_operand(i, F64Operand(r.f64()))
-
-    instr.set_size(r.tell())
+class _SharedInstruction(Instruction):
+    """An instruction the decoder returns for every occurrence of it.
+
+    Instructions without operands are decoded to one shared, immutable
+    object per opcode instead of a new object per occurrence.  Build a new
+    ``Instruction`` to change one.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"shared instruction {self} cannot be changed")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"shared instruction {self} cannot be changed")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (_shared, (self.opcode,))
+
+
+class _NoOperands(List[Operand]):
+    """The operands of a shared instruction: an empty list that stays empty."""
+
+    __slots__ = ()
+
+    def _refuse(self, *args: Any) -> NoReturn:
+        raise AttributeError("shared instructions cannot be changed")
+
+    append = extend = insert = __setitem__ = __iadd__ = _refuse
+
+
+def _make_shared(opcode: Opcode) -> Instruction:
+    instr = object.__new__(_SharedInstruction)
+    object.__setattr__(instr, "opcode", opcode)
+    object.__setattr__(instr, "operands", _NoOperands())
+    object.__setattr__(instr, "size", 1)
     return instr
 
 
-def disassemble(data: bytes) -> List[Instruction]:
-    offset = 0
+def _shared(opcode: Opcode) -> Instruction:
+    _build_tables()
+    return _SHARED[opcode._value_]  # type: ignore
+
+
+# ``_value_`` rather than ``value``, which is a much slower property: this
+# runs for every opcode at import.
+def _operand_types(opcode: int) -> List[Type[Operand]]:
+    if opcode in [Opcode.BLOCK._value_, Opcode.LOOP._value_, Opcode.IF._value_]:
+        return [BlockTypeOperand]
+    elif opcode >= Opcode.LOCAL_GET._value_ and opcode <= Opcode.GLOBAL_SET._value_:
+        return [IndexOperand]
+    elif opcode == Opcode.CALL_INDIRECT._value_:
+        return [IndexOperand, ZeroOperand]
+    elif opcode in [Opcode.BR._value_, Opcode.BR_IF._value_, Opcode.CALL._value_]:
+        return [IndexOperand]
+    elif opcode in [Opcode.BR_TABLE._value_]:
+        return [IndexVectorOperand, IndexOperand]
+    elif opcode >= Opcode.I32_LOAD._value_ and opcode <= Opcode.I64_STORE32._value_:
+        return [MemArgOperand]
+    elif opcode in [Opcode.MEMORY_SIZE._value_, Opcode.MEMORY_GROW._value_]:
+        return [ZeroOperand]
+    elif opcode == Opcode.I32_CONST._value_:
+        return [I32Operand]
+    elif opcode == Opcode.I64_CONST._value_:
+        return [I64Operand]
+    elif opcode == Opcode.F32_CONST._value_:
+        return [F32Operand]
+    elif opcode == Opcode.F64_CONST._value_:
+        return [F64Operand]
+
+    return []
+
+
+#
+# Operand decoders
+#
+# Each decoder reads every operand of one opcode from the reader's cursor.
+# The decode table below maps an opcode byte straight to its decoder so
+# that decoding an instruction is two list lookups and at most one call.
+# Operands can be changed in place, so each instruction gets its own; only
+# ``ZeroOperand``, which has nothing to change, is shared.
+#
+
+OperandDecoder = Callable[[ByteReader], List[Operand]]
+
+_ZERO = ZeroOperand()
+
+
+def _read_blocktype(r: ByteReader) -> List[Operand]:
+    result_type = r.uleb()
+    if result_type == 0x40:
+        return [BlockTypeOperand()]
+    return [BlockTypeOperand(ValueType(result_type))]
+
+
+def _read_index(r: ByteReader) -> List[Operand]:
+    return [IndexOperand(r.uleb())]
+
+
+def _read_call_indirect(r: ByteReader) -> List[Operand]:
+    index = IndexOperand(r.uleb())
+    r.u8()
+    return [index, _ZERO]
+
+
+def _read_br_table(r: ByteReader) -> List[Operand]:
+    ivo = IndexVectorOperand([r.uleb() for label_i in range(r.uleb())])
+    return [ivo, IndexOperand(r.uleb())]
+
+
+def _read_memarg(r: ByteReader) -> List[Operand]:
+    align = r.uleb()
+    offset = r.uleb()
+    return [MemArgOperand(align, offset)]
+
+
+def _read_zero(r: ByteReader) -> List[Operand]:
+    r.u8()
+    return [_ZERO]
+
+
+def _read_i32(r: ByteReader) -> List[Operand]:
+    return [I32Operand(r.sleb())]
+
+
+def _read_i64(r: ByteReader) -> List[Operand]:
+    return [I64Operand(r.sleb())]
+
+
+def _read_f32(r: ByteReader) -> List[Operand]:
+    return [F32Operand(r.f32())]
+
+
+def _read_f64(r: ByteReader) -> List[Operand]:
+    return [F64Operand(r.f64())]
+
+
+_OPERAND_DECODERS: Dict[Tuple[Type[Operand], ...], OperandDecoder] = {
+    (BlockTypeOperand,): _read_blocktype,
+    (IndexOperand,): _read_index,
+    (IndexOperand, ZeroOperand): _read_call_indirect,
+    (IndexVectorOperand, IndexOperand): _read_br_table,
+    (MemArgOperand,): _read_memarg,
+    (ZeroOperand,): _read_zero,
+    (I32Operand,): _read_i32,
+    (I64Operand,): _read_i64,
+    (F32Operand,): _read_f32,
+    (F64Operand,): _read_f64,
+}
+
+_OPERAND_TYPES: List[List[Type[Operand]]] = [[] for i in range(256)]
+for _opcode in Opcode:
+    _OPERAND_TYPES[_opcode._value_] = _operand_types(_opcode._value_)
+
+# Indexed by opcode byte; None marks a byte that is not a valid opcode, or
+# that the tables have not been built yet.  A None decoder marks an opcode
+# without operands.
+_DECODE_TABLE: List[Optional[Tuple[Opcode, Optional[OperandDecoder]]]] = [None] * 256
+
+# Indexed by opcode byte.  ``_SHARED`` holds the shared instructions, those
+# without operands.  ``_SMALL`` holds, for the opcodes with a single LEB128
+# operand, the opcode, the operand type and the value of each one-byte
+# encoding of the operand, indexed by that byte.
+_SHARED: List[Optional[Instruction]] = [None] * 256
+_SMALL: List[
+    Optional[Tuple[Opcode, Callable[[int], Operand], Sequence[int]]]
+] = [None] * 256
+
+# A one-byte LEB128 is the byte itself, or for signed values the byte with
+# bit 6 as the sign.
+_UNSIGNED_BYTES = range(0x80)
+_SIGNED_BYTES = [(b ^ 0x40) - 0x40 for b in range(0x80)]
+
+_tables_built = False
+
+
+def _build_tables() -> bool:
+    """Fill in the decode tables; False if they already were.
+
+    This takes longer than the rest of the import, and a process that
+    never decodes an instruction does not need the tables at all.
+    """
+    global _tables_built
+    if _tables_built:
+        return False
+    small: Dict[Type[Operand], Sequence[int]] = {
+        IndexOperand: _UNSIGNED_BYTES,
+        I32Operand: _SIGNED_BYTES,
+        I64Operand: _SIGNED_BYTES,
+    }
+    for opcode in Opcode:
+        byte = opcode._value_
+        types = tuple(_OPERAND_TYPES[byte])
+        _DECODE_TABLE[byte] = (opcode, _OPERAND_DECODERS[types] if types else None)
+        if not types:
+            _SHARED[byte] = _make_shared(opcode)
+        elif len(types) == 1 and types[0] in small:
+            _SMALL[byte] = (opcode, types[0], small[types[0]])
+    _tables_built = True
+    return True
+
+
+def read_instruction(r: ByteReader) -> Instruction:
+    """Decode the instruction at the reader's cursor and advance past it.
+
+    The result may be a shared instruction, which cannot be changed.
+    """
+    start = r.offset
+    byte = r.data[start]
+    shared = _SHARED[byte]
+    if shared is not None:
+        r.offset = start + 1
+        return shared
+    small = _SMALL[byte]
+    if small is not None:
+        immediate = r.data[start + 1]
+        if immediate < 0x80:
+            r.offset = start + 2
+            opcode, operand_type, values = small
+            return Instruction(opcode, [operand_type(values[immediate])], 2)
+    r.offset = start + 1
+    entry = _DECODE_TABLE[byte]
+    if entry is None:
+        if _build_tables():
+            r.offset = start
+            return read_instruction(r)
+        raise ValueError(f"{byte} is not a valid Opcode")
+    opcode, decoder = entry
+    operands = decoder(r)  # type: ignore
+    return Instruction(opcode, operands, r.offset - start)
+
+
+def disassemble_instruction(data: Buffer) -> Instruction:
+    return read_instruction(ByteReader(data))
+
+
+def disassemble(data: Buffer) -> List[Instruction]:
+    # A single cursor walks the whole buffer; instructions are decoded in
+    # place rather than from a fresh copy of the remaining bytes.
+    r = ByteReader(data)
+    end = len(r.data)
     instrs = []
 
-    while offset < len(data):
-        instr = disassemble_instruction(data[offset:])
-        instrs.append(instr)
-        offset += instr.size
+    while r.offset < end:
+        instrs.append(read_instruction(r))
 
     return instrs
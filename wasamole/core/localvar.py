@@ -1,8 +1,10 @@
 import dataclasses
 
 from .types import ValueType
+from wasamole.util.slots import add_slots
 
 
+@add_slots()
 @dataclasses.dataclass
 class Local:
     type: ValueType
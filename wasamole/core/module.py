@@ -1,12 +1,20 @@
+from .custom import CustomSection
+from .data import DataSegment
 from .elem import Elem
 from .exports import BaseExport
 from .function import Function
 from .globalvar import Global
-from .imports import BaseImport
+from .imports import BaseImport, TypeImport
+from .names import SymbolTable
 from .types import FunctionType, GlobalType, MemoryType, TableType
 
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, List, Optional
+
+if TYPE_CHECKING:
+    import mmap
+
+    from wasamole.io.reader.binary_format import ReadStats
 
 
 @dataclass
@@ -20,10 +28,56 @@ class Module:
     exports: List[BaseExport] = field(default_factory=list)
     start: Optional[int] = None
     elems: List[Elem] = field(default_factory=list)
+    datas: List[DataSegment] = field(default_factory=list)
+    customs: List[CustomSection] = field(default_factory=list)
+    # Decoded from the ``name`` custom section, which stays in ``customs``.
+    names: SymbolTable = field(
+        default_factory=SymbolTable, compare=False, repr=False
+    )
+    # Set by ``BinaryReader(..., stats=True)``.
+    read_stats: Optional["ReadStats"] = field(default=None, compare=False, repr=False)
+    # The file mapping of a module read with ``use_mmap``, see ``close``.
+    _mapping: Optional["mmap.mmap"] = field(
+        default=None, init=False, compare=False, repr=False
+    )
+
+    def close(self) -> None:
+        """Unmap the file of a module read with ``use_mmap``.
+
+        Function bodies, data segments and custom sections that are views
+        of the mapping are copied first, so the module stays usable.  Views
+        of them that the caller took itself must be released beforehand,
+        or unmapping raises ``BufferError``.  Modules are also context
+        managers that close on exit.
+        """
+        mapping = self._mapping
+        if mapping is None:
+            return
+        self._mapping = None
+        for function in self.functions:
+            function.copy_body()
+        for data in self.datas:
+            data.data = bytes(data.data)
+        for custom in self.customs:
+            custom.data = bytes(custom.data)
+            if custom.name == "name":
+                # Functions may still look their names up in this table.
+                self.names.set_data(custom.data)
+        mapping.close()
+
+    def __enter__(self) -> "Module":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
     def type_at(self, i: int) -> FunctionType:
         return self.types[i]
 
+    def function_imports(self) -> List[TypeImport]:
+        """The imported functions, which come first in the function index space."""
+        return [bi for bi in self.imports if isinstance(bi, TypeImport)]
+
     def add_type(self, ft: FunctionType) -> None:
         self.types.append(ft)
 
@@ -50,3 +104,9 @@ class Module:
 
     def add_elem(self, e: Elem) -> None:
         self.elems.append(e)
+
+    def add_data(self, d: DataSegment) -> None:
+        self.datas.append(d)
+
+    def add_custom(self, c: CustomSection) -> None:
+        self.customs.append(c)
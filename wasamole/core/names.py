@@ -0,0 +1,133 @@
+from typing import Any, Dict, Optional
+
+from wasamole.util.bytes_reader import Buffer, ByteReader
+
+_MODULE = 0
+_FUNCTIONS = 1
+_LOCALS = 2
+
+
+class SymbolTable:
+    """Module, function and local names from the ``name`` custom section.
+
+    Nothing is decoded up front: each subsection is decoded the first time
+    it is asked for, and local names one function at a time, so a module's
+    local names cost nothing unless they are used.  Lookups are dict
+    lookups once decoded.  Function indices are in the combined index
+    space, imported functions first.
+
+    ``data`` is the section's payload after its name, usually a view of
+    the reader's input.
+    """
+
+    def __init__(self, data: Buffer = b"") -> None:
+        self.data = data
+        self._reset()
+
+    def _reset(self) -> None:
+        self._subsections: Optional[Dict[int, Buffer]] = None
+        self._functions: Optional[Dict[int, str]] = None
+        self._function_indices: Optional[Dict[str, int]] = None
+        self._local_offsets: Optional[Dict[int, int]] = None
+        self._locals: Dict[int, Dict[int, str]] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Views cannot be pickled, and the caches are rebuilt on demand.
+        return {"data": bytes(self.data)}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.data = state["data"]
+        self._reset()
+
+    def set_data(self, data: Buffer) -> None:
+        """Replace ``data`` with the same bytes from elsewhere, such as a
+        copy of a view that is about to be released."""
+        self.data = data
+        self._reset()
+
+    def __bool__(self) -> bool:
+        return len(self.data) > 0
+
+    def _subsection(self, subsection_id: int) -> Optional[Buffer]:
+        subsections = self._subsections
+        if subsections is None:
+            subsections = self._subsections = {}
+            r = ByteReader(self.data)
+            while not r.eos():
+                section_id = r.u8()
+                subsections[section_id] = r.view(r.uleb())
+        return subsections.get(subsection_id)
+
+    @property
+    def module_name(self) -> Optional[str]:
+        data = self._subsection(_MODULE)
+        if data is None:
+            return None
+        r = ByteReader(data)
+        return _name(r)
+
+    @property
+    def functions(self) -> Dict[int, str]:
+        """Function index -> name."""
+        if self._functions is None:
+            data = self._subsection(_FUNCTIONS)
+            self._functions = {} if data is None else _name_map(ByteReader(data))
+        return self._functions
+
+    def function_name(self, index: int) -> Optional[str]:
+        return self.functions.get(index)
+
+    def function_index(self, name: str) -> Optional[int]:
+        """The index of the function called ``name``; the lowest if several are."""
+        if self._function_indices is None:
+            indices: Dict[str, int] = {}
+            for index, function_name in sorted(self.functions.items()):
+                indices.setdefault(function_name, index)
+            self._function_indices = indices
+        return self._function_indices.get(name)
+
+    def locals(self, function_index: int) -> Dict[int, str]:
+        """Local index -> name for one function."""
+        names = self._locals.get(function_index)
+        if names is None:
+            offset = self._local_map_offsets().get(function_index)
+            if offset is None:
+                names = {}
+            else:
+                r = ByteReader(self._subsection(_LOCALS))  # type: ignore
+                r.offset = offset
+                names = _name_map(r)
+            self._locals[function_index] = names
+        return names
+
+    def local_name(self, function_index: int, local_index: int) -> Optional[str]:
+        return self.locals(function_index).get(local_index)
+
+    def _local_map_offsets(self) -> Dict[int, int]:
+        # Where each function's name map starts.  Finding them means walking
+        # the subsection once, but the names themselves are only skipped.
+        if self._local_offsets is None:
+            offsets: Dict[int, int] = {}
+            data = self._subsection(_LOCALS)
+            if data is not None:
+                r = ByteReader(data)
+                for function_i in range(r.uleb()):
+                    function_index = r.uleb()
+                    offsets[function_index] = r.tell()
+                    for local_i in range(r.uleb()):
+                        r.uleb()
+                        r.skip(r.uleb())
+            self._local_offsets = offsets
+        return self._local_offsets
+
+
+def _name(r: ByteReader) -> str:
+    return r.read(r.uleb()).decode()
+
+
+def _name_map(r: ByteReader) -> Dict[int, str]:
+    names = {}
+    for name_i in range(r.uleb()):
+        index = r.uleb()
+        names[index] = _name(r)
+    return names
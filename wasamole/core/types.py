@@ -2,6 +2,8 @@ import dataclasses
 from enum import Enum
 from typing import List, Dict, Optional
 
+from wasamole.util.slots import add_slots
+
 
 class ValueType(Enum):
     i32 = 0x7F
@@ -19,29 +21,34 @@ class MutType(Enum):
     var = 0x1
 
 
+@add_slots()
 @dataclasses.dataclass
 class FunctionType:
     params: List[ValueType]
     results: List[ValueType]
 
 
+@add_slots()
 @dataclasses.dataclass
 class LimitType:
     minimum: int
     maximum: Optional[int]
 
 
+@add_slots()
 @dataclasses.dataclass
 class TableType:
     elemtype: ElemType
     limits: LimitType
 
 
+@add_slots()
 @dataclasses.dataclass
 class MemoryType:
     limits: LimitType
 
 
+@add_slots()
 @dataclasses.dataclass
 class GlobalType:
     valtype: ValueType
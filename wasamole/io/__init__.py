@@ -1,17 +1,152 @@
-from wasamole.core.module import Module
+from typing import TYPE_CHECKING, Iterable, List, Optional, TextIO
 
-from .reader.binary_format import BinaryReader
+from wasamole.util.lazy import exports, lazy_exports
 
-from .writer.text_format import TextWriter
+if TYPE_CHECKING:
+    from wasamole.core.module import Module
+    from wasamole.util.bytes_reader import Buffer
 
+    from .aio import AsyncLoader, as_completed, from_bytes_async, from_file_async
+    from .cache import ModuleCache
+    from .reader.binary_format import (
+        BinaryReader,
+        FunctionStats,
+        ReadStats,
+        SectionHeader,
+        SectionStats,
+    )
+    from .writer.binary_format import BinaryWriter
+    from .writer.text_format import TextWriter
 
-def from_bytes(the_bytes: bytes) -> Module:
-    return BinaryReader.from_bytes(the_bytes).read()
+# The reader, the writers, the cache and the asyncio API are imported when
+# first used.  ``Module`` is still found here, as it always was.
+_EXPORTS = exports(
+    [
+        ("..core.module", ["Module"]),
+        (
+            ".aio",
+            ["AsyncLoader", "as_completed", "from_bytes_async", "from_file_async"],
+        ),
+        (".cache", ["ModuleCache"]),
+        (
+            ".reader.binary_format",
+            [
+                "BinaryReader",
+                "FunctionStats",
+                "ReadStats",
+                "SectionHeader",
+                "SectionStats",
+            ],
+        ),
+        (".writer.binary_format", ["BinaryWriter"]),
+        (".writer.text_format", ["TextWriter"]),
+    ]
+)
 
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
 
-def from_file(filename: str) -> Module:
-    return BinaryReader.from_file(filename).read()
 
+def from_bytes(
+    the_bytes: "Buffer",
+    lazy: bool = False,
+    sections: Optional[Iterable[str]] = None,
+    compact: bool = False,
+    stats: bool = False,
+    validate: bool = False,
+    previous: Optional["Module"] = None,
+) -> "Module":
+    """Read a module from ``the_bytes``.
+
+    With a ``previous`` module, function bodies that also appear in it are
+    reused rather than disassembled again (see ``BinaryReader``), so
+    rereading an edited module costs about as much as its changed bodies.
+    """
+    from .reader.binary_format import BinaryReader
+
+    return BinaryReader.from_bytes(
+        the_bytes, lazy, sections, compact, stats, validate, previous
+    ).read()
+
+
+def from_file(
+    filename: str,
+    lazy: bool = False,
+    sections: Optional[Iterable[str]] = None,
+    use_mmap: bool = False,
+    compact: bool = False,
+    parallel: int = 0,
+    cache: Optional["ModuleCache"] = None,
+    stats: bool = False,
+    validate: bool = False,
+    previous: Optional["Module"] = None,
+) -> "Module":
+    """Read a module from ``filename``.
+
+    With a ``cache``, eagerly read modules are looked up by content and
+    stored after parsing; lazy reads are cheap already and bypass it.
+    Reads with ``stats`` measure parsing, so they bypass it too, as do
+    reads that reuse the bodies of a ``previous`` module (see
+    ``from_bytes``).  Modules from the cache are validated like freshly
+    read ones.  The cache stores bodies in the ``compact`` form, and only
+    compact reads are quicker on a hit (see ``ModuleCache``).
+    """
+    from .reader.binary_format import BinaryReader, _map, _mapping
+
+    if cache is not None and not lazy and not stats and previous is None:
+        if validate and sections is not None:
+            raise ValueError("only whole modules can be validated")
+        with open(filename, "rb") as f:
+            bytez = _map(f) if use_mmap else f.read()
+        module = cache.load(bytez, sections, compact, parallel, str(filename))
+        module._mapping = _mapping(bytez)
+        if validate:
+            from wasamole.analysis.validation import validate as validate_module
+
+            validate_module(module, parallel)
+        return module
+    reader = BinaryReader.from_file(
+        filename,
+        lazy,
+        sections,
+        use_mmap,
+        compact,
+        parallel,
+        stats,
+        validate,
+        previous,
+    )
+    return reader.read()
+
+
+def headers_from_bytes(the_bytes: bytes) -> List["SectionHeader"]:
+    from .reader.binary_format import BinaryReader
+
+    return BinaryReader.from_bytes(the_bytes).read_headers()
+
+
+def headers_from_file(filename: str) -> List["SectionHeader"]:
+    from .reader.binary_format import BinaryReader
+
+    reader = BinaryReader.from_file(filename, use_mmap=True)
+    try:
+        return reader.read_headers()
+    finally:
+        reader.close()
+
+
+def to_text_string(module: "Module") -> str:
+    from .writer.text_format import TextWriter
 
-def to_text_string(module: Module) -> str:
     return TextWriter(module).write()
+
+
+def to_text_stream(module: "Module", stream: TextIO) -> None:
+    from .writer.text_format import TextWriter
+
+    TextWriter(module).write_to(stream)
+
+
+def to_bytes(module: "Module") -> bytes:
+    from .writer.binary_format import BinaryWriter
+
+    return BinaryWriter(module).write()
@@ -0,0 +1,241 @@
+"""Reading modules from asyncio code.
+
+Parsing a large module takes long enough to stall an event loop, so
+``AsyncLoader`` runs every read in an executor and only awaits the result.
+With a thread pool, the default, the file is read and parsed in a worker
+thread and the loop stays responsive, though threads share the interpreter
+lock.  With a ``ProcessPoolExecutor`` every core can parse at once: workers
+are sent file names rather than contents where possible and read the
+module in compact form, which is cheap to pickle.  Modules read in worker
+processes are returned in that form unless ``compact=False`` is passed, in
+which case the lists of instructions are rebuilt in a thread.
+
+Each loader bounds the number of reads in flight, so that queueing
+thousands of files does not pile them all onto the executor.  The
+module-level functions share one loader per event loop and executor.
+Cancelling a read that is still waiting for its turn cancels it outright;
+a read that a worker has already started runs to completion and its
+result is dropped.
+"""
+
+import asyncio
+import dataclasses
+import os
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
+
+import wasamole.io
+from wasamole.core.compact import CompactInstructions
+from wasamole.core.custom import CustomSection
+from wasamole.core.data import DataSegment
+from wasamole.core.function import Function
+from wasamole.core.instructions import Instruction
+from wasamole.core.module import Module
+from wasamole.util.bytes_reader import Buffer
+
+from .cache import _materialize
+
+T = TypeVar("T")
+
+# The files ``as_completed`` loads from a directory.
+WASM_PATTERN = "*.wasm"
+
+
+class AsyncLoader:
+    """Reads modules on ``executor`` with at most ``concurrency`` at once.
+
+    ``executor`` defaults to the event loop's default executor, a thread
+    pool, and ``concurrency`` to the number of CPUs.  Keyword options are
+    those of ``wasamole.io.from_file`` and ``wasamole.io.from_bytes``.
+    Lazy reads only scan the section headers, so they always run on the
+    default executor rather than being sent to worker processes.
+    """
+
+    def __init__(
+        self, executor: Optional[Executor] = None, concurrency: int = 0
+    ) -> None:
+        self.executor = executor
+        self.concurrency = concurrency or os.cpu_count() or 1
+        # Created on first use, inside the event loop it is used from.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def processes(self) -> bool:
+        return isinstance(self.executor, ProcessPoolExecutor)
+
+    async def from_file(self, filename: str, **options: Any) -> Module:
+        return await self._load(str(filename), options)
+
+    async def from_bytes(self, bytez: Buffer, **options: Any) -> Module:
+        return await self._load(bytez, options)
+
+    async def as_completed(
+        self,
+        filenames: Union[str, "os.PathLike[str]", Iterable[str]],
+        return_exceptions: bool = False,
+        **options: Any,
+    ) -> AsyncIterator[Tuple[str, Union[Module, Exception]]]:
+        """Read many files, yielding ``(filename, module)`` as each is done.
+
+        ``filenames`` may name a directory, to read every file in it that
+        matches ``WASM_PATTERN``, or a single file.  The first failed read
+        is raised unless ``return_exceptions`` is set, in which case the
+        exception takes the place of the module.  Reads still outstanding
+        when iteration stops early are cancelled.
+        """
+        if isinstance(filenames, (str, os.PathLike)):
+            if Path(filenames).is_dir():
+                paths = sorted(Path(filenames).glob(WASM_PATTERN))
+                filenames = [str(path) for path in paths]
+            else:
+                filenames = [str(filenames)]
+        tasks: Set["asyncio.Future[Tuple[str, Union[Module, Exception]]]"] = {
+            asyncio.ensure_future(self._named(f, return_exceptions, options))
+            for f in filenames
+        }
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _named(
+        self, filename: str, return_exceptions: bool, options: Any
+    ) -> Tuple[str, Union[Module, Exception]]:
+        try:
+            return filename, await self.from_file(filename, **options)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return filename, e
+
+    async def _load(self, source: Union[str, Buffer], options: Any) -> Module:
+        # ``source`` is a file name if it is a string, else the module.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            read = partial(_read, source, options)
+            if not self.processes:
+                return await _run(self.executor, read)
+            if options.get("lazy"):
+                return await _run(None, read)
+            if options.get("previous") is not None:
+                raise ValueError("a previous module cannot be sent to a worker")
+            if not isinstance(source, str):
+                # Views and mappings of the input cannot be pickled.
+                source = bytes(source)
+            module = await _run(self.executor, partial(_read_portable, source, options))
+            if options.get("compact") is False:
+                await _run(None, partial(_materialize, module))
+            return module
+
+
+async def _run(executor: Optional[Executor], fn: Callable[[], T]) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fn)
+
+
+def _read(source: Union[str, Buffer], options: Any) -> Module:
+    if isinstance(source, str):
+        return wasamole.io.from_file(source, **options)
+    return wasamole.io.from_bytes(source, **options)
+
+
+def _read_portable(source: Union[str, Buffer], options: Any) -> Module:
+    # Runs in a worker process.  The module is sent back in compact form and
+    # without views of the input, which cannot be pickled.
+    module = _read(source, dict(options, compact=True))
+    return dataclasses.replace(_storable(module), read_stats=module.read_stats)
+
+
+def _storable(module: Module) -> Module:
+    """A copy of ``module`` with compact bodies and no views of the input."""
+    functions = []
+    for function in module.functions:
+        instructions = function.peek_instructions()
+        if isinstance(instructions, CompactInstructions):
+            ci = instructions
+        else:
+            ci = CompactInstructions.from_instructions(instructions)
+        functions.append(
+            Function(
+                function.type_index,
+                function.peek_locals(),
+                cast(List[Instruction], ci),
+                function.size,
+                function.address,
+                function.name,
+                None if function.body is None else bytes(function.body),
+            )
+        )
+    return dataclasses.replace(
+        module,
+        functions=functions,
+        datas=[
+            DataSegment(d.memory_index, d.offset_expression, bytes(d.data))
+            for d in module.datas
+        ],
+        customs=[
+            CustomSection(c.name, bytes(c.data), c.after) for c in module.customs
+        ],
+    )
+
+
+async def from_file_async(
+    filename: str, executor: Optional[Executor] = None, **options: Any
+) -> Module:
+    """``wasamole.io.from_file`` on ``executor``, without blocking the loop."""
+    return await _loader(executor).from_file(filename, **options)
+
+
+async def from_bytes_async(
+    bytez: Buffer, executor: Optional[Executor] = None, **options: Any
+) -> Module:
+    """``wasamole.io.from_bytes`` on ``executor``, without blocking the loop."""
+    return await _loader(executor).from_bytes(bytez, **options)
+
+
+# The loaders of the module-level functions, by event loop and executor.
+_Loaders = Dict[Optional[Executor], AsyncLoader]
+_LOADERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Loaders]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _loader(executor: Optional[Executor]) -> AsyncLoader:
+    # Shared, so that reads started separately are bounded together.
+    loaders = _LOADERS.setdefault(asyncio.get_running_loop(), {})
+    loader = loaders.get(executor)
+    if loader is None:
+        loader = loaders[executor] = AsyncLoader(executor)
+    return loader
+
+
+def as_completed(
+    filenames: Union[str, "os.PathLike[str]", Iterable[str]],
+    executor: Optional[Executor] = None,
+    concurrency: int = 0,
+    return_exceptions: bool = False,
+    **options: Any,
+) -> AsyncIterator[Tuple[str, Union[Module, Exception]]]:
+    """Read many files concurrently; see ``AsyncLoader.as_completed``."""
+    loader = AsyncLoader(executor, concurrency)
+    return loader.as_completed(filenames, return_exceptions, **options)
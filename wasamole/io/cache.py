@@ -0,0 +1,247 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Iterable, List, Optional, Tuple, cast
+
+import wasamole
+from wasamole.core.compact import CompactInstructions
+from wasamole.core.module import Module
+from wasamole.util.bytes_reader import Buffer
+from wasamole.util.collector import paused_collection
+
+from .reader.binary_format import BinaryReader, _section_ids
+
+# Written at the start of every entry so that a truncated or foreign file is
+# treated as a miss.
+_MAGIC = b"WSMC\x04"
+# The key the entry was stored under and the number of function bodies.
+_HEADER = struct.Struct("<32sQ")
+_SUFFIX = ".module"
+
+DEFAULT_MAX_SIZE = 1 << 30
+
+
+class ModuleCache:
+    """An on-disk cache of parsed modules, shared between processes.
+
+    Entries are keyed by the SHA-256 of the input bytes, the wasamole
+    version and the sections that were read, so a hit is always the module
+    ``BinaryReader`` would have produced.  Only the decoded function
+    bodies are stored, in the column layout of ``CompactInstructions``
+    behind a small header, and never as pickles: an entry is plain data,
+    so a cache directory shared with other users cannot run code in the
+    reader.  On a hit the input is read again with the stored columns in
+    place of decoding the bodies, which leaves everything else, bodies
+    included, referring to the input as after any other read.
+
+    The cached form is therefore ``CompactInstructions``, and ``compact``
+    defaults to True here.  A hit without it builds the instruction lists
+    from the columns, which costs about as much as decoding the bodies, so
+    only compact reads are sped up by the cache.
+
+    Writers write to a temporary file in the cache directory and rename it
+    into place, so readers never see a partial entry.  A hit refreshes the
+    entry's modification time and once the directory grows past
+    ``max_size`` bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = str(directory)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, bytez: Buffer, sections: Optional[Iterable[str]] = None) -> str:
+        h = hashlib.sha256()
+        h.update(f"wasamole {wasamole.__version__}\n".encode())
+        if sections is not None:
+            ids = sorted(_section_ids(sections))
+            h.update(f"sections {ids}\n".encode())
+        h.update(bytez)
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(
+        self,
+        key: str,
+        bytez: Buffer,
+        sections: Optional[Iterable[str]] = None,
+        compact: bool = True,
+    ) -> Optional[Module]:
+        """The module read from ``bytez`` with the bodies stored under
+        ``key``, or None if there is no usable entry."""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        bodies = _bodies(data, key)
+        if bodies is None:
+            return None
+        reader = BinaryReader(bytez, False, sections, True)
+        reader._cached = bodies
+        try:
+            module = reader.read()
+        except ValueError:
+            # Bodies that do not fit the input.  Were the input itself
+            # invalid, reading it again on the miss raises the error.
+            return None
+        if not compact:
+            _materialize(module)
+        return module
+
+    def put(self, key: str, module: Module) -> None:
+        data = _entry(key, module)
+        fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def load(
+        self,
+        bytez: Buffer,
+        sections: Optional[Iterable[str]] = None,
+        compact: bool = True,
+        parallel: int = 0,
+        filename: Optional[str] = None,
+    ) -> Module:
+        """Return the cached module for ``bytez``, parsing it on a miss."""
+        key = self.key(bytez, sections)
+        module = self.get(key, bytez, sections, compact)
+        if module is None:
+            reader = BinaryReader(bytez, False, sections, compact, parallel)
+            reader.filename = filename
+            module = reader.read()
+            self.put(key, module)
+        return module
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """Each entry's (modification time, size, path), oldest first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> None:
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process evicted it first.
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _materialize(module: Module) -> None:
+    with paused_collection():
+        for function in module.functions:
+            body = function.body
+            function.instructions = cast(
+                CompactInstructions, function.peek_instructions()
+            ).to_list()
+            if body is not None:
+                function.set_body(body)
+
+
+def _entry(key: str, module: Module) -> bytes:
+    columns = [array("B"), array("q"), array("I"), array("I")]
+    counts = array("I")
+    for function in module.functions:
+        instructions = function.peek_instructions()
+        if isinstance(instructions, CompactInstructions):
+            ci = instructions
+        else:
+            ci = CompactInstructions.from_instructions(instructions)
+        counts.append(len(ci.opcodes))
+        counts.append(len(ci.vectors))
+        columns[0] += ci.opcodes
+        columns[1] += ci.payloads
+        columns[2] += ci.offsets
+        columns[3] += ci.vectors
+    parts = [_MAGIC, _HEADER.pack(bytes.fromhex(key), len(module.functions))]
+    for column in [counts] + columns:
+        if sys.byteorder == "big":
+            column.byteswap()
+        parts.append(column.tobytes())
+    return b"".join(parts)
+
+
+def _bodies(data: bytes, key: str) -> Optional[List[CompactInstructions]]:
+    """The bodies ``_entry`` wrote to ``data``, if it is an entry for
+    ``key``."""
+    if not data.startswith(_MAGIC) or len(data) < len(_MAGIC) + _HEADER.size:
+        return None
+    digest, count = _HEADER.unpack_from(data, len(_MAGIC))
+    if digest != bytes.fromhex(key):
+        return None
+    counts = array("I")
+    offset = len(_MAGIC) + _HEADER.size
+    end = offset + 2 * count * counts.itemsize
+    if end > len(data):
+        return None
+    counts.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        counts.byteswap()
+    instructions = sum(counts[0::2])
+    lengths = [instructions, instructions, instructions + count, sum(counts[1::2])]
+
+    view = memoryview(data)
+    columns = [array("B"), array("q"), array("I"), array("I")]
+    for column, length in zip(columns, lengths):
+        offset, end = end, end + length * column.itemsize
+        if end > len(data):
+            return None
+        column.frombytes(view[offset:end])
+        if sys.byteorder == "big":
+            column.byteswap()
+    if end != len(data):
+        return None
+
+    opcodes, payloads, offsets, vectors = columns
+    bodies = []
+    at = vector_at = 0
+    for i in range(count):
+        n = counts[2 * i]
+        v = counts[2 * i + 1]
+        ci = CompactInstructions()
+        ci.opcodes = opcodes[at : at + n]
+        ci.payloads = payloads[at : at + n]
+        ci.offsets = offsets[at + i : at + i + n + 1]
+        ci.vectors = vectors[vector_at : vector_at + v]
+        bodies.append(ci)
+        at += n
+        vector_at += v
+    return bodies
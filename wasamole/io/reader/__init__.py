@@ -1 +1 @@
-from .binary_format import BinaryReader
+from .binary_format import BinaryReader, SectionHeader
@@ -1,12 +1,28 @@
-from typing import List, Type
-
-from wasamole.util.bytes_reader import ByteReader
+import heapq
+import mmap
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterable, List, Optional, Set, Tuple, Type, cast
+
+from wasamole.util.bytes_reader import Buffer, ByteReader
+from wasamole.util.collector import paused_collection
 from wasamole.core.module import Module
+from wasamole.core.names import SymbolTable
+from wasamole.core.custom import CustomSection
+from wasamole.core.data import DataSegment
 from wasamole.core.elem import Elem
-from wasamole.core.function import Function
+from wasamole.core.function import (
+    Function,
+    LazyFunction,
+    decode_instructions,
+    read_locals,
+    skip_locals,
+)
 from wasamole.core.localvar import Local
 from wasamole.core.globalvar import Global
-from wasamole.core.instructions import disassemble
+from wasamole.core.compact import CompactInstructions
+from wasamole.core.instructions import Instruction, Opcode, read_instruction
 from wasamole.core.types import (
     ValueType,
     FunctionType,
@@ -33,30 +49,324 @@ from wasamole.core.imports import (
 )
 
 
+SECTION_NAMES = {
+    0: "custom",
+    1: "type",
+    2: "import",
+    3: "function",
+    4: "table",
+    5: "memory",
+    6: "global",
+    7: "export",
+    8: "start",
+    9: "elem",
+    10: "code",
+    11: "data",
+}
+
+SECTION_IDS = {name: section_id for section_id, name in SECTION_NAMES.items()}
+
+# Sections that cannot be materialised without another one.  Function bodies
+# are attached to the functions declared in the function section.
+SECTION_DEPENDENCIES = {"code": {"function"}}
+
+
+# Sections whose contents start with a count of their entries.
+VECTOR_SECTIONS = {1, 2, 3, 4, 5, 6, 7, 9, 10, 11}
+
+
+@dataclass
+class SectionHeader:
+    id: int
+    name: str
+    offset: int
+    size: int
+
+
+@dataclass
+class SectionStats:
+    """The cost of reading every section with one id.
+
+    Custom sections can repeat, so ``sections`` counts them.  ``size`` is
+    in bytes and includes the section headers.  ``skipped`` is set when
+    the section was not among those asked for.
+    """
+
+    id: int
+    name: str
+    sections: int = 0
+    size: int = 0
+    entries: int = 0
+    seconds: float = 0.0
+    skipped: bool = False
+
+
+@dataclass
+class FunctionStats:
+    """The time taken to decode one function body.
+
+    ``index`` is in the combined index space, imported functions first.
+    """
+
+    index: int
+    name: str
+    size: int
+    instructions: int
+    seconds: float
+
+
+@dataclass
+class ReadStats:
+    """What a read took, from ``BinaryReader(..., stats=True)``.
+
+    ``instructions`` counts the instructions decoded, which is none for a
+    lazy read.  ``slowest_functions`` holds the bodies that took longest
+    to decode, slowest first; bodies decoded in worker processes are not
+    timed.
+    """
+
+    sections: Dict[int, SectionStats] = field(default_factory=dict)
+    size: int = 0
+    seconds: float = 0.0
+    instructions: int = 0
+    slowest_functions: List[FunctionStats] = field(default_factory=list)
+
+    def add_section(
+        self, section: memoryview, seconds: float, skipped: bool
+    ) -> None:
+        r = ByteReader(section)
+        section_id = r.u8()
+        r.uleb()
+        if section_id in VECTOR_SECTIONS and not r.eos():
+            entries = r.uleb()
+        else:
+            entries = 1
+        stats = self.sections.get(section_id)
+        if stats is None:
+            name = SECTION_NAMES.get(section_id, "unknown")
+            stats = self.sections[section_id] = SectionStats(section_id, name)
+        stats.sections += 1
+        stats.size += len(section)
+        stats.entries += entries
+        stats.seconds += seconds
+        stats.skipped = skipped
+
+
+# How many of the slowest function bodies ``ReadStats`` lists.
+SLOWEST_FUNCTIONS = 10
+
+
 class BinaryReader:
-    def __init__(self, bytez: bytes) -> None:
+    """Reads a binary WebAssembly module.
+
+    With ``lazy`` set, function bodies are not disassembled while reading.
+    Each function records its body and decodes its locals and instructions
+    on first access instead (see ``LazyFunction``).
+
+    ``sections`` restricts reading to the named sections (see
+    ``SECTION_NAMES``); every other section is skipped over using its size
+    prefix without being decoded.
+
+    With ``compact`` set, function bodies are decoded into
+    ``CompactInstructions`` columns instead of lists of ``Instruction``
+    objects, which takes a fraction of the memory.
+
+    ``from_file(..., parallel=N)`` disassembles function bodies in ``N``
+    worker processes.  The code section is scanned for body offsets first,
+    then each worker maps the file and sends its bodies back in compact
+    form, which is cheap to pickle.  Unless ``compact`` is set, the parent
+    then turns them into lists as they arrive.  That takes about as long
+    as decoding them serially, so parallel reads mostly pay off together
+    with ``compact``.
+
+    Function bodies and data segments are views into ``bytez`` rather than
+    copies, and so are custom section payloads in lazy reads.  Eager reads
+    copy custom sections, which are small, rather than keep all of
+    ``bytez`` alive for them.  ``from_file(..., use_mmap=True)`` maps the
+    file instead of reading it, so those views are backed by the page cache
+    and the file is only paged in as far as it is actually decoded.  The
+    module keeps the mapping until ``Module.close`` is called.
+
+    With ``stats`` set, the reader times each section and each function
+    body and leaves a ``ReadStats`` in the module's ``read_stats``.
+
+    With ``validate`` set, the module is checked with
+    ``wasamole.analysis.validation`` and ``ValidationError`` is raised if it
+    is not valid, bodies that cannot be decoded included.  Each body is
+    checked as it is decoded, or once the module has been read in
+    ``parallel`` worker processes if given.  Only whole modules can be
+    validated.
+
+    With a ``previous`` module, typically an earlier read of the same
+    file, only the function bodies that are not byte for byte among its
+    decoded bodies are disassembled.  Bodies are matched by content rather
+    than by index, so inserting or moving functions leaves the rest to be
+    reused.  A reused function is a new ``Function`` with copies of the
+    locals and instructions of the one in ``previous``, so either can be
+    edited without changing the other.  Lists of instructions are copied
+    but the ``Instruction`` objects in them are shared, so replace an
+    instruction rather than change its operands in place.
+    """
+
+    def __init__(
+        self,
+        bytez: Buffer,
+        lazy: bool = False,
+        sections: Optional[Iterable[str]] = None,
+        compact: bool = False,
+        parallel: int = 0,
+        stats: bool = False,
+        validate: bool = False,
+        previous: Optional[Module] = None,
+    ) -> None:
+        if validate and sections is not None:
+            raise ValueError("only whole modules can be validated")
         self.r = ByteReader(bytez)
         self.module = Module()
+        self.lazy = lazy
+        self.compact = compact
+        self.parallel = parallel
+        self.filename: Optional[str] = None
+        self.mapping = _mapping(bytez)
+        self.sections = None if sections is None else _section_ids(sections)
+        self.validate = validate
+        self.previous = previous
+        # The id of the last known section read, where custom sections go.
+        self._last_section = 0
+        # Bodies already decoded from this input, set by ``ModuleCache``.
+        self._cached: Optional[List[CompactInstructions]] = None
+        # Whether the bodies were validated as they were decoded.
+        self._checked = False
+        self.stats = ReadStats() if stats else None
+        # (seconds, function index) per body decoded, while collecting stats.
+        self._function_times: Optional[List[Tuple[float, int]]] = (
+            [] if stats else None
+        )
 
     @staticmethod
-    def from_bytes(bytez: bytes) -> "BinaryReader":
-        return BinaryReader(bytez)
+    def from_bytes(
+        bytez: Buffer,
+        lazy: bool = False,
+        sections: Optional[Iterable[str]] = None,
+        compact: bool = False,
+        stats: bool = False,
+        validate: bool = False,
+        previous: Optional[Module] = None,
+    ) -> "BinaryReader":
+        return BinaryReader(
+            bytez,
+            lazy,
+            sections,
+            compact,
+            stats=stats,
+            validate=validate,
+            previous=previous,
+        )
 
     @staticmethod
-    def from_file(filename: str) -> "BinaryReader":
+    def from_file(
+        filename: str,
+        lazy: bool = False,
+        sections: Optional[Iterable[str]] = None,
+        use_mmap: bool = False,
+        compact: bool = False,
+        parallel: int = 0,
+        stats: bool = False,
+        validate: bool = False,
+        previous: Optional[Module] = None,
+    ) -> "BinaryReader":
         with open(filename, "rb") as f:
-            return BinaryReader.from_bytes(f.read())
-        return None
+            bytez = _map(f) if use_mmap else f.read()
+        reader = BinaryReader(
+            bytez, lazy, sections, compact, parallel, stats, validate, previous
+        )
+        reader.filename = str(filename)
+        return reader
 
     def read(self) -> Module:
-        self.r.ensure(b"\x00asm")
-        version = self.r.u32()
+        self._read_preamble()
 
-        while not self.r.eos():
-            self._read_section()
+        if self.stats is not None:
+            self._read_timed(self.stats)
+        else:
+            while not self.r.eos():
+                self._read_section()
+
+        if self.validate:
+            # Imported here, as most reads are not validated.
+            from wasamole.analysis.validation import validate
 
+            validate(self.module, self.parallel, not self._checked)
+        self.module._mapping = self.mapping
         return self.module
 
+    def close(self) -> None:
+        """Unmap the input of a reader made with ``use_mmap``, once nothing
+        read from it refers to it any more; see ``Module.close``."""
+        if self.mapping is not None:
+            self.r.data.release()
+            self.mapping.close()
+            self.mapping = None
+
+    def _read_timed(self, stats: ReadStats) -> None:
+        # Kept apart from ``read`` so that reading without stats does not
+        # pay for them.
+        clock = time.perf_counter
+        start = clock()
+        while not self.r.eos():
+            offset = self.r.tell()
+            section_id = self.r.data[offset]
+            section_start = clock()
+            self._read_section()
+            seconds = clock() - section_start
+            skipped = self.sections is not None and section_id not in self.sections
+            stats.add_section(self.r.data[offset : self.r.tell()], seconds, skipped)
+        stats.seconds = clock() - start
+        stats.size = len(self.r.data)
+
+        functions = self.module.functions
+        if not self.lazy:
+            stats.instructions = sum(len(f.peek_instructions()) for f in functions)
+        imported = len(self.module.function_imports())
+        for seconds, code_i in heapq.nlargest(
+            SLOWEST_FUNCTIONS, self._function_times or []
+        ):
+            function = functions[code_i]
+            stats.slowest_functions.append(
+                FunctionStats(
+                    imported + code_i,
+                    function.name,
+                    function.size,
+                    len(function.peek_instructions()),
+                    seconds,
+                )
+            )
+        self.module.read_stats = stats
+
+    def read_headers(self) -> List[SectionHeader]:
+        """List the module's sections without decoding any of them."""
+        self._read_preamble()
+
+        headers = []
+        while not self.r.eos():
+            section_type = self.r.u8()
+            section_size = self.r.uleb()
+            headers.append(
+                SectionHeader(
+                    section_type,
+                    SECTION_NAMES.get(section_type, "unknown"),
+                    self.r.tell(),
+                    section_size,
+                )
+            )
+            self.r.skip(section_size)
+
+        return headers
+
+    def _read_preamble(self) -> None:
+        self.r.ensure(b"\x00asm")
+        version = self.r.u32()
+
     #
     # Sections
     #
@@ -64,6 +374,12 @@ class BinaryReader:
     def _read_section(self) -> None:
         section_type = self.r.u8()
         section_size = self.r.uleb()
+        if section_type != 0:
+            self._last_section = section_type
+
+        if self.sections is not None and section_type not in self.sections:
+            self.r.skip(section_size)
+            return
 
         type_read_map = {
             0: self._read_custom,
@@ -83,17 +399,20 @@ class BinaryReader:
         type_read_map[section_type](section_size)
 
     def _read_custom(self, size: int) -> None:
-        r = ByteReader(self.r.read(size))
+        r = ByteReader(self.r.view(size))
         name = r.read(r.uleb()).decode()
+        payload: Buffer = r.view()
+        if not self.lazy:
+            payload = bytes(payload)
+        self.module.add_custom(CustomSection(name, payload, self._last_section))
         if name == "name":
-            while not r.eos():
-                section_id = r.u8()
-                section_size = r.uleb()
-                if section_id == 1:
-                    for name_i in range(r.uleb()):
-                        function_index = r.uleb()
-                        function_name = r.read(r.uleb()).decode()
-                        self.module.functions[name_i].set_name(function_name)
+            names = SymbolTable(payload)
+            self.module.names = names
+            # Names use the combined index space, imported functions first.
+            # They are only decoded once asked for, like local names.
+            imported = len(self.module.function_imports())
+            for code_i, function in enumerate(self.module.functions):
+                function.set_name_from(names, imported + code_i)
 
     def _read_typesec(self, size: int) -> None:
         for type_i in range(self.r.uleb()):
@@ -111,6 +430,16 @@ class BinaryReader:
             index = self.r.uleb()
             self.module.add_function(Function(index))
 
+    def _read_expression(self) -> List[Instruction]:
+        # Decoded instruction by instruction: an operand such as the 0x0b of
+        # ``i32.const 11`` must not be taken for the ``end``.
+        instrs = []
+        while True:
+            instr = read_instruction(self.r)
+            instrs.append(instr)
+            if instr.opcode == Opcode.END:
+                return instrs
+
     def _read_tablesec(self, size: int) -> None:
         for table_i in range(self.r.uleb()):
             self.module.add_table(self._read_table_type())
@@ -122,7 +451,7 @@ class BinaryReader:
     def _read_globalsec(self, size: int) -> None:
         for global_i in range(self.r.uleb()):
             global_type = self._read_global_type()
-            init_expression = disassemble(self.r.read_until(0x0B))
+            init_expression = self._read_expression()
             self.module.add_global(Global(global_type, init_expression))
 
     def _read_exportsec(self, size: int) -> None:
@@ -135,33 +464,187 @@ class BinaryReader:
     def _read_elemsec(self, size: int) -> None:
         for elem_i in range(self.r.uleb()):
             table_index = self.r.uleb()
-            offset_expression = disassemble(self.r.read_until(0x0B))
+            offset_expression = self._read_expression()
             func_indices = [self.r.uleb() for index_i in range(self.r.uleb())]
             self.module.add_elem(Elem(table_index, offset_expression, func_indices))
 
     def _read_codesec(self, size: int) -> None:
-        for code_i in range(self.r.uleb()):
+        if self.lazy:
+            self._read_code_entries()
+            return
+        with paused_collection():
+            self._read_code_entries()
+
+    def _read_code_entries(self) -> None:
+        # Bodies left for worker processes: (function index, offset, size).
+        pending: Optional[List[Tuple[int, int, int]]] = None
+        cached = self._cached
+        if (
+            self.parallel > 1
+            and self.filename is not None
+            and not self.lazy
+            and cached is None
+        ):
+            pending = []
+
+        # Each body is validated as it is decoded, while it is at hand.
+        context = None
+        if self.validate and not self.lazy and pending is None and cached is None:
+            # Imported here, as most reads are not validated.
+            from wasamole.analysis import validation
+
+            context = validation.ValidationContext.from_module(self.module)
+            self._checked = True
+
+        # Default names follow the text format's numbering, which counts
+        # imported functions first.
+        imported = len(self.module.function_imports())
+        times = self._function_times
+        reusable = None if self.previous is None else self._reusable(self.previous)
+        count = self.r.uleb()
+        if cached is not None and len(cached) != count:
+            raise ValueError("cached bodies do not match the code section")
+        for code_i in range(count):
             function = self.module.functions[code_i]
             code_size = self.r.uleb()
             code_address = self.r.tell()
 
-            # Setup another byte reader to pick aport the code section.
-            code_reader = ByteReader(self.r.read(code_size))
-            for local_i in range(code_reader.uleb()):
-                local_count = code_reader.uleb()
-                local_type = code_reader.u8()
-                for _ in range(local_count):
-                    function.add_local(Local(ValueType(local_type)))
+            # Setup another byte reader over a view of the code section to
+            # pick apart the function body without copying it.
+            body = self.r.view(code_size)
+            if reusable:
+                old = reusable.get(bytes(body))
+                if old is not None:
+                    instructions = old.peek_instructions()
+                    if isinstance(instructions, CompactInstructions):
+                        instructions = cast(List[Instruction], instructions.copy())
+                    else:
+                        instructions = list(instructions)
+                    self.module.functions[code_i] = Function(
+                        function.type_index,
+                        list(old.peek_locals()),
+                        instructions,
+                        old.size,
+                        code_address + code_size - old.size,
+                        f"(;{imported + code_i};)",
+                        body,
+                    )
+                    if context is not None:
+                        try:
+                            validation.validate_function(
+                                context, self.module.functions[code_i]
+                            )
+                        except validation.ValidationError as e:
+                            e.function = imported + code_i
+                            raise
+                    continue
+            code_reader = ByteReader(body)
+            if self.lazy:
+                skip_locals(code_reader)
+                function = LazyFunction(function.type_index, body, self.compact)
+                self.module.functions[code_i] = function
+            elif context is None:
+                for local in read_locals(code_reader):
+                    function.add_local(local)
+            else:
+                locals = validation.read_checked_locals(code_reader, imported + code_i)
+                for local in locals:
+                    function.add_local(local)
 
             # The rest of the byte stream is the instructions.
-            function.set_name(f"(;{code_i};)")
+            function.set_name(f"(;{imported + code_i};)")
             function.set_size(code_size - code_reader.tell())
             function.set_address(code_address + code_reader.tell())
-            function.append_instructions(disassemble(code_reader.read()))
+            if pending is not None:
+                pending.append((code_i, function.address, function.size))
+            elif cached is not None:
+                if cached[code_i].offsets[-1] != function.size:
+                    raise ValueError("cached bodies do not match the code section")
+                function.instructions = cast(List[Instruction], cached[code_i])
+            elif context is not None:
+                code = code_reader.view()
+                start = time.perf_counter()
+                function.instructions = validation.decode_checked(
+                    context, imported + code_i, function, code, self.compact
+                )
+                if times is not None:
+                    times.append((time.perf_counter() - start, code_i))
+            elif not self.lazy:
+                code = code_reader.view()
+                if times is None:
+                    function.instructions = decode_instructions(code, self.compact)
+                else:
+                    start = time.perf_counter()
+                    function.instructions = decode_instructions(code, self.compact)
+                    times.append((time.perf_counter() - start, code_i))
+            function.set_body(body)
+
+        if pending:
+            self._decode_parallel(pending)
+
+    def _reusable(self, previous: Module) -> Dict[bytes, Function]:
+        """The decoded functions of ``previous`` by body, where they are
+        in the form this read decodes to."""
+        reusable: Dict[bytes, Function] = {}
+        for function in previous.functions:
+            body = function.unchanged_body
+            if body is None:
+                # Built, modified or handed out, so the body may be stale.
+                continue
+            if isinstance(function, LazyFunction) and not function.decoded:
+                continue
+            compact = isinstance(function.peek_instructions(), CompactInstructions)
+            if compact == self.compact:
+                reusable.setdefault(bytes(body), function)
+        return reusable
+
+    def _decode_parallel(self, pending: List[Tuple[int, int, int]]) -> None:
+        # Imported here: process pools take a while to import and most
+        # reads never start one.
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = _chunks(pending, self.parallel * 4)
+        filenames = [self.filename] * len(chunks)
+        with ProcessPoolExecutor(self.parallel) as executor:
+            results = executor.map(_decode_chunk, filenames, chunks)
+            try:
+                for chunk, decoded in zip(chunks, results):
+                    for (code_i, offset, size), instructions in zip(chunk, decoded):
+                        function = self.module.functions[code_i]
+                        body = function.body
+                        if self.compact:
+                            function.instructions = cast(
+                                List[Instruction], instructions
+                            )
+                        else:
+                            function.instructions = instructions.to_list()
+                        if body is not None:
+                            function.set_body(body)
+            except (ValueError, IndexError, struct.error):
+                if not self.validate:
+                    raise
+                self._check_serially(pending)
+                raise
+
+    def _check_serially(self, pending: List[Tuple[int, int, int]]) -> None:
+        # A worker failed to decode a body.  Checking them all in order
+        # reports the first invalid one and where, as a serial read would.
+        from wasamole.analysis import validation
+
+        context = validation.ValidationContext.from_module(self.module)
+        imported = len(self.module.function_imports())
+        data = self.r.data
+        for code_i, offset, size in pending:
+            function = self.module.functions[code_i]
+            code = data[offset : offset + size]
+            validation.decode_checked(context, imported + code_i, function, code)
 
     def _read_datasec(self, size: int) -> None:
-        # TODO: Implement data sections.
-        self.r.read(size)
+        for data_i in range(self.r.uleb()):
+            memory_index = self.r.uleb()
+            offset_expression = self._read_expression()
+            data = self.r.view(self.r.uleb())
+            self.module.add_data(DataSegment(memory_index, offset_expression, data))
 
     #
     # Types
@@ -226,3 +709,65 @@ class BinaryReader:
         value_type = ValueType(self.r.u8())
         mut = MutType(self.r.u8())
         return GlobalType(value_type, mut)
+
+
+def _mapping(bytez: Buffer) -> Optional[mmap.mmap]:
+    """The file mapping ``bytez`` is a view of, if it is one."""
+    if isinstance(bytez, memoryview) and isinstance(bytez.obj, mmap.mmap):
+        return bytez.obj
+    return None
+
+
+def _map(f: BinaryIO) -> Buffer:
+    try:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except ValueError:
+        # Empty files cannot be mapped.
+        return f.read()
+
+
+def _chunks(
+    pending: List[Tuple[int, int, int]], count: int
+) -> List[List[Tuple[int, int, int]]]:
+    """Split ``pending`` bodies into about ``count`` runs of similar size."""
+    target = sum(size for _, _, size in pending) / count
+    chunks: List[List[Tuple[int, int, int]]] = [[]]
+    chunk_size = 0
+    for entry in pending:
+        if chunk_size >= target:
+            chunks.append([])
+            chunk_size = 0
+        chunks[-1].append(entry)
+        chunk_size += entry[2]
+    return chunks
+
+
+def _decode_chunk(
+    filename: str, chunk: List[Tuple[int, int, int]]
+) -> List[CompactInstructions]:
+    with open(filename, "rb") as f:
+        data = memoryview(_map(f))
+    try:
+        return [
+            CompactInstructions.decode(data[offset : offset + size])
+            for _, offset, size in chunk
+        ]
+    except Exception as e:
+        # The traceback holds views of the mapping, which could then not be
+        # closed.
+        raise e.with_traceback(None)
+    finally:
+        mapping = _mapping(data)
+        data.release()
+        if mapping is not None:
+            mapping.close()
+
+
+def _section_ids(sections: Iterable[str]) -> Set[int]:
+    names: Set[str] = set()
+    for name in sections:
+        if name not in SECTION_IDS:
+            raise ValueError(f"unknown section {name!r}")
+        names.add(name)
+        names |= SECTION_DEPENDENCIES.get(name, set())
+    return {SECTION_IDS[name] for name in names}
@@ -0,0 +1,377 @@
+import struct
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from wasamole.core.custom import CustomSection
+from wasamole.core.module import Module
+from wasamole.core.function import Function
+from wasamole.core.instructions import (
+    BlockTypeOperand,
+    F32Operand,
+    F64Operand,
+    I32Operand,
+    I64Operand,
+    IndexOperand,
+    IndexVectorOperand,
+    Instruction,
+    MemArgOperand,
+    NumericOperand,
+    Operand,
+    ZeroOperand,
+)
+from wasamole.core.types import (
+    ValueType,
+    TableType,
+    LimitType,
+    GlobalType,
+)
+from wasamole.core.exports import (
+    BaseExport,
+    FuncExport,
+    TypeExport,
+    MemExport,
+    GlobalExport,
+)
+from wasamole.core.imports import (
+    BaseImport,
+    TypeImport,
+    TableImport,
+    MemoryImport,
+    GlobalImport,
+)
+from wasamole.util.bytes_reader import Buffer
+
+_F32 = struct.Struct(b"<f")
+_F64 = struct.Struct(b"<d")
+
+# Inputs at least this long are kept as parts of their own rather than
+# copied into the encoded bytes around them.
+_COPY_LIMIT = 256
+
+
+class BinaryWriter:
+    """Writes a module in the binary format.
+
+    Output is collected as a list of parts: ``bytearray`` runs that are
+    encoded into directly, and the verbatim bodies and data segments of
+    the input, which are not copied until the parts are joined at the
+    end.  A section (or function body) is written as parts of its own, so
+    its size is known before its size prefix is added in front of them,
+    and no bytes are moved to make room for it.
+
+    A function that still has the ``body`` it was read from is copied
+    verbatim rather than re-encoded, so rewriting a module where a few
+    functions changed costs little more than copying the rest.
+
+    Custom sections are written back after the known section they
+    followed when they were read, and after all other sections if they
+    were added since.
+    """
+
+    def __init__(self, module: Module) -> None:
+        self.module: Module = module
+        self.parts: List[Buffer] = []
+        self.buffer = bytearray()
+
+    def write(self) -> bytes:
+        self.buffer += b"\x00asm\x01\x00\x00\x00"
+
+        module = self.module
+        customs: Dict[Optional[int], List[CustomSection]] = {}
+        for custom in module.customs:
+            customs.setdefault(custom.after, []).append(custom)
+
+        self._write_customs(customs.get(0, []))
+        for section_id, present, write in (
+            (1, module.types, self._write_typesec),
+            (2, module.imports, self._write_importsec),
+            (3, module.functions, self._write_funcsec),
+            (4, module.tables, self._write_tablesec),
+            (5, module.memories, self._write_memorysec),
+            (6, module.globals, self._write_globalsec),
+            (7, module.exports, self._write_exportsec),
+            (8, module.start is not None, self._write_startsec),
+            (9, module.elems, self._write_elemsec),
+            (10, module.functions, self._write_codesec),
+            (11, module.datas, self._write_datasec),
+        ):
+            if present:
+                self._write_section(section_id, write)
+            self._write_customs(customs.get(section_id, []))
+        self._write_customs(customs.get(None, []))
+
+        self._flush()
+        return b"".join(self.parts)
+
+    #
+    # Encoding
+    #
+
+    def _u8(self, value: int) -> None:
+        self.buffer.append(value)
+
+    def _uleb(self, value: int) -> None:
+        buffer = self.buffer
+        while value >= 0x80:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    def _sleb(self, value: int) -> None:
+        buffer = self.buffer
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            if (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40):
+                buffer.append(byte)
+                return
+            buffer.append(byte | 0x80)
+
+    def _flush(self) -> None:
+        """End the current run of encoded bytes."""
+        if self.buffer:
+            self.parts.append(self.buffer)
+            self.buffer = bytearray()
+
+    def _copy(self, data: Buffer) -> None:
+        """Add ``data`` to the output, copying it only if it is small."""
+        if len(data) < _COPY_LIMIT:
+            self.buffer += data
+        else:
+            self._flush()
+            self.parts.append(data)
+
+    def _sized(self, write: Callable[[], None]) -> None:
+        """Run ``write`` and prefix what it wrote with its size."""
+        self._flush()
+        parts = self.parts
+        start = len(parts)
+        write()
+        self._flush()
+        size = sum(map(len, parts[start:]))
+        # Only part references move here, never the bytes themselves.
+        parts.insert(start, _uleb(size))
+
+    def _name(self, name: str) -> None:
+        encoded = name.encode()
+        self._uleb(len(encoded))
+        self.buffer += encoded
+
+    #
+    # Sections
+    #
+
+    def _write_section(self, section_id: int, write: Callable[[], None]) -> None:
+        self.buffer.append(section_id)
+        self._sized(write)
+
+    def _write_customs(self, customs: List[CustomSection]) -> None:
+        for custom in customs:
+            self.buffer.append(0)
+            self._sized(lambda: self._write_custom(custom.name, custom.data))
+
+    def _write_custom(self, name: str, data: Buffer) -> None:
+        self._name(name)
+        self._copy(data)
+
+    def _write_typesec(self) -> None:
+        self._uleb(len(self.module.types))
+        for ft in self.module.types:
+            self._u8(0x60)
+            self._write_values(ft.params)
+            self._write_values(ft.results)
+
+    def _write_importsec(self) -> None:
+        self._uleb(len(self.module.imports))
+        for imp in self.module.imports:
+            self._write_import(imp)
+
+    def _write_funcsec(self) -> None:
+        self._uleb(len(self.module.functions))
+        for function in self.module.functions:
+            self._uleb(function.type_index)
+
+    def _write_tablesec(self) -> None:
+        self._uleb(len(self.module.tables))
+        for table in self.module.tables:
+            self._write_table_type(table)
+
+    def _write_memorysec(self) -> None:
+        self._uleb(len(self.module.memories))
+        for memory in self.module.memories:
+            self._write_limits(memory.limits)
+
+    def _write_globalsec(self) -> None:
+        self._uleb(len(self.module.globals))
+        for globl in self.module.globals:
+            self._write_global_type(globl.type)
+            self._write_instructions(globl.init_expression)
+
+    def _write_exportsec(self) -> None:
+        self._uleb(len(self.module.exports))
+        for export in self.module.exports:
+            self._write_export(export)
+
+    def _write_startsec(self) -> None:
+        self._uleb(self.module.start or 0)
+
+    def _write_elemsec(self) -> None:
+        self._uleb(len(self.module.elems))
+        for elem in self.module.elems:
+            self._uleb(elem.table_index)
+            self._write_instructions(elem.offset_expression)
+            self._uleb(len(elem.function_indices))
+            for index in elem.function_indices:
+                self._uleb(index)
+
+    def _write_codesec(self) -> None:
+        self._uleb(len(self.module.functions))
+        for function in self.module.functions:
+            body = function.unchanged_body
+            if body is not None:
+                self._uleb(len(body))
+                self._copy(body)
+            else:
+                self._sized(lambda: self._write_function(function))
+
+    def _write_datasec(self) -> None:
+        self._uleb(len(self.module.datas))
+        for data in self.module.datas:
+            self._uleb(data.memory_index)
+            self._write_instructions(data.offset_expression)
+            self._uleb(len(data.data))
+            self._copy(data.data)
+
+    #
+    # Functions and instructions
+    #
+
+    def _write_function(self, function: Function) -> None:
+        # Locals are run-length encoded by type.
+        runs: List[Tuple[int, ValueType]] = []
+        for local in function.peek_locals():
+            if runs and runs[-1][1] == local.type:
+                runs[-1] = (runs[-1][0] + 1, local.type)
+            else:
+                runs.append((1, local.type))
+        self._uleb(len(runs))
+        for count, local_type in runs:
+            self._uleb(count)
+            self._u8(local_type.value)
+        self._write_instructions(function.peek_instructions())
+
+    def _write_instructions(self, instrs: List[Instruction]) -> None:
+        writers = _OPERAND_WRITERS
+        for instr in instrs:
+            self.buffer.append(instr.opcode.value)
+            for operand in instr.operands:
+                writers[type(operand)](self, operand)
+
+    def _write_blocktype(self, operand: BlockTypeOperand) -> None:
+        if operand.result_type:
+            self._u8(operand.result_type.value)
+        else:
+            self._u8(0x40)
+
+    def _write_index(self, operand: IndexOperand) -> None:
+        self._uleb(operand.index)
+
+    def _write_index_vector(self, operand: IndexVectorOperand) -> None:
+        self._uleb(len(operand.indices))
+        for index in operand.indices:
+            self._uleb(index)
+
+    def _write_memarg(self, operand: MemArgOperand) -> None:
+        self._uleb(operand.align)
+        self._uleb(operand.offset)
+
+    def _write_zero(self, operand: ZeroOperand) -> None:
+        self._u8(0)
+
+    def _write_integer(self, operand: NumericOperand) -> None:
+        self._sleb(int(operand.value))
+
+    def _write_f32(self, operand: F32Operand) -> None:
+        self.buffer += _F32.pack(operand.value)
+
+    def _write_f64(self, operand: F64Operand) -> None:
+        self.buffer += _F64.pack(operand.value)
+
+    #
+    # Types
+    #
+
+    def _write_values(self, values: List[ValueType]) -> None:
+        self._uleb(len(values))
+        for value in values:
+            self._u8(value.value)
+
+    def _write_import(self, bi: BaseImport) -> None:
+        self._name(bi.module_name)
+        self._name(bi.name)
+        if isinstance(bi, TypeImport):
+            self._u8(0x0)
+            self._uleb(bi.index)
+        elif isinstance(bi, TableImport):
+            self._u8(0x1)
+            self._write_table_type(bi.table_type)
+        elif isinstance(bi, MemoryImport):
+            self._u8(0x2)
+            self._write_limits(bi.memory_type.limits)
+        elif isinstance(bi, GlobalImport):
+            self._u8(0x3)
+            self._write_global_type(bi.global_type)
+        else:
+            raise Exception("unexpected import type")
+
+    def _write_export(self, be: BaseExport) -> None:
+        self._name(be.name)
+        if isinstance(be, FuncExport):
+            self._u8(0x0)
+        elif isinstance(be, TypeExport):
+            self._u8(0x1)
+        elif isinstance(be, MemExport):
+            self._u8(0x2)
+        elif isinstance(be, GlobalExport):
+            self._u8(0x3)
+        else:
+            raise Exception("unexpected export type")
+        self._uleb(be.index)
+
+    def _write_limits(self, limits: LimitType) -> None:
+        if limits.maximum is None:
+            self._u8(0x0)
+            self._uleb(limits.minimum)
+        else:
+            self._u8(0x1)
+            self._uleb(limits.minimum)
+            self._uleb(limits.maximum)
+
+    def _write_table_type(self, table: TableType) -> None:
+        self._u8(table.elemtype.value)
+        self._write_limits(table.limits)
+
+    def _write_global_type(self, global_type: GlobalType) -> None:
+        self._u8(global_type.valtype.value)
+        self._u8(global_type.mut.value)
+
+
+def _uleb(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+_OPERAND_WRITERS: Dict[Type[Operand], Callable[[BinaryWriter, Operand], None]] = {
+    BlockTypeOperand: BinaryWriter._write_blocktype,  # type: ignore
+    IndexOperand: BinaryWriter._write_index,  # type: ignore
+    IndexVectorOperand: BinaryWriter._write_index_vector,  # type: ignore
+    MemArgOperand: BinaryWriter._write_memarg,  # type: ignore
+    ZeroOperand: BinaryWriter._write_zero,  # type: ignore
+    I32Operand: BinaryWriter._write_integer,  # type: ignore
+    I64Operand: BinaryWriter._write_integer,  # type: ignore
+    F32Operand: BinaryWriter._write_f32,  # type: ignore
+    F64Operand: BinaryWriter._write_f64,  # type: ignore
+}
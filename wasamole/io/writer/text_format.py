@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, Iterator, List, TextIO
 
 from wasamole.core.exports import BaseExport, FuncExport
 from wasamole.core.module import Module
@@ -20,12 +20,25 @@ class TextWriter:
         def __exit__(self, type: Any, value: Any, traceback: Any) -> None:
             self.tw.indent -= 2
 
+    # Fragments are handed out once at least this many characters are
+    # buffered, so memory use does not grow with the size of the module.
+    CHUNK_SIZE = 1 << 16
+
     def __init__(self, module: Module) -> None:
         self.module: Module = module
         self.buffer: List[str] = []
+        self.buffered: int = 0
+        self.newline: bool = False
         self.indent: int = 0
 
     def write(self) -> str:
+        return "".join(self.chunks())
+
+    def write_to(self, stream: TextIO) -> None:
+        for chunk in self.chunks():
+            stream.write(chunk)
+
+    def chunks(self) -> Iterator[str]:
         self._writeln("(module")
 
         # Write out types.
@@ -34,6 +47,7 @@ class TextWriter:
                 self._write(f"(type (;{i};) ")
                 self._write_function_type(type)
                 self._writeln(")")
+                yield from self._flush()
 
         # Write out imports.
         with TextWriter.Indent(self):
@@ -42,13 +56,15 @@ class TextWriter:
                 self._write(f'(import "{imp.module_name}" "{imp.name}" ')
                 self._write_import(i, imp)
                 self._writeln(")")
+                yield from self._flush()
 
         # Write out code sections.
         with TextWriter.Indent(self):
             for i, function in enumerate(self.module.functions):
                 self._write(f"(func {function.name} (type {function.type_index})")
-                self._write_function(function)
+                yield from self._write_function(function)
                 self._writeln(")")
+                yield from self._flush()
 
         # Write out memory sections.
         with TextWriter.Indent(self):
@@ -57,6 +73,7 @@ class TextWriter:
                 if memory.limits.maximum:
                     self._write(f"{memory.limits.maximum}")
                 self._writeln(")")
+                yield from self._flush()
 
         # Write out export sections.
         with TextWriter.Indent(self):
@@ -65,14 +82,23 @@ class TextWriter:
                 self._write(f'(export "{export.name}" ')
                 self._write_export(i, export)
                 self._writeln(")")
+                yield from self._flush()
 
         self._writeln(")")
-        return "".join(self.buffer)
+        yield from self._flush(True)
+
+    def _flush(self, force: bool = False) -> Iterator[str]:
+        if self.buffered >= TextWriter.CHUNK_SIZE or (force and self.buffer):
+            yield "".join(self.buffer)
+            self.buffer.clear()
+            self.buffered = 0
 
     def _write(self, s: str) -> "TextWriter":
-        if len(self.buffer) and len(self.buffer[-1]) and self.buffer[-1][-1] == "\n":
+        if self.newline:
             self._indent()
         self.buffer.append(s)
+        self.buffered += len(s)
+        self.newline = s[-1:] == "\n"
         return self
 
     def _nl(self) -> "TextWriter":
@@ -84,6 +110,7 @@ class TextWriter:
 
     def _indent(self) -> "TextWriter":
         self.buffer.append(" " * self.indent)
+        self.buffered += self.indent
         return self
 
     def _write_function_type(self, ft: FunctionType) -> None:
@@ -98,21 +125,25 @@ class TextWriter:
         if isinstance(bi, TypeImport):
             self._write(f"(func (;{i};) (type {bi.index}))")
 
-    def _write_function(self, f: Function) -> None:
+    def _write_function(self, f: Function) -> Iterator[str]:
+        # Flushes as it goes, so a single huge body is not buffered whole.
         with TextWriter.Indent(self):
             self._nl()
-            if len(f.locals):
+            locals = f.peek_locals()
+            instructions = f.peek_instructions()
+            if len(locals):
                 self._write("(local ")
-                self._write(" ".join([str(l.type.name) for l in f.locals]))
+                self._write(" ".join([str(l.type.name) for l in locals]))
                 self._writeln(")")
-            for i, instr in enumerate(f.instructions, start=1):
-                if instr.opcode == Opcode.END and (i == len(f.instructions)):
+            for i, instr in enumerate(instructions, start=1):
+                if instr.opcode == Opcode.END and (i == len(instructions)):
                     break
                 if instr.ends_block():
                     self.indent -= 2
                 self._writeln(str(instr))
                 if instr.starts_block():
                     self.indent += 2
+                yield from self._flush()
 
     def _write_export(self, i: int, be: BaseExport) -> None:
         if isinstance(be, FuncExport):
@@ -1,62 +1,103 @@
 import struct
-from typing import List, cast
+from typing import List, Optional, Union, cast
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+_U16 = struct.Struct(b"<H")
+_U32 = struct.Struct(b"<I")
+_F32 = struct.Struct(b"<f")
+_F64 = struct.Struct(b"<d")
 
 
 class ByteReader(object):
-    def __init__(self, data: bytes) -> None:
+    """A cursor over a byte buffer.
+
+    The buffer is held as a ``memoryview`` and every fixed-width read decodes
+    in place at the current offset, so walking a buffer never copies it.
+    ``view`` hands out zero-copy windows that can be wrapped in another
+    ``ByteReader`` to pick apart a section or a function body.
+    """
+
+    def __init__(self, data: Buffer) -> None:
         self.offset: int = 0
-        self.data: bytes = data
+        self.data: memoryview = memoryview(data).cast("B")
 
     def peek(self, count: int) -> bytes:
-        return self.data[self.offset : self.offset + count]
+        return self.data[self.offset : self.offset + count].tobytes()
 
-    def read(self, count: int = 0) -> bytes:
-        if not count:
+    def read(self, count: Optional[int] = None) -> bytes:
+        return self.view(count).tobytes()
+
+    def view(self, count: Optional[int] = None) -> memoryview:
+        if count is None:
             count = len(self.data) - self.offset
-        bytez = self.peek(count)
+        view = self.data[self.offset : self.offset + count]
+        self.offset += count
+        return view
+
+    def skip(self, count: int) -> None:
         self.offset += count
-        return bytez
 
     def read_until(self, byte: int) -> bytes:
-        bytez = b""
-        while ord(self.peek(1)) != byte:
-            bytez += self.read(1)
-        return bytez + self.read(1)
+        end = self.offset
+        while self.data[end] != byte:
+            end += 1
+        return self.read(end + 1 - self.offset)
 
     def u8(self) -> int:
-        return cast(int, struct.unpack(b"B", self.read(1))[0])
+        byte = self.data[self.offset]
+        self.offset += 1
+        return byte
 
     def u16(self) -> int:
-        return cast(int, struct.unpack(b"H", self.read(2))[0])
+        value = _U16.unpack_from(self.data, self.offset)[0]
+        self.offset += 2
+        return cast(int, value)
 
     def u32(self) -> int:
-        return cast(int, struct.unpack(b"I", self.read(4))[0])
+        value = _U32.unpack_from(self.data, self.offset)[0]
+        self.offset += 4
+        return cast(int, value)
 
     def f32(self) -> float:
-        return cast(float, struct.unpack(b"<f", self.read(4))[0])
+        value = _F32.unpack_from(self.data, self.offset)[0]
+        self.offset += 4
+        return cast(float, value)
 
     def f64(self) -> float:
-        return cast(float, struct.unpack(b"<d", self.read(8))[0])
+        value = _F64.unpack_from(self.data, self.offset)[0]
+        self.offset += 8
+        return cast(float, value)
 
     def uleb(self) -> int:
-        result = shift = 0
-        while True:
-            byte = ord(self.read(1))
+        data = self.data
+        offset = self.offset
+        byte = data[offset]
+        offset += 1
+        result = byte & 0x7F
+        shift = 7
+        while byte & 0x80:
+            byte = data[offset]
+            offset += 1
             result |= (byte & 0x7F) << shift
             shift += 7
-            if (byte & 0x80) == 0:
-                break
+        self.offset = offset
         return result
 
     def sleb(self) -> int:
-        result = shift = 0
-        while True:
-            byte = ord(self.read(1))
+        data = self.data
+        offset = self.offset
+        byte = data[offset]
+        offset += 1
+        result = byte & 0x7F
+        shift = 7
+        while byte & 0x80:
+            byte = data[offset]
+            offset += 1
             result |= (byte & 0x7F) << shift
             shift += 7
-            if (byte & 0x80) == 0:
-                break
-        if result & 0x40:
+        self.offset = offset
+        if byte & 0x40:
             result |= ~0 << shift
         return result
 
@@ -0,0 +1,26 @@
+import gc
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@contextmanager
+def paused_collection() -> Iterator[None]:
+    """Pause the cyclic garbage collector while building many objects.
+
+    Decoding instructions and building control-flow graphs allocate an
+    object or more per instruction and keep them all alive, so each
+    collection rescans everything built so far, over and over, although
+    none of those objects form cycles.  The collector is global to the
+    process, though, so it is only paused on the main thread: elsewhere,
+    such as in an executor, it would be paused under the feet of the
+    application, event loop included.
+    """
+    if not gc.isenabled() or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
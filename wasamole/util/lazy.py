@@ -0,0 +1,34 @@
+import importlib
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+
+def exports(modules: Iterable[Tuple[str, Iterable[str]]]) -> Dict[str, str]:
+    """Name -> submodule, from (submodule, names) pairs."""
+    return {name: module for module, names in modules for name in names}
+
+
+def lazy_exports(
+    package: str, names: Dict[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """A package's ``__getattr__`` and ``__dir__`` for names imported on use.
+
+    ``names`` maps each exported name to the submodule defining it,
+    relative to ``package``.  The submodule is imported the first time
+    the name is looked up, and the name is then stored in the package so
+    that later lookups are plain attribute accesses.
+    """
+    namespace = sys.modules[package].__dict__
+
+    def __getattr__(name: str) -> Any:
+        module = names.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module, package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace) | set(names))
+
+    return __getattr__, __dir__
@@ -0,0 +1,78 @@
+import dataclasses
+from typing import Any, Dict, Iterable, Type, TypeVar, cast
+
+T = TypeVar("T")
+
+
+def add_slots(*extra: str) -> "Any":
+    """A class decorator giving a dataclass ``__slots__`` for its fields.
+
+    ``dataclass(slots=True)`` needs Python 3.10, so this rebuilds the class
+    the same way: the fields declared by the class itself, plus ``extra``
+    attribute names, become slots, and instances lose their ``__dict__``.
+    It must be applied after ``@dataclass``.  Methods of the class must not
+    use ``super()`` without arguments, which would still refer to the class
+    that was replaced.
+
+    Frozen dataclasses get ``__getstate__`` and ``__setstate__`` so that
+    they can be unpickled, as with ``slots=True``.
+    """
+
+    def wrap(cls: Type[T]) -> Type[T]:
+        inherited = {
+            name for base in cls.__mro__[1:] for name in _slot_names(base)
+        }
+        names = [f.name for f in dataclasses.fields(cast(Any, cls))] + list(extra)
+        cls_dict = dict(cls.__dict__)
+        cls_dict["__slots__"] = tuple(n for n in names if n not in inherited)
+        for name in names:
+            # Field defaults are class attributes, which would hide the slots.
+            cls_dict.pop(name, None)
+        cls_dict.pop("__dict__", None)
+        cls_dict.pop("__weakref__", None)
+        if getattr(cls, "__dataclass_params__").frozen:
+            cls_dict["__getstate__"] = _getstate
+            cls_dict["__setstate__"] = _setstate
+        metaclass: Any = type(cls)
+        slotted: Type[T] = metaclass(cls.__name__, cls.__bases__, cls_dict)
+        slotted.__qualname__ = cls.__qualname__
+        return slotted
+
+    return wrap
+
+
+def _slot_names(cls: type) -> Iterable[str]:
+    slots = cls.__dict__.get("__slots__", ())
+    return (slots,) if isinstance(slots, str) else slots
+
+
+def slot_state(obj: Any) -> Dict[str, Any]:
+    """The slots of ``obj`` that are set, by name.
+
+    Slots are read through their own descriptors, so a property of a
+    subclass that shadows a slot is not called.
+    """
+    state = {}
+    for cls in type(obj).__mro__:
+        for name in _slot_names(cls):
+            try:
+                state[name] = cls.__dict__[name].__get__(obj, cls)
+            except AttributeError:
+                pass
+    return state
+
+
+def restore_slots(obj: Any, state: Dict[str, Any]) -> None:
+    """Set the slots of ``obj`` from ``slot_state``, bypassing ``__setattr__``."""
+    for cls in type(obj).__mro__:
+        for name in _slot_names(cls):
+            if name in state:
+                cls.__dict__[name].__set__(obj, state[name])
+
+
+def _getstate(self: Any) -> Dict[str, Any]:
+    return slot_state(self)
+
+
+def _setstate(self: Any, state: Dict[str, Any]) -> None:
+    restore_slots(self, state)
@@ -0,0 +1,34 @@
+from typing import TYPE_CHECKING
+
+from wasamole.util.lazy import exports, lazy_exports
+
+if TYPE_CHECKING:
+    from .instance import (
+        CompiledFunction,
+        HostFunction,
+        Instance,
+        Memory,
+        RuntimeFunction,
+        Table,
+    )
+    from .ops import CompileError, LinkError, Trap
+
+_EXPORTS = exports(
+    [
+        (
+            ".instance",
+            [
+                "CompiledFunction",
+                "HostFunction",
+                "Instance",
+                "Memory",
+                "RuntimeFunction",
+                "Table",
+            ],
+        ),
+        (".ops", ["CompileError", "LinkError", "Trap"]),
+    ]
+)
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,387 @@
+"""Lowering of function bodies into directly executable code.
+
+A function is compiled once into a list of ``(handler, imm)`` pairs.  The
+structured control instructions disappear in the process: ``block``,
+``loop``, ``end`` and ``nop`` emit nothing, and every branch is resolved to
+the index of the op it continues at.  The operand stack height at each
+instruction is known statically, so a branch also records the height the
+stack must be cut back to and whether it carries a result; when the cut
+would be a no-op (the common case) a plain jump is emitted instead.
+
+Short instruction sequences are folded into the superinstructions of
+``fused`` as they are emitted.  Folding never reaches back past a branch
+target, so every target still starts a complete op.
+"""
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple, Union
+
+from wasamole.core.function import Function
+from wasamole.core.instructions import Instruction, Opcode
+from wasamole.core.types import FunctionType
+
+from . import fused, ops
+from .ops import CompileError, Handler, M32, M64
+
+if TYPE_CHECKING:
+    from .instance import Instance, Memory, Table
+
+_BLOCK = 0
+_LOOP = 1
+_IF = 2
+_FUNCTION = 3
+
+# Builds a branch op's immediate once its target is known.
+Build = Callable[[int], Any]
+
+
+@dataclass
+class _Label:
+    kind: int
+    height: int
+    arity: int
+    # Where a branch to a loop continues.
+    start: int = 0
+    # Index of the ``if`` op to point at the else branch or end.
+    if_op: int = -1
+    # Branches to the end of this label, resolved when it is reached: an
+    # op's (index, handler, build) or a br_table entry to fill in.
+    fixups: List[Union[Tuple[int, Handler, Build], List[int]]] = field(
+        default_factory=list
+    )
+
+    @property
+    def branch_arity(self) -> int:
+        return 0 if self.kind == _LOOP else self.arity
+
+
+@dataclass
+class Code:
+    """A compiled function body.
+
+    ``counts[i]`` is the number of source instructions ``ops[i]`` stands
+    for, which is only used to report instructions executed.
+    """
+
+    ops: List[Tuple[Handler, Any]]
+    counts: List[int]
+
+
+def _block_arity(instr: Instruction) -> int:
+    return 1 if instr.operands[0].result_type is not None else 0  # type: ignore
+
+
+def _const(instr: Instruction) -> Any:
+    value = instr.operands[0].value  # type: ignore
+    opcode = instr.opcode
+    if opcode == Opcode.I32_CONST:
+        return int(value) & M32
+    if opcode == Opcode.I64_CONST:
+        return int(value) & M64
+    return float(value)
+
+
+def _with(imm: Any, last: Any) -> Any:
+    """``imm`` of a fused form extended by a local index or target."""
+    if imm is None:
+        return last
+    if isinstance(imm, tuple):
+        return imm + (last,)
+    return (imm, last)
+
+
+def _identity(target: int) -> int:
+    return target
+
+
+class Compiler:
+    def __init__(
+        self, instance: "Instance", function: Function, ftype: FunctionType
+    ) -> None:
+        self.instance = instance
+        self.function = function
+        self.ftype = ftype
+        self.ops: List[Tuple[Handler, Any]] = []
+        self.counts: List[int] = []
+        self.height = 0
+        self.labels: List[_Label] = []
+        # Ops before this index may be branched past and cannot be folded.
+        self.barrier = 0
+
+    def compile(self) -> Code:
+        self.labels.append(_Label(_FUNCTION, 0, len(self.ftype.results)))
+        # Instructions after an unconditional branch up to the end of the
+        # enclosing block never run and are skipped; ``dead`` counts blocks
+        # opened within such a stretch.
+        dead: Optional[int] = None
+
+        for instr in self.function.peek_instructions():
+            opcode = instr.opcode.value
+            if dead is not None:
+                if opcode in (0x02, 0x03, 0x04):
+                    dead += 1
+                    continue
+                if dead:
+                    if opcode == 0x0B:
+                        dead -= 1
+                    continue
+                if opcode != 0x0B and opcode != 0x05:
+                    continue
+                dead = None
+                label = self.labels[-1]
+                self.height = label.height + label.arity
+            if self._lower(instr):
+                dead = 0
+
+        if self.labels:
+            raise CompileError("function body does not end")
+        return Code(self.ops, self.counts)
+
+    def _emit(self, handler: Handler, imm: Any = None, count: int = 1) -> int:
+        self.ops.append((handler, imm))
+        self.counts.append(count)
+        return len(self.ops) - 1
+
+    def _pc(self) -> int:
+        return len(self.ops)
+
+    def _mark_target(self) -> int:
+        self.barrier = self._pc()
+        return self.barrier
+
+    def _last(self, n: int = 1) -> Optional[Tuple[Handler, Any]]:
+        """The ``n``th op from the end, if it can be folded."""
+        index = len(self.ops) - n
+        if index < self.barrier:
+            return None
+        return self.ops[index]
+
+    def _fold(self, n: int) -> int:
+        """Drop the last ``n`` ops and return how many instructions they were."""
+        count = sum(self.counts[-n:])
+        del self.ops[-n:]
+        del self.counts[-n:]
+        return count
+
+    def _lower(self, instr: Instruction) -> bool:
+        """Lower one instruction; True if control cannot fall through it."""
+        opcode = instr.opcode.value
+        if opcode in fused.BINARY or opcode in fused.COMPARE:
+            self._binary(opcode)
+            self.height -= 1
+            return False
+
+        simple = ops.SIMPLE.get(opcode)
+        if simple is not None:
+            handler, pops, pushes = simple
+            self._emit(handler)
+            self.height += pushes - pops
+            return opcode == 0x00
+
+        instance = self.instance
+        operands: List[Any] = instr.operands
+        if opcode == 0x20:
+            self._emit(ops.op_local_get, operands[0].index)
+            self.height += 1
+        elif opcode == 0x21:
+            self._local_set(operands[0].index)
+            self.height -= 1
+        elif opcode == 0x22:
+            self._emit(ops.op_local_tee, operands[0].index)
+        elif opcode in (0x41, 0x42, 0x43, 0x44):
+            self._emit(ops.op_const, _const(instr))
+            self.height += 1
+        elif opcode in ops.LOADS:
+            memory = self._memory().data
+            last = self._last()
+            if last is not None and last[0] is ops.op_local_get:
+                count = self._fold(1)
+                imm = (memory, operands[0].offset, last[1])
+                self._emit(ops.LOCAL_LOADS[opcode], imm, count + 1)
+            else:
+                self._emit(ops.LOADS[opcode], (memory, operands[0].offset))
+        elif opcode in ops.STORES:
+            memory = self._memory().data
+            self._emit(ops.STORES[opcode], (memory, operands[0].offset))
+            self.height -= 2
+        elif opcode == 0x0C:
+            self._branch(operands[0].index)
+            return True
+        elif opcode == 0x0D:
+            self.height -= 1
+            self._branch(operands[0].index, conditional=True)
+        elif opcode == 0x0E:
+            self.height -= 1
+            entries = []
+            for depth in operands[0].indices + [operands[1].index]:
+                entry = [0, 0, 0]
+                self._target(depth, entry)
+                entries.append(entry)
+            self._emit(ops.op_br_table, entries)
+            return True
+        elif opcode == 0x02:
+            self.labels.append(_Label(_BLOCK, self.height, _block_arity(instr)))
+        elif opcode == 0x03:
+            start = self._mark_target()
+            self.labels.append(
+                _Label(_LOOP, self.height, _block_arity(instr), start=start)
+            )
+        elif opcode == 0x04:
+            self.height -= 1
+            label = _Label(_IF, self.height, _block_arity(instr))
+            label.if_op = self._emit(ops.op_if, None)
+            self.labels.append(label)
+        elif opcode == 0x05:
+            label = self.labels[-1]
+            # The then branch jumps over the else branch.
+            index = self._emit(ops.op_jump, None)
+            label.fixups.append((index, ops.op_jump, _identity))
+            self._patch_if(label)
+            self.height = label.height
+        elif opcode == 0x0B:
+            self._end()
+        elif opcode == 0x0F:
+            self._emit(ops.op_return)
+            return True
+        elif opcode == 0x10:
+            callee = instance.functions[operands[0].index]
+            self._emit(ops.op_call, callee)
+            self.height += len(callee.type.results) - len(callee.type.params)
+        elif opcode == 0x11:
+            ftype = instance.module.types[operands[0].index]
+            table = self._table().elements
+            self._emit(ops.op_call_indirect, (table, ftype))
+            self.height += len(ftype.results) - len(ftype.params) - 1
+        elif opcode == 0x23:
+            self._emit(ops.op_global_get, instance.globals[operands[0].index])
+            self.height += 1
+        elif opcode == 0x24:
+            self._emit(ops.op_global_set, instance.globals[operands[0].index])
+            self.height -= 1
+        elif opcode == 0x3F:
+            self._emit(ops.op_memory_size, self._memory())
+            self.height += 1
+        elif opcode == 0x40:
+            self._emit(ops.op_memory_grow, self._memory())
+        elif opcode == 0x01:
+            pass
+        else:
+            raise CompileError(f"cannot compile {instr.opname}")
+        return False
+
+    def _memory(self) -> "Memory":
+        if not self.instance.memories:
+            raise CompileError(f"{self.function.name} uses a memory but there is none")
+        return self.instance.memories[0]
+
+    def _table(self) -> "Table":
+        if not self.instance.tables:
+            raise CompileError(f"{self.function.name} uses a table but there is none")
+        return self.instance.tables[0]
+
+    def _binary(self, opcode: int) -> None:
+        last = self._last()
+        prev = self._last(2)
+        form = "S"
+        imm: Any = None
+        count = 0
+        if last is not None and prev is not None and prev[0] is ops.op_local_get:
+            if last[0] is ops.op_local_get:
+                form, imm = "LL", (prev[1], last[1])
+            elif last[0] is ops.op_const:
+                form, imm = "LC", (prev[1], last[1])
+            if form != "S":
+                count = self._fold(2)
+        if form == "S" and last is not None:
+            if last[0] is ops.op_const:
+                form, imm = "C", last[1]
+            elif last[0] is ops.op_local_get:
+                form, imm = "L", last[1]
+            if form != "S":
+                count = self._fold(1)
+        self._emit(fused.VALUE[(form, opcode)], imm, count + 1)
+
+    def _local_set(self, index: int) -> None:
+        last = self._last()
+        if last is not None and last[0] in fused.FORM_OF:
+            form_opcode = fused.FORM_OF[last[0]]
+            count = self._fold(1)
+            self._emit(fused.SET[form_opcode], _with(last[1], index), count + 1)
+        else:
+            self._emit(ops.op_local_set, index)
+
+    def _branch(self, depth: int, conditional: bool = False) -> None:
+        label = self.labels[-1 - depth]
+        keep = label.branch_arity
+        if label.kind == _FUNCTION and not conditional:
+            # Results are taken from the top of the stack on return, so
+            # nothing needs to be cut back.
+            self._emit(ops.op_return)
+            return
+
+        build: Build = _identity
+        handler: Handler
+        count = 0
+        if label.kind == _FUNCTION or self.height == label.height + keep:
+            handler = ops.op_br_if if conditional else ops.op_jump
+            last = self._last()
+            if conditional and last is not None:
+                form_opcode = fused.FORM_OF.get(last[0])
+                if form_opcode is not None and form_opcode in fused.BRANCH:
+                    imm = last[1]
+                    count = self._fold(1)
+                    handler = fused.BRANCH[form_opcode]
+                    build = lambda target: _with(imm, target)
+                elif last[0] is ops.op_i32_eqz:
+                    count = self._fold(1)
+                    handler = ops.op_br_unless
+        else:
+            handler = ops.op_br_if_unwind if conditional else ops.op_br
+            height = label.height
+            build = lambda target: (target, height, keep)
+
+        index = self._emit(handler, None, count + 1)
+        if label.kind == _FUNCTION:
+            self.ops[index] = (handler, build(-1))
+        elif label.kind == _LOOP:
+            self.ops[index] = (handler, build(label.start))
+        else:
+            label.fixups.append((index, handler, build))
+
+    def _target(self, depth: int, entry: List[int]) -> None:
+        label = self.labels[-1 - depth]
+        entry[1] = label.height
+        entry[2] = label.branch_arity
+        if label.kind == _FUNCTION:
+            entry[0] = -1
+        elif label.kind == _LOOP:
+            entry[0] = label.start
+        else:
+            label.fixups.append(entry)
+
+    def _patch_if(self, label: _Label) -> None:
+        if label.if_op >= 0:
+            self.ops[label.if_op] = (ops.op_if, self._mark_target())
+            label.if_op = -1
+
+    def _end(self) -> None:
+        label = self.labels.pop()
+        if label.kind == _FUNCTION:
+            self._emit(ops.op_return)
+            return
+        self._patch_if(label)
+        if label.fixups:
+            end = self._mark_target()
+            for fixup in label.fixups:
+                if isinstance(fixup, list):
+                    fixup[0] = end
+                else:
+                    index, handler, build = fixup
+                    self.ops[index] = (handler, build(end))
+        self.height = label.height + label.arity
+
+
+def compile_function(
+    instance: "Instance", function: Function, ftype: FunctionType
+) -> Code:
+    return Compiler(instance, function, ftype).compile()
@@ -0,0 +1,161 @@
+"""Superinstructions: handlers that each do the work of a short sequence.
+
+Most of an interpreter's time goes into dispatch rather than arithmetic, so
+the compiler folds the operands of a binary operator into it when they come
+straight from a local or a constant, folds a following ``local.set`` into
+the operator and folds a comparison into the ``br_if`` that consumes it.
+The handlers for every combination are generated from one expression per
+operator.
+
+The operand forms are:
+
+``S``  both operands on the stack
+``L``  left operand on the stack, right operand local ``imm``
+``C``  left operand on the stack, right operand constant ``imm``
+``LL`` locals ``imm[0]`` and ``imm[1]``
+``LC`` local ``imm[0]`` and constant ``imm[1]``
+
+and the result either replaces the operands on the stack, is stored into
+a local (the last element of ``imm``) or, for comparisons, decides a branch
+to ``imm[-1]``.
+"""
+
+from typing import Dict, Tuple
+
+from .ops import Handler, M32, M64, S32, S64
+
+# Opcode byte -> expression of the result in terms of ``a`` and ``b``.
+BINARY: Dict[int, str] = {
+    0x6A: "(a + b) & M32",
+    0x6B: "(a - b) & M32",
+    0x6C: "(a * b) & M32",
+    0x71: "a & b",
+    0x72: "a | b",
+    0x73: "a ^ b",
+    0x74: "(a << (b & 31)) & M32",
+    0x76: "a >> (b & 31)",
+    0x7C: "(a + b) & M64",
+    0x7D: "(a - b) & M64",
+    0x7E: "(a * b) & M64",
+    0x83: "a & b",
+    0x84: "a | b",
+    0x85: "a ^ b",
+    0x86: "(a << (b & 63)) & M64",
+    0x88: "a >> (b & 63)",
+}
+
+# Opcode byte -> condition in terms of ``a`` and ``b``.
+COMPARE: Dict[int, str] = {
+    0x46: "a == b",
+    0x47: "a != b",
+    0x48: "a ^ S32 < b ^ S32",
+    0x49: "a < b",
+    0x4A: "a ^ S32 > b ^ S32",
+    0x4B: "a > b",
+    0x4C: "a ^ S32 <= b ^ S32",
+    0x4D: "a <= b",
+    0x4E: "a ^ S32 >= b ^ S32",
+    0x4F: "a >= b",
+    0x51: "a == b",
+    0x52: "a != b",
+    0x53: "a ^ S64 < b ^ S64",
+    0x54: "a < b",
+    0x55: "a ^ S64 > b ^ S64",
+    0x56: "a > b",
+    0x57: "a ^ S64 <= b ^ S64",
+    0x58: "a <= b",
+    0x59: "a ^ S64 >= b ^ S64",
+    0x5A: "a >= b",
+}
+
+_OPERANDS = {
+    "S": ("b = stack.pop()", "stack[-1]", "b"),
+    "L": ("", "stack[-1]", "locs[imm]"),
+    "C": ("", "stack[-1]", "imm"),
+    "LL": ("", "locs[imm[0]]", "locs[imm[1]]"),
+    "LC": ("", "locs[imm[0]]", "imm[1]"),
+}
+
+# The stack forms pop their left operand rather than overwrite it when the
+# result goes somewhere else.
+_POPPED = {"S": "stack.pop()", "L": "stack.pop()", "C": "stack.pop()"}
+
+# Where the local index or branch target is for each form.
+_LAST = {"S": "imm", "L": "imm[1]", "C": "imm[1]", "LL": "imm[2]", "LC": "imm[2]"}
+_RIGHT = {"L": "locs[imm[0]]", "C": "imm[0]"}
+
+
+def _make(name: str, lines: Tuple[str, ...]) -> Handler:
+    source = f"def {name}(stack, locs, imm, pc):\n"
+    source += "".join(f"    {line}\n" for line in lines if line)
+    namespace = {"M32": M32, "M64": M64, "S32": S32, "S64": S64}
+    exec(source, namespace)
+    return namespace[name]  # type: ignore
+
+
+def _operands(form: str, consumed: bool) -> Tuple[str, str, str]:
+    setup, a, b = _OPERANDS[form]
+    if consumed:
+        a = _POPPED.get(form, a)
+        b = _RIGHT.get(form, b)
+        if form == "S":
+            setup = "b = stack.pop()"
+    return setup, a, b
+
+
+def _value(form: str, expr: str) -> Handler:
+    setup, a, b = _operands(form, False)
+    if form in ("LL", "LC"):
+        store = "stack.append({})"
+    else:
+        store = "stack[-1] = {}"
+    return _make(
+        f"{form}_value",
+        (setup, f"a = {a}", f"b = {b}", store.format(expr), "return pc + 1"),
+    )
+
+
+def _set(form: str, expr: str) -> Handler:
+    setup, a, b = _operands(form, True)
+    return _make(
+        f"{form}_set",
+        (setup, f"a = {a}", f"b = {b}", f"locs[{_LAST[form]}] = {expr}", "return pc + 1"),
+    )
+
+
+def _branch(form: str, condition: str) -> Handler:
+    setup, a, b = _operands(form, True)
+    return _make(
+        f"{form}_br_if",
+        (
+            setup,
+            f"a = {a}",
+            f"b = {b}",
+            f"if {condition}:",
+            f"    return {_LAST[form]}",
+            "return pc + 1",
+        ),
+    )
+
+
+FORMS = ("S", "L", "C", "LL", "LC")
+
+# (form, opcode) -> handler leaving the result on the stack.
+VALUE: Dict[Tuple[str, int], Handler] = {}
+# (form, opcode) -> handler storing the result into a local.
+SET: Dict[Tuple[str, int], Handler] = {}
+# (form, opcode) -> handler branching when a comparison holds.
+BRANCH: Dict[Tuple[str, int], Handler] = {}
+
+for _form in FORMS:
+    for _opcode, _expr in BINARY.items():
+        VALUE[(_form, _opcode)] = _value(_form, _expr)
+        SET[(_form, _opcode)] = _set(_form, _expr)
+    for _opcode, _condition in COMPARE.items():
+        VALUE[(_form, _opcode)] = _value(_form, f"1 if {_condition} else 0")
+        SET[(_form, _opcode)] = _set(_form, f"1 if {_condition} else 0")
+        BRANCH[(_form, _opcode)] = _branch(_form, _condition)
+
+# Handler -> (form, opcode) of the value handlers, to recognise them when a
+# later instruction can be folded in as well.
+FORM_OF: Dict[Handler, Tuple[str, int]] = {h: k for k, h in VALUE.items()}
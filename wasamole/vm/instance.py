@@ -0,0 +1,282 @@
+import abc
+import struct
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from wasamole.core.exports import FuncExport, GlobalExport, MemExport, TypeExport
+from wasamole.core.function import Function
+from wasamole.core.imports import GlobalImport, MemoryImport, TableImport, TypeImport
+from wasamole.core.instructions import Instruction, Opcode
+from wasamole.core.module import Module
+from wasamole.core.types import FunctionType, LimitType, ValueType
+
+from .compiler import Code, compile_function
+from .ops import M32, M64, LinkError, Trap, f32, s32, s64
+
+PAGE_SIZE = 65536
+MAX_PAGES = 65536
+
+Imports = Dict[str, Dict[str, Any]]
+
+
+class Memory:
+    """A linear memory.
+
+    ``data`` is grown in place, so compiled code can hold on to it.
+    """
+
+    def __init__(self, minimum: int, maximum: Optional[int] = None) -> None:
+        self.data = bytearray(minimum * PAGE_SIZE)
+        self.maximum = maximum
+
+    @property
+    def pages(self) -> int:
+        return len(self.data) // PAGE_SIZE
+
+    def grow(self, delta: int) -> int:
+        """Grow by ``delta`` pages, returning the old size or -1."""
+        old = self.pages
+        limit = MAX_PAGES if self.maximum is None else self.maximum
+        if old + delta > limit:
+            return -1
+        self.data.extend(bytes(delta * PAGE_SIZE))
+        return old
+
+
+class Table:
+    def __init__(self, minimum: int, maximum: Optional[int] = None) -> None:
+        self.elements: List[Optional["RuntimeFunction"]] = [None] * minimum
+        self.maximum = maximum
+
+
+class RuntimeFunction(abc.ABC):
+    """A function as seen by the machine: something ``call`` can invoke.
+
+    ``invoke`` takes and returns values in the machine's representation;
+    calling the object converts to and from plain Python numbers (signed
+    integers and floats) and turns failures into ``Trap``.
+    """
+
+    type: FunctionType
+    nparams: int
+
+    @abc.abstractmethod
+    def invoke(self, args: List[Any]) -> List[Any]:
+        """Call the function with ``args``, returning its results."""
+
+    def __call__(self, *args: Any) -> Any:
+        params = self.type.params
+        if len(args) != len(params):
+            raise TypeError(f"expected {len(params)} arguments, got {len(args)}")
+        try:
+            results = self.invoke([_to_machine(t, a) for t, a in zip(params, args)])
+        except struct.error:
+            raise Trap("out of bounds memory access") from None
+        except RecursionError:
+            raise Trap("call stack exhausted") from None
+        values = [_from_machine(t, r) for t, r in zip(self.type.results, results)]
+        if not values:
+            return None
+        return values[0] if len(values) == 1 else tuple(values)
+
+
+class CompiledFunction(RuntimeFunction):
+    def __init__(self, ftype: FunctionType, function: Function) -> None:
+        self.type = ftype
+        self.nparams = len(ftype.params)
+        self.nresults = len(ftype.results)
+        self.function = function
+        self.zeros = [_zero(local.type) for local in function.peek_locals()]
+        self.code: List[Any] = []
+        self.counts: List[int] = []
+
+    def load(self, code: Code) -> None:
+        self.code = code.ops
+        self.counts = code.counts
+
+    def invoke(self, args: List[Any]) -> List[Any]:
+        locs = args + self.zeros
+        stack: List[Any] = []
+        code = self.code
+        pc = 0
+        while pc >= 0:
+            handler, imm = code[pc]
+            pc = handler(stack, locs, imm, pc)
+        n = self.nresults
+        return stack[-n:] if n else []
+
+
+class CountingFunction(CompiledFunction):
+    """A compiled function that counts the instructions it executes."""
+
+    executed = 0
+
+    def invoke(self, args: List[Any]) -> List[Any]:
+        locs = args + self.zeros
+        stack: List[Any] = []
+        code = self.code
+        counts = self.counts
+        executed = 0
+        pc = 0
+        try:
+            while pc >= 0:
+                executed += counts[pc]
+                handler, imm = code[pc]
+                pc = handler(stack, locs, imm, pc)
+        finally:
+            CountingFunction.executed += executed
+        n = self.nresults
+        return stack[-n:] if n else []
+
+
+class HostFunction(RuntimeFunction):
+    """A Python callable imported by a module."""
+
+    def __init__(self, ftype: FunctionType, fn: Callable[..., Any]) -> None:
+        self.type = ftype
+        self.nparams = len(ftype.params)
+        self.fn = fn
+
+    def invoke(self, args: List[Any]) -> List[Any]:
+        params = self.type.params
+        result = self.fn(*[_from_machine(t, a) for t, a in zip(params, args)])
+        results = self.type.results
+        if not results:
+            return []
+        if len(results) == 1:
+            return [_to_machine(results[0], result)]
+        return [_to_machine(t, r) for t, r in zip(results, result)]
+
+
+class Instance:
+    """An instantiated module.
+
+    Every defined function is compiled when the module is instantiated.
+    ``imports`` maps module and field names to Python callables (for
+    function imports), ``Memory`` and ``Table`` objects, or global values.
+    With ``count`` set, the instance counts the instructions it executes in
+    ``CountingFunction.executed``, which is slower.
+    """
+
+    def __init__(
+        self, module: Module, imports: Optional[Imports] = None, count: bool = False
+    ) -> None:
+        self.module = module
+        self.functions: List[RuntimeFunction] = []
+        self.memories: List[Memory] = []
+        self.tables: List[Table] = []
+        # Each global is a one element list, shared with the compiled code.
+        self.globals: List[List[Any]] = []
+
+        self._link(imports or {})
+        for memory in module.memories:
+            self.memories.append(Memory(memory.limits.minimum, memory.limits.maximum))
+        for table in module.tables:
+            self.tables.append(Table(table.limits.minimum, table.limits.maximum))
+        for globl in module.globals:
+            self.globals.append([self._evaluate(globl.init_expression)])
+
+        compiled = []
+        function_class = CountingFunction if count else CompiledFunction
+        for function in module.functions:
+            ftype = module.types[function.type_index]
+            runtime = function_class(ftype, function)
+            self.functions.append(runtime)
+            compiled.append(runtime)
+        for runtime in compiled:
+            runtime.load(compile_function(self, runtime.function, runtime.type))
+
+        self._initialize()
+        self.exports: Dict[str, Any] = {}
+        for export in module.exports:
+            if isinstance(export, FuncExport):
+                self.exports[export.name] = self.functions[export.index]
+            elif isinstance(export, TypeExport):
+                self.exports[export.name] = self.tables[export.index]
+            elif isinstance(export, MemExport):
+                self.exports[export.name] = self.memories[export.index]
+            elif isinstance(export, GlobalExport):
+                self.exports[export.name] = self.globals[export.index]
+
+        if module.start is not None:
+            self.functions[module.start]()
+
+    def invoke(self, name: str, *args: Any) -> Any:
+        """Call the exported function ``name`` with Python numbers."""
+        return self.exports[name](*args)
+
+    @property
+    def memory(self) -> bytearray:
+        return self.memories[0].data
+
+    def _link(self, imports: Imports) -> None:
+        for imp in self.module.imports:
+            try:
+                value = imports[imp.module_name][imp.name]
+            except KeyError:
+                raise LinkError(
+                    f"unresolved import {imp.module_name}.{imp.name}"
+                ) from None
+            if isinstance(imp, TypeImport):
+                ftype = self.module.types[imp.index]
+                if isinstance(value, RuntimeFunction):
+                    if value.type != ftype:
+                        raise LinkError(f"import {imp.name} has the wrong type")
+                    self.functions.append(value)
+                else:
+                    self.functions.append(HostFunction(ftype, value))
+            elif isinstance(imp, MemoryImport):
+                self.memories.append(value)
+            elif isinstance(imp, TableImport):
+                self.tables.append(value)
+            elif isinstance(imp, GlobalImport):
+                cell = value if isinstance(value, list) else [value]
+                cell[0] = _to_machine(imp.global_type.valtype, cell[0])
+                self.globals.append(cell)
+
+    def _evaluate(self, expression: List[Instruction]) -> Any:
+        instr = expression[0]
+        if instr.opcode == Opcode.GLOBAL_GET:
+            return self.globals[instr.operands[0].index][0]  # type: ignore
+        value = instr.operands[0].value  # type: ignore
+        if instr.opcode == Opcode.I32_CONST:
+            return int(value) & M32
+        if instr.opcode == Opcode.I64_CONST:
+            return int(value) & M64
+        return float(value)
+
+    def _initialize(self) -> None:
+        for elem in self.module.elems:
+            offset = self._evaluate(elem.offset_expression)
+            elements = self.tables[elem.table_index].elements
+            if offset + len(elem.function_indices) > len(elements):
+                raise Trap("elements segment does not fit")
+            for i, index in enumerate(elem.function_indices):
+                elements[offset + i] = self.functions[index]
+        for data in self.module.datas:
+            offset = self._evaluate(data.offset_expression)
+            memory = self.memories[data.memory_index].data
+            if offset + len(data.data) > len(memory):
+                raise Trap("data segment does not fit")
+            memory[offset : offset + len(data.data)] = data.data
+
+
+def _zero(t: ValueType) -> Union[int, float]:
+    return 0.0 if t in (ValueType.f32, ValueType.f64) else 0
+
+
+def _to_machine(t: ValueType, value: Any) -> Any:
+    if t == ValueType.i32:
+        return int(value) & M32
+    if t == ValueType.i64:
+        return int(value) & M64
+    if t == ValueType.f32:
+        return f32(float(value))
+    return float(value)
+
+
+def _from_machine(t: ValueType, value: Any) -> Any:
+    if t == ValueType.i32:
+        return s32(value)
+    if t == ValueType.i64:
+        return s64(value)
+    return value
@@ -0,0 +1,773 @@
+"""Handlers for lowered instructions.
+
+Every handler has the signature ``handler(stack, locs, imm, pc) -> pc``: it
+works on the current frame's operand stack and locals, gets whatever the
+compiler resolved for it in ``imm`` and returns the index of the next op to
+run (a negative index returns from the function).
+
+Integers are kept unsigned on the stack (``0 <= v < 2**32`` for i32 and
+``2**64`` for i64) so that the common arithmetic and comparisons are a
+single operation plus a mask; the signed views are only computed by the
+operators that need them.  Floats are Python floats, with f32 results
+rounded to single precision.
+"""
+
+import math
+import struct
+from typing import Any, Callable, Dict, List, Tuple
+
+Handler = Callable[[List[Any], List[Any], Any, int], int]
+
+M32 = 0xFFFFFFFF
+M64 = 0xFFFFFFFFFFFFFFFF
+S32 = 0x80000000
+S64 = 0x8000000000000000
+
+_F32 = struct.Struct("<f")
+_F64 = struct.Struct("<d")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+
+class Trap(Exception):
+    """Execution hit a WebAssembly trap."""
+
+
+class CompileError(Exception):
+    """A function could not be compiled for the machine."""
+
+
+class LinkError(Exception):
+    """A module's imports could not be resolved."""
+
+
+def s32(v: int) -> int:
+    return v - 0x100000000 if v & S32 else v
+
+
+def s64(v: int) -> int:
+    return v - 0x10000000000000000 if v & S64 else v
+
+
+def f32(v: float) -> float:
+    """Round ``v`` to the nearest single precision value."""
+    try:
+        return _F32.unpack(_F32.pack(v))[0]  # type: ignore
+    except OverflowError:
+        return math.copysign(math.inf, v)
+
+
+#
+# Control
+#
+
+
+def op_unreachable(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    raise Trap("unreachable")
+
+
+def op_jump(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    return imm  # type: ignore
+
+
+def op_br(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    target, height, keep = imm
+    if keep:
+        value = stack[-1]
+        del stack[height:]
+        stack.append(value)
+    else:
+        del stack[height:]
+    return target  # type: ignore
+
+
+def op_br_if(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    if stack.pop():
+        return imm  # type: ignore
+    return pc + 1
+
+
+def op_br_unless(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    if stack.pop():
+        return pc + 1
+    return imm  # type: ignore
+
+
+def op_br_if_unwind(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    if stack.pop():
+        return op_br(stack, locs, imm, pc)
+    return pc + 1
+
+
+def op_br_table(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    i = stack.pop()
+    return op_br(stack, locs, imm[i] if i < len(imm) - 1 else imm[-1], pc)
+
+
+def op_if(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    if stack.pop():
+        return pc + 1
+    return imm  # type: ignore
+
+
+def op_return(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    return -1
+
+
+def op_call(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    n = imm.nparams
+    if n:
+        args = stack[-n:]
+        del stack[-n:]
+    else:
+        args = []
+    stack += imm.invoke(args)
+    return pc + 1
+
+
+def op_call_indirect(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    elements, expected = imm
+    i = stack.pop()
+    if i >= len(elements):
+        raise Trap("undefined element")
+    callee = elements[i]
+    if callee is None:
+        raise Trap("uninitialized element")
+    if callee.type != expected:
+        raise Trap("indirect call type mismatch")
+    return op_call(stack, locs, callee, pc)
+
+
+#
+# Parametric and variable
+#
+
+
+def op_drop(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    stack.pop()
+    return pc + 1
+
+
+def op_select(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    c = stack.pop()
+    b = stack.pop()
+    if not c:
+        stack[-1] = b
+    return pc + 1
+
+
+def op_local_get(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    stack.append(locs[imm])
+    return pc + 1
+
+
+def op_local_set(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    locs[imm] = stack.pop()
+    return pc + 1
+
+
+def op_local_tee(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    locs[imm] = stack[-1]
+    return pc + 1
+
+
+def op_global_get(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    stack.append(imm[0])
+    return pc + 1
+
+
+def op_global_set(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    imm[0] = stack.pop()
+    return pc + 1
+
+
+def op_const(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    stack.append(imm)
+    return pc + 1
+
+
+#
+# Memory
+#
+# ``imm`` is the memory's bytearray and the static offset.  Out of bounds
+# accesses surface as ``struct.error`` and are turned into traps where the
+# host called in, which keeps the bounds check out of every access.
+#
+
+
+def _load(s: struct.Struct, mask: int) -> Handler:
+    unpack_from = s.unpack_from
+
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        stack[-1] = unpack_from(imm[0], stack[-1] + imm[1])[0] & mask
+        return pc + 1
+
+    return op
+
+
+def _load_local(s: struct.Struct, mask: int) -> Handler:
+    """A load from the address in local ``imm[2]``."""
+    unpack_from = s.unpack_from
+
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        stack.append(unpack_from(imm[0], locs[imm[2]] + imm[1])[0] & mask)
+        return pc + 1
+
+    return op
+
+
+def _load_float(s: struct.Struct) -> Handler:
+    unpack_from = s.unpack_from
+
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        stack[-1] = unpack_from(imm[0], stack[-1] + imm[1])[0]
+        return pc + 1
+
+    return op
+
+
+def _store(s: struct.Struct, mask: int) -> Handler:
+    pack_into = s.pack_into
+
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        value = stack.pop()
+        pack_into(imm[0], stack.pop() + imm[1], value & mask)
+        return pc + 1
+
+    return op
+
+
+def _load_local_float(s: struct.Struct) -> Handler:
+    unpack_from = s.unpack_from
+
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        stack.append(unpack_from(imm[0], locs[imm[2]] + imm[1])[0])
+        return pc + 1
+
+    return op
+
+
+def _store_float(s: struct.Struct) -> Handler:
+    pack_into = s.pack_into
+
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        value = stack.pop()
+        pack_into(imm[0], stack.pop() + imm[1], value)
+        return pc + 1
+
+    return op
+
+
+def op_memory_size(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    stack.append(imm.pages)
+    return pc + 1
+
+
+def op_memory_grow(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    stack[-1] = imm.grow(stack[-1]) & M32
+    return pc + 1
+
+
+#
+# Numeric
+#
+
+
+def _unary(fn: Callable[[Any], Any]) -> Handler:
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        stack[-1] = fn(stack[-1])
+        return pc + 1
+
+    return op
+
+
+def _binary(fn: Callable[[Any, Any], Any]) -> Handler:
+    def op(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+        b = stack.pop()
+        stack[-1] = fn(stack[-1], b)
+        return pc + 1
+
+    return op
+
+
+def op_i32_eqz(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    stack[-1] = 0 if stack[-1] else 1
+    return pc + 1
+
+
+def op_eq(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = 1 if stack[-1] == b else 0
+    return pc + 1
+
+
+def op_ne(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = 1 if stack[-1] != b else 0
+    return pc + 1
+
+
+def op_lt_u(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = 1 if stack[-1] < b else 0
+    return pc + 1
+
+
+def op_gt_u(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = 1 if stack[-1] > b else 0
+    return pc + 1
+
+
+def op_le_u(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = 1 if stack[-1] <= b else 0
+    return pc + 1
+
+
+def op_ge_u(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = 1 if stack[-1] >= b else 0
+    return pc + 1
+
+
+def op_i32_lt_s(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop() ^ S32
+    stack[-1] = 1 if stack[-1] ^ S32 < b else 0
+    return pc + 1
+
+
+def op_i32_gt_s(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop() ^ S32
+    stack[-1] = 1 if stack[-1] ^ S32 > b else 0
+    return pc + 1
+
+
+def op_i32_le_s(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop() ^ S32
+    stack[-1] = 1 if stack[-1] ^ S32 <= b else 0
+    return pc + 1
+
+
+def op_i32_ge_s(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop() ^ S32
+    stack[-1] = 1 if stack[-1] ^ S32 >= b else 0
+    return pc + 1
+
+
+def op_i32_add(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] + b) & M32
+    return pc + 1
+
+
+def op_i32_sub(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] - b) & M32
+    return pc + 1
+
+
+def op_i32_mul(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] * b) & M32
+    return pc + 1
+
+
+def op_and(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] &= b
+    return pc + 1
+
+
+def op_or(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] |= b
+    return pc + 1
+
+
+def op_xor(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] ^= b
+    return pc + 1
+
+
+def op_i32_shl(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] << (b & 31)) & M32
+    return pc + 1
+
+
+def op_i32_shr_u(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] >>= b & 31
+    return pc + 1
+
+
+def op_i32_shr_s(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (s32(stack[-1]) >> (b & 31)) & M32
+    return pc + 1
+
+
+def op_i64_add(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] + b) & M64
+    return pc + 1
+
+
+def op_i64_sub(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] - b) & M64
+    return pc + 1
+
+
+def op_i64_mul(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] * b) & M64
+    return pc + 1
+
+
+def op_i64_shl(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (stack[-1] << (b & 63)) & M64
+    return pc + 1
+
+
+def op_i64_shr_u(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] >>= b & 63
+    return pc + 1
+
+
+def op_i64_shr_s(stack: List[Any], locs: List[Any], imm: Any, pc: int) -> int:
+    b = stack.pop()
+    stack[-1] = (s64(stack[-1]) >> (b & 63)) & M64
+    return pc + 1
+
+
+def _div_s(bits: int) -> Callable[[int, int], int]:
+    to_signed = s32 if bits == 32 else s64
+    mask = M32 if bits == 32 else M64
+    minimum = 1 << (bits - 1)
+
+    def div_s(a: int, b: int) -> int:
+        if not b:
+            raise Trap("integer divide by zero")
+        if a == minimum and b == mask:
+            raise Trap("integer overflow")
+        a = to_signed(a)
+        b = to_signed(b)
+        q = abs(a) // abs(b)
+        return (-q if (a < 0) != (b < 0) else q) & mask
+
+    return div_s
+
+
+def _rem_s(bits: int) -> Callable[[int, int], int]:
+    to_signed = s32 if bits == 32 else s64
+    mask = M32 if bits == 32 else M64
+
+    def rem_s(a: int, b: int) -> int:
+        if not b:
+            raise Trap("integer divide by zero")
+        a = to_signed(a)
+        r = abs(a) % abs(to_signed(b))
+        return (-r if a < 0 else r) & mask
+
+    return rem_s
+
+
+def _div_u(a: int, b: int) -> int:
+    if not b:
+        raise Trap("integer divide by zero")
+    return a // b
+
+
+def _rem_u(a: int, b: int) -> int:
+    if not b:
+        raise Trap("integer divide by zero")
+    return a % b
+
+
+def _rotl(bits: int) -> Callable[[int, int], int]:
+    mask = (1 << bits) - 1
+
+    def rotl(a: int, b: int) -> int:
+        b %= bits
+        return ((a << b) | (a >> (bits - b))) & mask
+
+    return rotl
+
+
+def _rotr(bits: int) -> Callable[[int, int], int]:
+    mask = (1 << bits) - 1
+
+    def rotr(a: int, b: int) -> int:
+        b %= bits
+        return ((a >> b) | (a << (bits - b))) & mask
+
+    return rotr
+
+
+def _clz(bits: int) -> Callable[[int], int]:
+    return lambda a: bits - a.bit_length()
+
+
+def _ctz(bits: int) -> Callable[[int], int]:
+    return lambda a: (a & -a).bit_length() - 1 if a else bits
+
+
+def _popcnt(a: int) -> int:
+    return bin(a).count("1")
+
+
+def _signed_compare(bits: int, fn: Callable[[int, int], bool]) -> Handler:
+    to_signed = s32 if bits == 32 else s64
+    return _binary(lambda a, b: 1 if fn(to_signed(a), to_signed(b)) else 0)
+
+
+def _fcompare(fn: Callable[[float, float], bool]) -> Handler:
+    return _binary(lambda a, b: 1 if fn(a, b) else 0)
+
+
+def _fdiv(a: float, b: float) -> float:
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a != a or a == 0:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _fmin(a: float, b: float) -> float:
+    if a != a or b != b:
+        return math.nan
+    if a == b:
+        # Distinguishes -0.0 from 0.0.
+        return a if math.copysign(1.0, a) < 0 else b
+    return min(a, b)
+
+
+def _fmax(a: float, b: float) -> float:
+    if a != a or b != b:
+        return math.nan
+    if a == b:
+        return b if math.copysign(1.0, a) < 0 else a
+    return max(a, b)
+
+
+def _rounding(fn: Callable[[float], int]) -> Callable[[float], float]:
+    def rounding(a: float) -> float:
+        if not math.isfinite(a):
+            return a
+        return math.copysign(float(fn(a)), a)
+
+    return rounding
+
+
+def _sqrt(a: float) -> float:
+    return math.sqrt(a) if a >= 0 else math.nan
+
+
+def _trunc(lo: int, hi: int, mask: int) -> Callable[[float], int]:
+    def trunc(a: float) -> int:
+        if a != a:
+            raise Trap("invalid conversion to integer")
+        if math.isinf(a):
+            raise Trap("integer overflow")
+        value = int(a)
+        if value < lo or value > hi:
+            raise Trap("integer overflow")
+        return value & mask
+
+    return trunc
+
+
+def _reinterpret(src: struct.Struct, dst: struct.Struct) -> Callable[[Any], Any]:
+    return lambda a: dst.unpack(src.pack(a))[0]
+
+
+def _f32_op(fn: Callable[[float, float], float]) -> Callable[[float, float], float]:
+    return lambda a, b: f32(fn(a, b))
+
+
+# Opcode byte -> (handler, values popped, values pushed) for every opcode
+# whose handler needs no immediate and whose stack effect is fixed.
+SIMPLE: Dict[int, Tuple[Handler, int, int]] = {
+    0x00: (op_unreachable, 0, 0),
+    0x1A: (op_drop, 1, 0),
+    0x1B: (op_select, 3, 1),
+    # i32 comparisons
+    0x45: (op_i32_eqz, 1, 1),
+    0x46: (op_eq, 2, 1),
+    0x47: (op_ne, 2, 1),
+    0x48: (op_i32_lt_s, 2, 1),
+    0x49: (op_lt_u, 2, 1),
+    0x4A: (op_i32_gt_s, 2, 1),
+    0x4B: (op_gt_u, 2, 1),
+    0x4C: (op_i32_le_s, 2, 1),
+    0x4D: (op_le_u, 2, 1),
+    0x4E: (op_i32_ge_s, 2, 1),
+    0x4F: (op_ge_u, 2, 1),
+    # i64 comparisons
+    0x50: (op_i32_eqz, 1, 1),
+    0x51: (op_eq, 2, 1),
+    0x52: (op_ne, 2, 1),
+    0x53: (_signed_compare(64, lambda a, b: a < b), 2, 1),
+    0x54: (op_lt_u, 2, 1),
+    0x55: (_signed_compare(64, lambda a, b: a > b), 2, 1),
+    0x56: (op_gt_u, 2, 1),
+    0x57: (_signed_compare(64, lambda a, b: a <= b), 2, 1),
+    0x58: (op_le_u, 2, 1),
+    0x59: (_signed_compare(64, lambda a, b: a >= b), 2, 1),
+    0x5A: (op_ge_u, 2, 1),
+    # float comparisons
+    0x5B: (op_eq, 2, 1),
+    0x5C: (op_ne, 2, 1),
+    0x5D: (op_lt_u, 2, 1),
+    0x5E: (op_gt_u, 2, 1),
+    0x5F: (op_le_u, 2, 1),
+    0x60: (op_ge_u, 2, 1),
+    0x61: (op_eq, 2, 1),
+    0x62: (op_ne, 2, 1),
+    0x63: (op_lt_u, 2, 1),
+    0x64: (op_gt_u, 2, 1),
+    0x65: (op_le_u, 2, 1),
+    0x66: (op_ge_u, 2, 1),
+    # i32 arithmetic
+    0x67: (_unary(_clz(32)), 1, 1),
+    0x68: (_unary(_ctz(32)), 1, 1),
+    0x69: (_unary(_popcnt), 1, 1),
+    0x6A: (op_i32_add, 2, 1),
+    0x6B: (op_i32_sub, 2, 1),
+    0x6C: (op_i32_mul, 2, 1),
+    0x6D: (_binary(_div_s(32)), 2, 1),
+    0x6E: (_binary(_div_u), 2, 1),
+    0x6F: (_binary(_rem_s(32)), 2, 1),
+    0x70: (_binary(_rem_u), 2, 1),
+    0x71: (op_and, 2, 1),
+    0x72: (op_or, 2, 1),
+    0x73: (op_xor, 2, 1),
+    0x74: (op_i32_shl, 2, 1),
+    0x75: (op_i32_shr_s, 2, 1),
+    0x76: (op_i32_shr_u, 2, 1),
+    0x77: (_binary(_rotl(32)), 2, 1),
+    0x78: (_binary(_rotr(32)), 2, 1),
+    # i64 arithmetic
+    0x79: (_unary(_clz(64)), 1, 1),
+    0x7A: (_unary(_ctz(64)), 1, 1),
+    0x7B: (_unary(_popcnt), 1, 1),
+    0x7C: (op_i64_add, 2, 1),
+    0x7D: (op_i64_sub, 2, 1),
+    0x7E: (op_i64_mul, 2, 1),
+    0x7F: (_binary(_div_s(64)), 2, 1),
+    0x80: (_binary(_div_u), 2, 1),
+    0x81: (_binary(_rem_s(64)), 2, 1),
+    0x82: (_binary(_rem_u), 2, 1),
+    0x83: (op_and, 2, 1),
+    0x84: (op_or, 2, 1),
+    0x85: (op_xor, 2, 1),
+    0x86: (op_i64_shl, 2, 1),
+    0x87: (op_i64_shr_s, 2, 1),
+    0x88: (op_i64_shr_u, 2, 1),
+    0x89: (_binary(_rotl(64)), 2, 1),
+    0x8A: (_binary(_rotr(64)), 2, 1),
+    # f32 arithmetic
+    0x8B: (_unary(abs), 1, 1),
+    0x8C: (_unary(lambda a: -a), 1, 1),
+    0x8D: (_unary(_rounding(math.ceil)), 1, 1),
+    0x8E: (_unary(_rounding(math.floor)), 1, 1),
+    0x8F: (_unary(_rounding(math.trunc)), 1, 1),
+    0x90: (_unary(_rounding(round)), 1, 1),
+    0x91: (_unary(lambda a: f32(_sqrt(a))), 1, 1),
+    0x92: (_binary(_f32_op(lambda a, b: a + b)), 2, 1),
+    0x93: (_binary(_f32_op(lambda a, b: a - b)), 2, 1),
+    0x94: (_binary(_f32_op(lambda a, b: a * b)), 2, 1),
+    0x95: (_binary(_f32_op(_fdiv)), 2, 1),
+    0x96: (_binary(_fmin), 2, 1),
+    0x97: (_binary(_fmax), 2, 1),
+    0x98: (_binary(math.copysign), 2, 1),
+    # f64 arithmetic
+    0x99: (_unary(abs), 1, 1),
+    0x9A: (_unary(lambda a: -a), 1, 1),
+    0x9B: (_unary(_rounding(math.ceil)), 1, 1),
+    0x9C: (_unary(_rounding(math.floor)), 1, 1),
+    0x9D: (_unary(_rounding(math.trunc)), 1, 1),
+    0x9E: (_unary(_rounding(round)), 1, 1),
+    0x9F: (_unary(_sqrt), 1, 1),
+    0xA0: (_binary(lambda a, b: a + b), 2, 1),
+    0xA1: (_binary(lambda a, b: a - b), 2, 1),
+    0xA2: (_binary(lambda a, b: a * b), 2, 1),
+    0xA3: (_binary(_fdiv), 2, 1),
+    0xA4: (_binary(_fmin), 2, 1),
+    0xA5: (_binary(_fmax), 2, 1),
+    0xA6: (_binary(math.copysign), 2, 1),
+    # conversions
+    0xA7: (_unary(lambda a: a & M32), 1, 1),
+    0xA8: (_unary(_trunc(-(1 << 31), (1 << 31) - 1, M32)), 1, 1),
+    0xA9: (_unary(_trunc(0, M32, M32)), 1, 1),
+    0xAA: (_unary(_trunc(-(1 << 31), (1 << 31) - 1, M32)), 1, 1),
+    0xAB: (_unary(_trunc(0, M32, M32)), 1, 1),
+    0xAC: (_unary(lambda a: s32(a) & M64), 1, 1),
+    0xAD: (_unary(lambda a: a), 1, 1),
+    0xAE: (_unary(_trunc(-(1 << 63), (1 << 63) - 1, M64)), 1, 1),
+    0xAF: (_unary(_trunc(0, M64, M64)), 1, 1),
+    0xB0: (_unary(_trunc(-(1 << 63), (1 << 63) - 1, M64)), 1, 1),
+    0xB1: (_unary(_trunc(0, M64, M64)), 1, 1),
+    0xB2: (_unary(lambda a: f32(float(s32(a)))), 1, 1),
+    0xB3: (_unary(lambda a: f32(float(a))), 1, 1),
+    0xB4: (_unary(lambda a: f32(float(s64(a)))), 1, 1),
+    0xB5: (_unary(lambda a: f32(float(a))), 1, 1),
+    0xB6: (_unary(f32), 1, 1),
+    0xB7: (_unary(lambda a: float(s32(a))), 1, 1),
+    0xB8: (_unary(float), 1, 1),
+    0xB9: (_unary(lambda a: float(s64(a))), 1, 1),
+    0xBA: (_unary(float), 1, 1),
+    0xBB: (_unary(lambda a: a), 1, 1),
+    0xBC: (_unary(_reinterpret(_F32, _U32)), 1, 1),
+    0xBD: (_unary(_reinterpret(_F64, _U64)), 1, 1),
+    0xBE: (_unary(_reinterpret(_U32, _F32)), 1, 1),
+    0xBF: (_unary(_reinterpret(_U64, _F64)), 1, 1),
+}
+
+# Opcode byte -> (format, mask) of each load; a mask of 0 marks a float.
+_LOAD_FORMATS: Dict[int, Tuple[struct.Struct, int]] = {
+    0x28: (_U32, M32),
+    0x29: (_U64, M64),
+    0x2A: (_F32, 0),
+    0x2B: (_F64, 0),
+    0x2C: (struct.Struct("<b"), M32),
+    0x2D: (struct.Struct("<B"), M32),
+    0x2E: (struct.Struct("<h"), M32),
+    0x2F: (struct.Struct("<H"), M32),
+    0x30: (struct.Struct("<b"), M64),
+    0x31: (struct.Struct("<B"), M64),
+    0x32: (struct.Struct("<h"), M64),
+    0x33: (struct.Struct("<H"), M64),
+    0x34: (struct.Struct("<i"), M64),
+    0x35: (_U32, M64),
+}
+
+# Opcode byte -> handler for loads (one value popped and pushed), and for
+# loads from an address held in a local (one value pushed).
+LOADS: Dict[int, Handler] = {
+    opcode: _load(s, mask) if mask else _load_float(s)
+    for opcode, (s, mask) in _LOAD_FORMATS.items()
+}
+LOCAL_LOADS: Dict[int, Handler] = {
+    opcode: _load_local(s, mask) if mask else _load_local_float(s)
+    for opcode, (s, mask) in _LOAD_FORMATS.items()
+}
+
+# Opcode byte -> handler for stores (two values popped).
+STORES: Dict[int, Handler] = {
+    0x36: _store(_U32, M32),
+    0x37: _store(_U64, M64),
+    0x38: _store_float(_F32),
+    0x39: _store_float(_F64),
+    0x3A: _store(struct.Struct("<B"), 0xFF),
+    0x3B: _store(struct.Struct("<H"), 0xFFFF),
+    0x3C: _store(struct.Struct("<B"), 0xFF),
+    0x3D: _store(struct.Struct("<H"), 0xFFFF),
+    0x3E: _store(_U32, M32),
+}